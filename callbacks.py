@@ -0,0 +1,103 @@
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Type
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery, Message
+
+logger = logging.getLogger(__name__)
+
+# Данные кнопок: "<префикс>:<поле>:<поле>". Типы ферм и NFT передаются
+# числовыми кодами из каталога (Catalog.farm_codes, Catalog.nft_codes), поэтому
+# данные всегда короче лимита Telegram в 64 байта и не ломаются на ID с подчеркиваниями.
+
+class BuyFarm(CallbackData, prefix="bf"):
+    """Покупка ферм (qty=0 - на все звезды)"""
+    code: int
+    qty: int
+
+class BuyNft(CallbackData, prefix="bn"):
+    """Покупка NFT (qty=0 - на все звезды)"""
+    code: int
+    qty: int
+
+class AuctionSelect(CallbackData, prefix="au"):
+    """Выбор аукциона"""
+    id: int
+
+class Bid(CallbackData, prefix="bd"):
+    """Ставка на аукционе"""
+    id: int
+    amount: int
+
+class AdminFarm(CallbackData, prefix="af"):
+    """Админ: выбор фермы для выдачи"""
+    code: int
+
+class AdminNft(CallbackData, prefix="an"):
+    """Админ: выбор NFT для выдачи"""
+    code: int
+
+class CallbackRouter:
+    """Маршрутизатор нажатий кнопок: префикс данных -> обработчик через словарь.
+
+    Обработчик регистрируется либо на класс CallbackData (получает разобранные
+    данные вторым аргументом), либо на постоянную строку вроде "back_to_main".
+    """
+
+    def __init__(self):
+        self.routes: Dict[str, tuple[Callable[..., Awaitable], Optional[Type[CallbackData]]]] = {}
+
+    def route(self, key):
+        """Декоратор: зарегистрировать обработчик на класс данных или строку"""
+        def decorator(handler):
+            if isinstance(key, str):
+                prefix, data_class = key, None
+            else:
+                prefix, data_class = key.__prefix__, key
+            if prefix in self.routes:
+                raise ValueError(f"Префикс кнопок уже занят: {prefix}")
+            self.routes[prefix] = (handler, data_class)
+            return handler
+        return decorator
+
+    async def dispatch(self, callback: CallbackQuery) -> bool:
+        """Вызвать обработчик нажатия (False - если данные не распознаны)"""
+        data = callback.data or ""
+        entry = self.routes.get(data.partition(":")[0])
+        if entry is None:
+            return False
+
+        handler, data_class = entry
+        if data_class is None:
+            await handler(callback)
+            return True
+
+        try:
+            payload = data_class.unpack(data)
+        except (TypeError, ValueError):
+            logger.warning(f"Неверные данные кнопки: {data!r}")
+            return False
+        await handler(callback, payload)
+        return True
+
+class TextRouter:
+    """Маршрутизатор кнопок обычной клавиатуры: текст кнопки -> обработчик через словарь"""
+
+    def __init__(self):
+        self.routes: Dict[str, Callable[[Message], Awaitable]] = {}
+
+    def route(self, texts):
+        """Декоратор: зарегистрировать обработчик на все варианты текста кнопки"""
+        def decorator(handler):
+            for text in texts:
+                self.routes[text] = handler
+            return handler
+        return decorator
+
+    async def dispatch(self, message: Message) -> bool:
+        """Вызвать обработчик кнопки (False - если текст не кнопка меню)"""
+        handler = self.routes.get(message.text)
+        if handler is None:
+            return False
+        await handler(message)
+        return True
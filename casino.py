@@ -0,0 +1,73 @@
+import random
+from itertools import product
+
+# Правила игр казино. Функции множителей работают и с числами, и с массивами numpy,
+# поэтому одни и те же правила используются ботом и симулятором (casino_sim.py).
+
+MIN_BET = 10  # Минимальная ставка
+
+# Кости: выигрыш, если у игрока выпало больше, чем у бота
+DICE_SIDES = 6
+DICE_WIN_MULTIPLIER = 2
+
+# Слоты: три барабана, джекпот за три одинаковых символа, выигрыш за любую пару
+SLOT_SYMBOLS = ["🍒", "🍋", "🍊", "🍇", "⭐", "💎"]
+SLOTS_JACKPOT_MULTIPLIER = 3
+SLOTS_PAIR_MULTIPLIER = 2
+
+# Рулетка: цвет игрока и цвет колеса выбираются равновероятно
+ROULETTE_COLORS = ["🔴", "⚫", "🟢"]
+ROULETTE_MULTIPLIERS = (4, 4, 5)  # Множитель при совпадении, по индексу цвета
+
+GAMES = ("dice", "slots", "roulette")
+
+def dice_multiplier(player, bot):
+    """Множитель выплаты в костях"""
+    return (player > bot) * DICE_WIN_MULTIPLIER
+
+def slots_multiplier(slot1, slot2, slot3):
+    """Множитель выплаты в слотах (по индексам символов)"""
+    jackpot = (slot1 == slot2) & (slot2 == slot3)
+    pair = (slot1 == slot2) | (slot2 == slot3) | (slot1 == slot3)
+    return jackpot * SLOTS_JACKPOT_MULTIPLIER + (pair ^ jackpot) * SLOTS_PAIR_MULTIPLIER
+
+def roulette_multiplier(player, wheel, multipliers=ROULETTE_MULTIPLIERS):
+    """Множитель выплаты в рулетке (по индексам цветов)"""
+    return (player == wheel) * multipliers[wheel]
+
+def play_dice(bet: int, rng=random) -> tuple[int, int, int]:
+    """Сыграть в кости (возвращает (кубик игрока, кубик бота, выигрыш))"""
+    player = rng.randint(1, DICE_SIDES)
+    bot = rng.randint(1, DICE_SIDES)
+    return player, bot, bet * dice_multiplier(player, bot)
+
+def play_slots(bet: int, rng=random) -> tuple[list[str], int]:
+    """Сыграть в слоты (возвращает (символы, выигрыш))"""
+    reels = [rng.randrange(len(SLOT_SYMBOLS)) for _ in range(3)]
+    return [SLOT_SYMBOLS[i] for i in reels], bet * slots_multiplier(*reels)
+
+def play_roulette(bet: int, rng=random) -> tuple[str, str, int]:
+    """Сыграть в рулетку (возвращает (цвет игрока, выпавший цвет, выигрыш))"""
+    player = rng.randrange(len(ROULETTE_COLORS))
+    wheel = rng.randrange(len(ROULETTE_COLORS))
+    return ROULETTE_COLORS[player], ROULETTE_COLORS[wheel], bet * roulette_multiplier(player, wheel)
+
+def _outcomes(game: str):
+    """Все равновероятные исходы игры в виде множителей"""
+    if game == "dice":
+        faces = range(1, DICE_SIDES + 1)
+        return [dice_multiplier(p, b) for p, b in product(faces, faces)]
+    if game == "slots":
+        reels = range(len(SLOT_SYMBOLS))
+        return [slots_multiplier(*r) for r in product(reels, repeat=3)]
+    if game == "roulette":
+        colors = range(len(ROULETTE_COLORS))
+        return [roulette_multiplier(p, w) for p, w in product(colors, colors)]
+    raise ValueError(f"Неизвестная игра: {game}")
+
+def exact_stats(game: str) -> tuple[float, float]:
+    """Точные RTP и дисперсия множителя (перебором всех исходов)"""
+    outcomes = _outcomes(game)
+    rtp = sum(outcomes) / len(outcomes)
+    variance = sum((m - rtp) ** 2 for m in outcomes) / len(outcomes)
+    return rtp, variance
@@ -0,0 +1,107 @@
+"""Офлайн симулятор экономики казино (Monte Carlo).
+
+Берет правила игр из casino.py, прогоняет миллионы раундов векторно через numpy
+и печатает RTP, дисперсию и прогноз инфляции звезд по активным игрокам.
+
+Запуск:
+    python casino_sim.py                      # 5 млн раундов на игру
+    python casino_sim.py --bench              # быстрый прогон как бенчмарк
+    python casino_sim.py --users 5000 --bet 250
+
+Требует numpy (pip install numpy), сам бот от него не зависит.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    sys.exit("Для симулятора нужен numpy: pip install numpy")
+
+from casino import (
+    GAMES, DICE_SIDES, SLOT_SYMBOLS, ROULETTE_COLORS, ROULETTE_MULTIPLIERS,
+    dice_multiplier, slots_multiplier, roulette_multiplier, exact_stats
+)
+from database import DB_NAME
+
+CHUNK_SIZE = 1_000_000  # Раундов за один векторный шаг
+
+def simulate_chunk(game: str, rng, size: int):
+    """Множители выплат для size раундов игры"""
+    if game == "dice":
+        player = rng.integers(1, DICE_SIDES + 1, size)
+        bot = rng.integers(1, DICE_SIDES + 1, size)
+        return dice_multiplier(player, bot)
+    if game == "slots":
+        reels = rng.integers(0, len(SLOT_SYMBOLS), (3, size))
+        return slots_multiplier(reels[0], reels[1], reels[2])
+    if game == "roulette":
+        player = rng.integers(0, len(ROULETTE_COLORS), size)
+        wheel = rng.integers(0, len(ROULETTE_COLORS), size)
+        return roulette_multiplier(player, wheel, np.asarray(ROULETTE_MULTIPLIERS))
+    raise ValueError(f"Неизвестная игра: {game}")
+
+def simulate(game: str, rounds: int, seed: int = None) -> tuple[float, float]:
+    """Оценить RTP и дисперсию множителя по rounds раундам"""
+    rng = np.random.default_rng(seed)
+    total = 0.0
+    total_sq = 0.0
+    done = 0
+    while done < rounds:
+        size = min(CHUNK_SIZE, rounds - done)
+        multipliers = simulate_chunk(game, rng, size).astype(np.float64)
+        total += multipliers.sum()
+        total_sq += np.square(multipliers).sum()
+        done += size
+    rtp = total / rounds
+    return rtp, total_sq / rounds - rtp ** 2
+
+def active_casino_players(db_name: str) -> int:
+    """Количество игроков казино за последние сутки (0, если данных нет)"""
+    if not os.path.exists(db_name):
+        return 0
+    try:
+        with sqlite3.connect(db_name) as db:
+            row = db.execute(
+                "SELECT COUNT(DISTINCT user_id) FROM casino_rounds WHERE created_at > datetime('now', '-1 day')"
+            ).fetchone()
+    except sqlite3.Error:
+        return 0
+    return row[0] if row else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo симулятор экономики казино")
+    parser.add_argument("--rounds", type=int, default=5_000_000, help="раундов на игру")
+    parser.add_argument("--users", type=int, default=0, help="активных игроков (по умолчанию из базы)")
+    parser.add_argument("--rounds-per-user", type=int, default=20, help="раундов на игрока в сутки")
+    parser.add_argument("--bet", type=int, default=100, help="средняя ставка")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--bench", action="store_true", help="быстрый прогон (1 млн раундов) с замером скорости")
+    args = parser.parse_args()
+
+    rounds = 1_000_000 if args.bench else args.rounds
+    users = args.users or active_casino_players(args.db) or 1000
+    daily_rounds = users * args.rounds_per_user
+
+    print(f"Раундов на игру: {rounds:,} | игроков: {users:,} | ставка: {args.bet} ⭐\n")
+    print(f"{'игра':<10}{'RTP':>9}{'точный':>9}{'σ²':>9}{'±95%':>9}{'инфляция ⭐/сутки':>20}{'раундов/с':>14}")
+
+    for game in GAMES:
+        started = time.perf_counter()
+        rtp, variance = simulate(game, rounds, args.seed)
+        elapsed = time.perf_counter() - started
+        exact_rtp, _ = exact_stats(game)
+        margin = 1.96 * (variance / rounds) ** 0.5
+        # Чистый выпуск звезд: выплаты минус ставки
+        inflation = daily_rounds * args.bet * (rtp - 1)
+        print(
+            f"{game:<10}{rtp:>9.2%}{exact_rtp:>9.2%}{variance:>9.3f}{margin:>9.3%}"
+            f"{inflation:>+20,.0f}{rounds / elapsed:>14,.0f}"
+        )
+
+if __name__ == "__main__":
+    main()
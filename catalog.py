@@ -0,0 +1,156 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+from config import FARM_TYPES, NFT_GIFTS, CATALOG_PATH
+
+# Каталог ферм и NFT. Встроенный каталог - FARM_TYPES и NFT_GIFTS из config
+# (версия 0); если есть файл CATALOG_PATH, используется он. Каталог загружается
+# целиком, проверяется и подменяется одним присваиванием, поэтому обработчик,
+# взявший get_catalog() один раз, видит согласованные цены, коды и тексты.
+# Производные данные (доход в минуту, проценты бустов, коды кнопок) считаются
+# при загрузке, а не в обработчиках.
+#
+# В базе тип фермы или NFT хранится числовым кодом из каталога, поэтому доходы и
+# бусты лежат в списках, где индекс - код: фермы пользователя сводятся к вектору
+# количеств по кодам, а доход - к скалярному произведению с вектором доходов.
+
+# Сколько последних (самых дорогих) типов ферм разыгрывается на аукционах
+AUCTION_FARM_COUNT = 4
+
+class Catalog:
+    """Загруженный каталог с заранее посчитанными производными данными"""
+
+    __slots__ = (
+        "version", "farms", "nfts", "farm_codes", "nft_codes",
+        "farm_per_minute", "nft_boost_percent", "income_rates", "auction_farms",
+        "farm_ids", "nft_ids", "farm_rates", "nft_boosts",
+    )
+
+    def __init__(self, version: int, farms: Dict[str, dict], nfts: Dict[str, dict]):
+        _validate(farms, ("code", "name", "price", "income_per_hour"))
+        _validate(nfts, ("code", "name", "price", "boost"))
+        self.version = version
+        self.farms = farms
+        self.nfts = nfts
+        # Короткие числовые коды типов (для данных кнопок)
+        self.farm_codes = {data["code"]: farm_id for farm_id, data in farms.items()}
+        self.nft_codes = {data["code"]: nft_id for nft_id, data in nfts.items()}
+        self.farm_per_minute = {
+            farm_id: round(data["income_per_hour"] / 60, 2) for farm_id, data in farms.items()
+        }
+        self.nft_boost_percent = {nft_id: int((data["boost"] - 1) * 100) for nft_id, data in nfts.items()}
+        self.income_rates: List[tuple] = [(data["code"], data["income_per_hour"]) for data in farms.values()]
+        self.auction_farms: List[str] = list(farms)[-AUCTION_FARM_COUNT:]
+        # Списки по кодам: ID типа, доход в час и множитель буста (для пропущенных кодов - None, 0 и 1.0)
+        self.farm_ids = _by_code(farms, lambda farm_id, data: farm_id, None)
+        self.nft_ids = _by_code(nfts, lambda nft_id, data: nft_id, None)
+        self.farm_rates = _by_code(farms, lambda farm_id, data: data["income_per_hour"], 0)
+        self.nft_boosts = _by_code(nfts, lambda nft_id, data: data["boost"], 1.0)
+
+    def farm_code(self, farm_id: str) -> int:
+        """Код типа фермы"""
+        return self.farms[farm_id]["code"]
+
+    def nft_code(self, nft_id: str) -> int:
+        """Код типа NFT"""
+        return self.nfts[nft_id]["code"]
+
+    def is_farm_code(self, code: int) -> bool:
+        """Есть ли в каталоге тип фермы с таким кодом"""
+        return known_code(code, self.farm_ids)
+
+    def is_nft_code(self, code: int) -> bool:
+        """Есть ли в каталоге тип NFT с таким кодом"""
+        return known_code(code, self.nft_ids)
+
+    def farm_vector(self, counts: Dict[int, int]) -> List[int]:
+        """Вектор количеств по кодам ферм из {код: количество}"""
+        return _vector(counts, self.farm_ids)
+
+    def nft_vector(self, counts: Dict[int, int]) -> List[int]:
+        """Вектор количеств по кодам NFT из {код: количество}"""
+        return _vector(counts, self.nft_ids)
+
+    def income_per_hour(self, active: List[int]) -> int:
+        """Доход в час по вектору активных ферм"""
+        return sum(count * rate for count, rate in zip(active, self.farm_rates))
+
+    def __repr__(self):
+        return f"Catalog(version={self.version}, farms={len(self.farms)}, nfts={len(self.nfts)})"
+
+def _by_code(items: Dict[str, dict], value, default) -> list:
+    """Список значений value(id, data) с индексом по коду"""
+    table = [default] * (max((data["code"] for data in items.values()), default=0) + 1)
+    for item_id, data in items.items():
+        table[data["code"]] = value(item_id, data)
+    return table
+
+def known_code(code: int, ids: list) -> bool:
+    """Есть ли в списке по кодам тип с таким кодом. Код 0 зарезервирован (коды в каталоге
+    начинаются с 1), удаленные из каталога типы не считаются"""
+    return 0 < code < len(ids) and ids[code] is not None
+
+def _vector(counts: Dict[int, int], ids: list) -> List[int]:
+    """Вектор количеств по кодам. Коды типов, которых нет в каталоге (удаленных из
+    него при перезагрузке), отбрасываются: строки в базе остаются и снова учитываются,
+    когда тип вернут в каталог"""
+    vector = [0] * len(ids)
+    for code, count in counts.items():
+        if known_code(code, ids):
+            vector[code] = count
+    return vector
+
+def _validate(items: Dict[str, dict], fields: tuple):
+    """Проверить, что у всех предметов есть нужные поля, а коды уникальны"""
+    codes = set()
+    for item_id, data in items.items():
+        missing = [field for field in fields if field not in data]
+        if missing:
+            raise ValueError(f"У {item_id} нет полей: {', '.join(missing)}")
+        if not isinstance(data["code"], int) or data["code"] < 1 or data["code"] in codes:
+            raise ValueError(f"У {item_id} неверный или повторный код {data['code']!r}")
+        if data["price"] <= 0:
+            raise ValueError(f"У {item_id} неверная цена {data['price']!r}")
+        codes.add(data["code"])
+
+def _check_codes(old: Dict[str, dict], new: Dict[str, dict]):
+    """Коды уже выданных типов нельзя менять или отдавать другим типам (они в кнопках и базе)"""
+    old_codes = {data["code"]: item_id for item_id, data in old.items()}
+    for item_id, data in new.items():
+        if item_id in old and old[item_id]["code"] != data["code"]:
+            raise ValueError(f"У {item_id} изменился код: {old[item_id]['code']} -> {data['code']}")
+        if old_codes.get(data["code"], item_id) != item_id:
+            raise ValueError(f"Код {data['code']} уже принадлежит {old_codes[data['code']]}")
+
+_builtin = Catalog(0, FARM_TYPES, NFT_GIFTS)
+_catalog = _builtin
+
+def get_catalog() -> Catalog:
+    """Текущий каталог"""
+    return _catalog
+
+def read_catalog(path: str = CATALOG_PATH) -> Catalog:
+    """Прочитать и проверить каталог из файла (встроенный, если файла нет)"""
+    if not os.path.exists(path):
+        return _builtin
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    if not isinstance(raw.get("version"), int) or raw["version"] < 1:
+        raise ValueError("В каталоге нет версии (version - целое число от 1)")
+    catalog = Catalog(raw["version"], raw.get("farms", {}), raw.get("nfts", {}))
+    for source in (_builtin, _catalog):
+        _check_codes(source.farms, catalog.farms)
+        _check_codes(source.nfts, catalog.nfts)
+    return catalog
+
+def load_catalog(path: str = CATALOG_PATH) -> Optional[Catalog]:
+    """Загрузить каталог и подменить текущий (возвращает None, если версия не изменилась)"""
+    global _catalog
+    catalog = read_catalog(path)
+    if catalog.version == _catalog.version:
+        return None
+    _catalog = catalog
+    return catalog
+
+load_catalog()
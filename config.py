@@ -1,147 +1,206 @@
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-BOT_TOKEN = os.getenv("BOT_TOKEN", "8255377913:AAHAFPr1r5Hv1NH7qQ7xLByWuiwV_hyu6dc")
-
-# Настройки игры
-GAME_NAME = "0DAY FARM EMPIRE"
-INITIAL_STARS = 200  # Начальное количество звезд
-FARM_BASE_PRICE = 50  # Базовая цена фермы
-FARM_BASE_INCOME = 5  # Базовый доход с фермы в час
-
-# Админы
-ADMIN_IDS = [5538590798, 891015442, 5253753886]
-
-# NFT подарки Telegram (их ID в Telegram)
-NFT_GIFTS = {
-    "snoop_dogg": {
-        "name": "🎤 Snoop Dogg",
-        "price": 5000,
-        "boost": 1.5,  # +50% к доходу
-        "gift_id": "snoop_dogg"
-    },
-    "lunar_snake": {
-        "name": "🐍 Lunar Snake",
-        "price": 3500,
-        "boost": 1.3,  # +30% к доходу
-        "gift_id": "lunar_snake"
-    },
-    "crystal_ball": {
-        "name": "🔮 Crystal Ball",
-        "price": 6000,
-        "boost": 1.6,  # +60% к доходу
-        "gift_id": "crystal_ball"
-    },
-    "golden_coin": {
-        "name": "🪙 Golden Coin",
-        "price": 3000,
-        "boost": 1.25,  # +25% к доходу
-        "gift_id": "golden_coin"
-    },
-    "diamond_ring": {
-        "name": "💍 Diamond Ring",
-        "price": 10000,
-        "boost": 2.0,  # +100% к доходу
-        "gift_id": "diamond_ring"
-    },
-    "magic_lamp": {
-        "name": "🪔 Magic Lamp",
-        "price": 7500,
-        "boost": 1.7,  # +70% к доходу
-        "gift_id": "magic_lamp"
-    },
-    "fire_dragon": {
-        "name": "🐉 Fire Dragon",
-        "price": 12000,
-        "boost": 2.2,  # +120% к доходу
-        "gift_id": "fire_dragon"
-    },
-    "cosmic_star": {
-        "name": "⭐ Cosmic Star",
-        "price": 8000,
-        "boost": 1.8,  # +80% к доходу
-        "gift_id": "cosmic_star"
-    },
-    "golden_crown": {
-        "name": "👑 Golden Crown",
-        "price": 15000,
-        "boost": 2.5,  # +150% к доходу
-        "gift_id": "golden_crown"
-    },
-    "mystic_orb": {
-        "name": "🔮 Mystic Orb",
-        "price": 9000,
-        "boost": 1.9,  # +90% к доходу
-        "gift_id": "mystic_orb"
-    }
-}
-
-# Настройки реферальной системы
-REFERRAL_REWARD = 100  # Награда за регистрацию по реферальной ссылке
-
-# Типы ферм
-FARM_TYPES = {
-    "starter": {
-        "name": "🌱 Стартовая ферма",
-        "price": 200,
-        "income_per_hour": 60
-    },
-    "basic": {
-        "name": "🌾 Базовая ферма",
-        "price": 500,
-        "income_per_hour": 240
-    },
-    "advanced": {
-        "name": "🚜 Продвинутая ферма",
-        "price": 2000,
-        "income_per_hour": 1200
-    },
-    "premium": {
-        "name": "🏭 Премиум ферма",
-        "price": 8000,
-        "income_per_hour": 5400
-    },
-    "elite": {
-        "name": "💎 Элитная ферма",
-        "price": 25000,
-        "income_per_hour": 18000
-    },
-    "legendary": {
-        "name": "👑 Легендарная ферма",
-        "price": 75000,
-        "income_per_hour": 60000
-    },
-    "mythic": {
-        "name": "🌟 Мифическая ферма",
-        "price": 200000,
-        "income_per_hour": 180000
-    },
-    "ultimate": {
-        "name": "⚡ Ультимативная ферма",
-        "price": 500000,
-        "income_per_hour": 450000
-    },
-    "quantum": {
-        "name": "⚛️ Квантовая ферма",
-        "price": 1000000,
-        "income_per_hour": 900000
-    },
-    "cosmic": {
-        "name": "🌌 Космическая ферма",
-        "price": 2500000,
-        "income_per_hour": 2250000
-    },
-    "divine": {
-        "name": "✨ Божественная ферма",
-        "price": 5000000,
-        "income_per_hour": 4500000
-    },
-    "infinity": {
-        "name": "♾️ Бесконечная ферма",
-        "price": 10000000,
-        "income_per_hour": 9000000
-    }
-}
-
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BOT_TOKEN = os.getenv("BOT_TOKEN", "8255377913:AAHAFPr1r5Hv1NH7qQ7xLByWuiwV_hyu6dc")
+
+# Настройки игры
+GAME_NAME = "0DAY FARM EMPIRE"
+INITIAL_STARS = 200  # Начальное количество звезд
+FARM_BASE_PRICE = 50  # Базовая цена фермы
+FARM_BASE_INCOME = 5  # Базовый доход с фермы в час
+MAX_PURCHASE_QUANTITY = 1000  # Максимум предметов за одну покупку (кнопка "max")
+BULK_GRANT_MAX_QUANTITY = 100  # Максимум ферм или NFT одному пользователю в строке CSV массовой выдачи
+
+# Начисление дохода: "collect" - при команде /collect, "server" - фоновой задачей всем сразу
+INCOME_ACCRUAL_MODE = os.getenv("INCOME_ACCRUAL_MODE", "collect")
+INCOME_ACCRUAL_INTERVAL_MINUTES = int(os.getenv("INCOME_ACCRUAL_INTERVAL_MINUTES", "10"))
+
+# Хранилище игровых данных: "sqlite" - база DB_NAME, "memory" - в памяти процесса (для нагрузочных тестов)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+
+# Сколько сообщений в секунду бот отправляет из очереди уведомлений
+NOTIFY_SEND_RATE = 25
+
+# Лимиты частоты запросов одного пользователя по классам команд:
+# (запросов в секунду, сколько можно подряд). Меняются на ходу командой /throttle
+THROTTLE_LIMITS = {
+    "casino": (1.0, 5),    # /dice, /slots, /roulette
+    "economy": (2.0, 10),  # /collect, /activate, покупки и ставки
+    "views": (3.0, 15),    # профиль, фермы, магазины, аукционы
+}
+
+# Шардирование: SHARD_COUNT процессов-воркеров, каждый со своей базой (user_id % SHARD_COUNT).
+# SHARD_INDEX задает роутер при запуске воркера; без него бот работает одним процессом (polling)
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+SHARD_INDEX = int(os.getenv("SHARD_INDEX")) if os.getenv("SHARD_INDEX") else None
+# Вебхук принимает роутер (shard_router.py), воркеры слушают только localhost
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+ROUTER_HOST = os.getenv("ROUTER_HOST", "0.0.0.0")
+ROUTER_PORT = int(os.getenv("ROUTER_PORT", "8080"))
+WORKER_HOST = "127.0.0.1"
+WORKER_BASE_PORT = int(os.getenv("WORKER_BASE_PORT", "8100"))
+
+# Админы
+ADMIN_IDS = [5538590798, 891015442, 5253753886]
+
+# Встроенный каталог (см. CATALOG_PATH). NFT подарки Telegram (их ID в Telegram)
+NFT_GIFTS = {
+    "snoop_dogg": {
+        "code": 1,
+        "name": "🎤 Snoop Dogg",
+        "price": 5000,
+        "boost": 1.5,  # +50% к доходу
+        "gift_id": "snoop_dogg"
+    },
+    "lunar_snake": {
+        "code": 2,
+        "name": "🐍 Lunar Snake",
+        "price": 3500,
+        "boost": 1.3,  # +30% к доходу
+        "gift_id": "lunar_snake"
+    },
+    "crystal_ball": {
+        "code": 3,
+        "name": "🔮 Crystal Ball",
+        "price": 6000,
+        "boost": 1.6,  # +60% к доходу
+        "gift_id": "crystal_ball"
+    },
+    "golden_coin": {
+        "code": 4,
+        "name": "🪙 Golden Coin",
+        "price": 3000,
+        "boost": 1.25,  # +25% к доходу
+        "gift_id": "golden_coin"
+    },
+    "diamond_ring": {
+        "code": 5,
+        "name": "💍 Diamond Ring",
+        "price": 10000,
+        "boost": 2.0,  # +100% к доходу
+        "gift_id": "diamond_ring"
+    },
+    "magic_lamp": {
+        "code": 6,
+        "name": "🪔 Magic Lamp",
+        "price": 7500,
+        "boost": 1.7,  # +70% к доходу
+        "gift_id": "magic_lamp"
+    },
+    "fire_dragon": {
+        "code": 7,
+        "name": "🐉 Fire Dragon",
+        "price": 12000,
+        "boost": 2.2,  # +120% к доходу
+        "gift_id": "fire_dragon"
+    },
+    "cosmic_star": {
+        "code": 8,
+        "name": "⭐ Cosmic Star",
+        "price": 8000,
+        "boost": 1.8,  # +80% к доходу
+        "gift_id": "cosmic_star"
+    },
+    "golden_crown": {
+        "code": 9,
+        "name": "👑 Golden Crown",
+        "price": 15000,
+        "boost": 2.5,  # +150% к доходу
+        "gift_id": "golden_crown"
+    },
+    "mystic_orb": {
+        "code": 10,
+        "name": "🔮 Mystic Orb",
+        "price": 9000,
+        "boost": 1.9,  # +90% к доходу
+        "gift_id": "mystic_orb"
+    }
+}
+
+# Настройки реферальной системы
+REFERRAL_REWARD = 100  # Награда за регистрацию по реферальной ссылке
+
+# Типы ферм (встроенный каталог)
+FARM_TYPES = {
+    "starter": {
+        "code": 1,
+        "name": "🌱 Стартовая ферма",
+        "price": 200,
+        "income_per_hour": 60
+    },
+    "basic": {
+        "code": 2,
+        "name": "🌾 Базовая ферма",
+        "price": 500,
+        "income_per_hour": 240
+    },
+    "advanced": {
+        "code": 3,
+        "name": "🚜 Продвинутая ферма",
+        "price": 2000,
+        "income_per_hour": 1200
+    },
+    "premium": {
+        "code": 4,
+        "name": "🏭 Премиум ферма",
+        "price": 8000,
+        "income_per_hour": 5400
+    },
+    "elite": {
+        "code": 5,
+        "name": "💎 Элитная ферма",
+        "price": 25000,
+        "income_per_hour": 18000
+    },
+    "legendary": {
+        "code": 6,
+        "name": "👑 Легендарная ферма",
+        "price": 75000,
+        "income_per_hour": 60000
+    },
+    "mythic": {
+        "code": 7,
+        "name": "🌟 Мифическая ферма",
+        "price": 200000,
+        "income_per_hour": 180000
+    },
+    "ultimate": {
+        "code": 8,
+        "name": "⚡ Ультимативная ферма",
+        "price": 500000,
+        "income_per_hour": 450000
+    },
+    "quantum": {
+        "code": 9,
+        "name": "⚛️ Квантовая ферма",
+        "price": 1000000,
+        "income_per_hour": 900000
+    },
+    "cosmic": {
+        "code": 10,
+        "name": "🌌 Космическая ферма",
+        "price": 2500000,
+        "income_per_hour": 2250000
+    },
+    "divine": {
+        "code": 11,
+        "name": "✨ Божественная ферма",
+        "price": 5000000,
+        "income_per_hour": 4500000
+    },
+    "infinity": {
+        "code": 12,
+        "name": "♾️ Бесконечная ферма",
+        "price": 10000000,
+        "income_per_hour": 9000000
+    }
+}
+
+# Каталог ферм и NFT, который можно перезагрузить без перезапуска (/reload_catalog).
+# Без этого файла действует встроенный каталог выше; коды типов нельзя менять или переиспользовать
+CATALOG_PATH = os.getenv("CATALOG_PATH", "catalog.json")
+
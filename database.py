@@ -1,585 +1,1854 @@
-import aiosqlite
-import asyncio
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-
-DB_NAME = "game_bot.db"
-
-async def init_db():
-    """Инициализация базы данных"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        # Таблица пользователей
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                stars INTEGER DEFAULT 200,
-                last_collect TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Таблица ферм
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS farms (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                farm_type TEXT,
-                purchased_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_activated TIMESTAMP,
-                is_active BOOLEAN DEFAULT 0,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        """)
-        
-        # Таблица NFT
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS nfts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                nft_type TEXT,
-                purchased_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        """)
-        
-        # Таблица рефералов
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS referrals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                referrer_id INTEGER,
-                referred_id INTEGER,
-                reward_given BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (referrer_id) REFERENCES users (user_id),
-                FOREIGN KEY (referred_id) REFERENCES users (user_id),
-                UNIQUE(referred_id)
-            )
-        """)
-        
-        # Таблица аукционов
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS auctions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                farm_type TEXT,
-                starting_price INTEGER,
-                current_bid INTEGER,
-                current_bidder_id INTEGER,
-                end_time TIMESTAMP,
-                status TEXT DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (current_bidder_id) REFERENCES users (user_id)
-            )
-        """)
-        
-        # Таблица банов
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS bans (
-                user_id INTEGER PRIMARY KEY,
-                reason TEXT,
-                banned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                banned_by INTEGER
-            )
-        """)
-        
-        # Таблица чатов
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS chats (
-                chat_id INTEGER PRIMARY KEY,
-                chat_type TEXT,
-                title TEXT,
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        await db.commit()
-
-async def get_or_create_user(user_id: int) -> Dict:
-    """Получить или создать пользователя"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT * FROM users WHERE user_id = ?",
-            (user_id,)
-        )
-        user = await cursor.fetchone()
-        
-        if not user:
-            await db.execute(
-                "INSERT INTO users (user_id, stars, last_collect) VALUES (?, ?, ?)",
-                (user_id, 200, datetime.now().isoformat())
-            )
-            await db.commit()
-            cursor = await db.execute(
-                "SELECT * FROM users WHERE user_id = ?",
-                (user_id,)
-            )
-            user = await cursor.fetchone()
-        
-        return dict(user)
-
-async def get_user_stars(user_id: int) -> int:
-    """Получить количество звезд пользователя"""
-    user = await get_or_create_user(user_id)
-    return user['stars']
-
-async def add_stars(user_id: int, amount: int):
-    """Добавить звезды пользователю"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "UPDATE users SET stars = stars + ? WHERE user_id = ?",
-            (amount, user_id)
-        )
-        await db.commit()
-
-async def spend_stars(user_id: int, amount: int) -> bool:
-    """Потратить звезды (возвращает True если успешно)"""
-    current_stars = await get_user_stars(user_id)
-    if current_stars >= amount:
-        async with aiosqlite.connect(DB_NAME) as db:
-            await db.execute(
-                "UPDATE users SET stars = stars - ? WHERE user_id = ?",
-                (amount, user_id)
-            )
-            await db.commit()
-        return True
-    return False
-
-async def buy_farm(user_id: int, farm_type: str) -> bool:
-    """Купить ферму"""
-    from config import FARM_TYPES
-    
-    if farm_type not in FARM_TYPES:
-        return False
-    
-    price = FARM_TYPES[farm_type]["price"]
-    
-    if await spend_stars(user_id, price):
-        async with aiosqlite.connect(DB_NAME) as db:
-            await db.execute(
-                "INSERT INTO farms (user_id, farm_type, last_activated, is_active) VALUES (?, ?, ?, 0)",
-                (user_id, farm_type, datetime.now().isoformat())
-            )
-            await db.commit()
-        return True
-    return False
-
-async def activate_farms(user_id: int) -> tuple[int, int]:
-    """Активировать все фермы пользователя (возвращает (активировано, всего))"""
-    farms = await get_user_farms(user_id)
-    if not farms:
-        return 0, 0
-    
-    activated_count = 0
-    now = datetime.now()
-    
-    async with aiosqlite.connect(DB_NAME) as db:
-        for farm in farms:
-            farm_id = farm['id']
-            last_activated = farm.get('last_activated')
-            is_active = farm.get('is_active', 0)
-            
-            # Если ферма не активирована или прошло больше 6 часов
-            can_activate = False
-            if not last_activated or not is_active:
-                can_activate = True
-            else:
-                last_activated_dt = datetime.fromisoformat(last_activated)
-                hours_passed = (now - last_activated_dt).total_seconds() / 3600
-                if hours_passed >= 6:
-                    can_activate = True
-            
-            if can_activate:
-                await db.execute(
-                    "UPDATE farms SET last_activated = ?, is_active = 1 WHERE id = ?",
-                    (now.isoformat(), farm_id)
-                )
-                activated_count += 1
-        
-        await db.commit()
-    
-    return activated_count, len(farms)
-
-async def get_user_farms(user_id: int) -> List[Dict]:
-    """Получить все фермы пользователя"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT * FROM farms WHERE user_id = ?",
-            (user_id,)
-        )
-        farms = await cursor.fetchall()
-        return [dict(farm) for farm in farms]
-
-async def buy_nft(user_id: int, nft_type: str) -> bool:
-    """Купить NFT"""
-    from config import NFT_GIFTS
-    
-    if nft_type not in NFT_GIFTS:
-        return False
-    
-    price = NFT_GIFTS[nft_type]["price"]
-    
-    if await spend_stars(user_id, price):
-        async with aiosqlite.connect(DB_NAME) as db:
-            await db.execute(
-                "INSERT INTO nfts (user_id, nft_type) VALUES (?, ?)",
-                (user_id, nft_type)
-            )
-            await db.commit()
-        return True
-    return False
-
-async def get_user_nfts(user_id: int) -> List[Dict]:
-    """Получить все NFT пользователя"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT * FROM nfts WHERE user_id = ?",
-            (user_id,)
-        )
-        nfts = await cursor.fetchall()
-        return [dict(nft) for nft in nfts]
-
-async def calculate_total_boost(user_id: int) -> float:
-    """Рассчитать общий буст от всех NFT"""
-    from config import NFT_GIFTS
-    
-    nfts = await get_user_nfts(user_id)
-    total_boost = 1.0
-    
-    for nft in nfts:
-        nft_type = nft['nft_type']
-        if nft_type in NFT_GIFTS:
-            total_boost *= NFT_GIFTS[nft_type]["boost"]
-    
-    return total_boost
-
-async def collect_farm_income(user_id: int) -> int:
-    """Собрать доход с ферм (только с активированных ферм)"""
-    from config import FARM_TYPES
-    
-    user = await get_or_create_user(user_id)
-    farms = await get_user_farms(user_id)
-    
-    if not farms:
-        return 0
-    
-    # Получаем время последнего сбора
-    last_collect = datetime.fromisoformat(user['last_collect']) if user['last_collect'] else datetime.now()
-    now = datetime.now()
-    hours_passed = (now - last_collect).total_seconds() / 3600
-    
-    # Ограничиваем максимум 24 часа
-    hours_passed = min(hours_passed, 24)
-    
-    # Рассчитываем базовый доход только с активированных ферм
-    total_income = 0
-    for farm in farms:
-        # Проверяем, активирована ли ферма
-        is_active = farm.get('is_active', 0)
-        if not is_active:
-            continue
-        
-        # Проверяем, не прошло ли 6 часов с активации
-        last_activated = farm.get('last_activated')
-        if last_activated:
-            last_activated_dt = datetime.fromisoformat(last_activated)
-            hours_since_activation = (now - last_activated_dt).total_seconds() / 3600
-            if hours_since_activation >= 6:
-                # Ферма деактивировалась
-                async with aiosqlite.connect(DB_NAME) as db:
-                    await db.execute(
-                        "UPDATE farms SET is_active = 0 WHERE id = ?",
-                        (farm['id'],)
-                    )
-                    await db.commit()
-                continue
-        
-        farm_type = farm['farm_type']
-        if farm_type in FARM_TYPES:
-            income_per_hour = FARM_TYPES[farm_type]["income_per_hour"]
-            # Доход рассчитывается только за время с момента активации или последнего сбора
-            if last_activated:
-                last_activated_dt = datetime.fromisoformat(last_activated)
-                collect_from = max(last_activated_dt, last_collect)
-                hours_for_income = (now - collect_from).total_seconds() / 3600
-                hours_for_income = min(hours_for_income, hours_passed)
-            else:
-                hours_for_income = hours_passed
-            
-            total_income += income_per_hour * hours_for_income
-    
-    # Применяем буст от NFT
-    boost = await calculate_total_boost(user_id)
-    total_income = int(total_income * boost)
-    
-    # Обновляем время последнего сбора
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "UPDATE users SET last_collect = ? WHERE user_id = ?",
-            (now.isoformat(), user_id)
-        )
-        await db.commit()
-    
-    # Добавляем звезды
-    if total_income > 0:
-        await add_stars(user_id, total_income)
-    
-    return total_income
-
-# Реферальная система
-async def register_referral(referrer_id: int, referred_id: int) -> bool:
-    """Зарегистрировать реферала (возвращает True если это новый реферал)"""
-    # Запрещаем переход по своей ссылке
-    if referrer_id == referred_id:
-        return False
-    
-    async with aiosqlite.connect(DB_NAME) as db:
-        # Проверяем, не регистрировался ли уже этот пользователь
-        cursor = await db.execute(
-            "SELECT * FROM referrals WHERE referred_id = ?",
-            (referred_id,)
-        )
-        existing = await cursor.fetchone()
-        
-        if existing:
-            return False
-        
-        # Регистрируем реферала
-        await db.execute(
-            "INSERT INTO referrals (referrer_id, referred_id, reward_given) VALUES (?, ?, 0)",
-            (referrer_id, referred_id)
-        )
-        await db.commit()
-        return True
-
-async def give_referral_reward(referred_id: int) -> bool:
-    """Выдать награду рефералу (возвращает True если награда была выдана)"""
-    from config import REFERRAL_REWARD
-    
-    async with aiosqlite.connect(DB_NAME) as db:
-        # Проверяем, была ли уже выдана награда
-        cursor = await db.execute(
-            "SELECT * FROM referrals WHERE referred_id = ? AND reward_given = 0",
-            (referred_id,)
-        )
-        referral = await cursor.fetchone()
-        
-        if not referral:
-            return False
-        
-        # Выдаем награду
-        await add_stars(referred_id, REFERRAL_REWARD)
-        
-        # Отмечаем, что награда выдана
-        await db.execute(
-            "UPDATE referrals SET reward_given = 1 WHERE referred_id = ?",
-            (referred_id,)
-        )
-        await db.commit()
-        return True
-
-async def get_referral_count(user_id: int) -> int:
-    """Получить количество рефералов пользователя"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute(
-            "SELECT COUNT(*) as count FROM referrals WHERE referrer_id = ?",
-            (user_id,)
-        )
-        result = await cursor.fetchone()
-        return result[0] if result else 0
-
-# Система аукциона
-async def create_auction(farm_type: str, starting_price: int, duration_hours: int = 24) -> int:
-    """Создать аукцион (возвращает ID аукциона)"""
-    from config import FARM_TYPES
-    
-    if farm_type not in FARM_TYPES:
-        return 0
-    
-    end_time = datetime.now() + timedelta(hours=duration_hours)
-    
-    async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute(
-            "INSERT INTO auctions (farm_type, starting_price, current_bid, end_time, status) VALUES (?, ?, ?, ?, 'active')",
-            (farm_type, starting_price, starting_price, end_time.isoformat())
-        )
-        await db.commit()
-        return cursor.lastrowid
-
-async def get_active_auctions() -> List[Dict]:
-    """Получить все активные аукционы"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT * FROM auctions WHERE status = 'active' AND end_time > datetime('now') ORDER BY end_time ASC"
-        )
-        auctions = await cursor.fetchall()
-        return [dict(auction) for auction in auctions]
-
-async def place_bid(auction_id: int, user_id: int, bid_amount: int) -> tuple[bool, str]:
-    """Сделать ставку на аукционе (возвращает (успех, сообщение))"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        db.row_factory = aiosqlite.Row
-        # Получаем информацию об аукционе
-        cursor = await db.execute(
-            "SELECT * FROM auctions WHERE id = ? AND status = 'active'",
-            (auction_id,)
-        )
-        auction = await cursor.fetchone()
-        
-        if not auction:
-            return False, "Аукцион не найден или уже завершен"
-        
-        auction_dict = dict(auction)
-        
-        # Проверяем, не истекло ли время
-        end_time = datetime.fromisoformat(auction_dict['end_time'])
-        if datetime.now() >= end_time:
-            await db.execute(
-                "UPDATE auctions SET status = 'ended' WHERE id = ?",
-                (auction_id,)
-            )
-            await db.commit()
-            return False, "Аукцион уже завершен"
-        
-        # Проверяем, что ставка больше текущей
-        current_bid = auction_dict['current_bid']
-        if bid_amount <= current_bid:
-            return False, f"Ставка должна быть больше {current_bid} ⭐"
-        
-        # Проверяем баланс пользователя
-        user_stars = await get_user_stars(user_id)
-        if user_stars < bid_amount:
-            return False, "Недостаточно звезд"
-        
-        # Возвращаем предыдущую ставку предыдущему участнику
-        if auction_dict['current_bidder_id']:
-            await add_stars(auction_dict['current_bidder_id'], auction_dict['current_bid'])
-        
-        # Списываем новую ставку
-        await spend_stars(user_id, bid_amount)
-        
-        # Обновляем аукцион
-        await db.execute(
-            "UPDATE auctions SET current_bid = ?, current_bidder_id = ? WHERE id = ?",
-            (bid_amount, user_id, auction_id)
-        )
-        await db.commit()
-        
-        return True, f"Ставка принята: {bid_amount} ⭐"
-
-async def end_auction(auction_id: int) -> Optional[Dict]:
-    """Завершить аукцион и выдать ферму победителю (возвращает информацию об аукционе)"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT * FROM auctions WHERE id = ?",
-            (auction_id,)
-        )
-        auction = await cursor.fetchone()
-        
-        if not auction:
-            return None
-        
-        auction_dict = dict(auction)
-        
-        if auction_dict['status'] != 'active':
-            return None
-        
-        # Обновляем статус
-        await db.execute(
-            "UPDATE auctions SET status = 'ended' WHERE id = ?",
-            (auction_id,)
-        )
-        await db.commit()
-        
-        # Если есть победитель, выдаем ему ферму
-        if auction_dict['current_bidder_id']:
-            winner_id = auction_dict['current_bidder_id']
-            farm_type = auction_dict['farm_type']
-            
-            # Добавляем ферму победителю
-            await db.execute(
-                "INSERT INTO farms (user_id, farm_type) VALUES (?, ?)",
-                (winner_id, farm_type)
-            )
-            await db.commit()
-        
-        return auction_dict
-
-# Админ функции
-async def is_banned(user_id: int) -> bool:
-    """Проверить, забанен ли пользователь"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute(
-            "SELECT * FROM bans WHERE user_id = ?",
-            (user_id,)
-        )
-        return cursor.fetchone() is not None
-
-async def ban_user(user_id: int, reason: str, admin_id: int):
-    """Забанить пользователя"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "INSERT OR REPLACE INTO bans (user_id, reason, banned_by) VALUES (?, ?, ?)",
-            (user_id, reason, admin_id)
-        )
-        await db.commit()
-
-async def unban_user(user_id: int):
-    """Разбанить пользователя"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "DELETE FROM bans WHERE user_id = ?",
-            (user_id,)
-        )
-        await db.commit()
-
-async def admin_add_stars(user_id: int, amount: int):
-    """Админ: добавить звезды пользователю"""
-    await add_stars(user_id, amount)
-
-async def admin_add_farm(user_id: int, farm_type: str):
-    """Админ: добавить ферму пользователю"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "INSERT INTO farms (user_id, farm_type, last_activated, is_active) VALUES (?, ?, ?, 0)",
-            (user_id, farm_type, datetime.now().isoformat())
-        )
-        await db.commit()
-
-async def admin_add_nft(user_id: int, nft_type: str):
-    """Админ: добавить NFT пользователю"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "INSERT INTO nfts (user_id, nft_type) VALUES (?, ?)",
-            (user_id, nft_type)
-        )
-        await db.commit()
-
-async def get_all_users() -> List[Dict]:
-    """Получить всех пользователей"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM users")
-        users = await cursor.fetchall()
-        return [dict(user) for user in users]
-
-async def get_all_chats() -> List[Dict]:
-    """Получить все чаты"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM chats")
-        chats = await cursor.fetchall()
-        return [dict(chat) for chat in chats]
-
-async def add_chat(chat_id: int, chat_type: str, title: str = None):
-    """Добавить чат в базу"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "INSERT OR IGNORE INTO chats (chat_id, chat_type, title) VALUES (?, ?, ?)",
-            (chat_id, chat_type, title)
-        )
-        await db.commit()
-
+import aiosqlite
+import asyncio
+import logging
+import os
+import sqlite3
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, AsyncIterator, Awaitable, Callable
+
+from catalog import get_catalog
+
+logger = logging.getLogger(__name__)
+
+# У каждого шарда своя база (задается роутером через окружение)
+DB_NAME = os.getenv("DB_NAME", "game_bot.db")
+
+# Размер пачки для записи раундов казино
+CASINO_ROUNDS_BATCH_SIZE = 200
+# Как часто сохранять снимок балансов (в секундах)
+LEDGER_CHECKPOINT_INTERVAL = 600
+# Как часто пересчитывать экономическую статистику (в секундах)
+ECONOMY_REFRESH_INTERVAL = 300
+# Сколько выдач применять одной транзакцией при массовой выдаче
+BULK_GRANT_CHUNK_SIZE = 5000
+# Сколько строк читать за раз при потоковом обходе таблиц
+STREAM_CHUNK_SIZE = 1000
+# Сколько соединений только для чтения держать открытыми (читатели WAL работают параллельно)
+READ_POOL_SIZE = 4
+# Сколько записей может ждать в очереди к соединению записи (дальше вызывающие ждут места)
+WRITE_QUEUE_SIZE = 1000
+# Архивация: как часто запускать, сколько строк переносить одной транзакцией,
+# через сколько дней строки считаются холодными и сколько страниц освобождать за раз
+ARCHIVE_INTERVAL = 3600
+ARCHIVE_CHUNK_SIZE = 2000
+AUCTION_ARCHIVE_DAYS = 1
+CASINO_ARCHIVE_DAYS = 30
+VACUUM_CHUNK_PAGES = 1000
+# Каталог резервных копий и сколько последних копий в нем хранить
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_KEEP = 3
+# Резервная копия: сколько страниц копировать за шаг, пауза между шагами и сколько
+# раз копирование может начаться заново из-за записи, прежде чем копировать за один шаг
+BACKUP_STEP_PAGES = 256
+BACKUP_STEP_SLEEP = 0.01
+BACKUP_MAX_RESTARTS = 3
+# Сколько строк таблицы смотрит ANALYZE (ограничивает его время на больших таблицах)
+ANALYZE_ROW_LIMIT = 1000
+# Сколько последних обработанных update_id хранить в базе (окно защиты от повторной доставки)
+UPDATE_WINDOW = 10000
+
+# Ключи для постраничного обхода таблиц (по возрастанию ключа)
+STREAM_TABLES = {
+    "users": "user_id",
+    "farms": "id",
+    "nfts": "id",
+    "auctions": "id",
+    "chats": "chat_id",
+}
+
+# Единственное соединение записи, его очередь и пул соединений только для чтения.
+# Все изменения выполняются по одному на соединении записи, поэтому не ждут
+# блокировку базы друг у друга; чтения идут из пула и в режиме WAL не ждут записи.
+_connection: Optional[aiosqlite.Connection] = None
+_write_queue: Optional[asyncio.Queue] = None
+_writer_task: Optional[asyncio.Task] = None
+_read_pool: Optional[asyncio.Queue] = None
+_read_connections: List[aiosqlite.Connection] = []
+_casino_rounds_buffer: List[tuple] = []
+_active_users: set = set()
+# Версии состояния пользователей для кэша экранов: растут при каждом изменении
+# звезд, ферм, NFT или рефералов; _state_epoch растет при изменениях сразу у всех
+_state_versions: Dict[int, int] = {}
+_state_epoch = 0
+# Забаненные пользователи в памяти (None - список еще не загружен, проверка идет через базу)
+_banned_ids: Optional[set] = None
+# Обновление Telegram, которое сейчас обрабатывается: запись, завершающая изменение
+# из его обработчика, отмечает update_id обработанным в той же транзакции
+current_update_id: ContextVar[Optional[int]] = ContextVar("current_update_id", default=None)
+_marked_updates = 0
+
+def state_version(user_id: int) -> tuple[int, int]:
+    """Текущая версия состояния пользователя"""
+    return _state_epoch, _state_versions.get(user_id, 0)
+
+def _bump_state(*user_ids: int):
+    """Отметить, что состояние пользователей изменилось"""
+    for user_id in user_ids:
+        _state_versions[user_id] = _state_versions.get(user_id, 0) + 1
+
+def _bump_all_states():
+    """Отметить, что изменилось состояние всех пользователей"""
+    global _state_epoch
+    _state_epoch += 1
+
+async def _get_connection() -> aiosqlite.Connection:
+    """Получить соединение записи (открывается один раз)"""
+    global _connection
+    if _connection is None:
+        _connection = await aiosqlite.connect(DB_NAME)
+        # В режиме WAL fsync нужен только на контрольных точках
+        await _connection.execute("PRAGMA synchronous = NORMAL")
+    return _connection
+
+async def _writer_loop():
+    """Выполнять записи из очереди по одной; после каждой - commit"""
+    future = None
+    try:
+        db = await _get_connection()
+        while True:
+            job, future = await _write_queue.get()
+            try:
+                result = await job(db)
+                if db.in_transaction:
+                    await db.commit()
+            except Exception as error:
+                if db.in_transaction:
+                    await db.rollback()
+                if not future.done():
+                    future.set_exception(error)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                _write_queue.task_done()
+    except BaseException as error:
+        # Писатель остановлен (не открылось соединение, сбой commit или rollback, отмена):
+        # текущая и ждущие в очереди записи завершаются ошибкой, а не висят
+        if future is not None and not future.done():
+            future.set_exception(_writer_stopped(error))
+        _fail_pending_writes(error)
+        raise
+
+def _writer_stopped(error: Optional[BaseException]) -> RuntimeError:
+    """Ошибка записи, которую уже некому выполнить"""
+    stopped = RuntimeError("Очередь записи остановлена")
+    stopped.__cause__ = error
+    return stopped
+
+def _fail_pending_writes(error: Optional[BaseException]):
+    """Завершить ошибкой все записи, ждущие в очереди"""
+    while not _write_queue.empty():
+        _, future = _write_queue.get_nowait()
+        if not future.done():
+            future.set_exception(_writer_stopped(error))
+        _write_queue.task_done()
+
+async def _write(job: Callable[[aiosqlite.Connection], Awaitable], mark_update: bool = True):
+    """Выполнить job(db) на соединении записи и вернуть ее результат.
+    
+    job не должна сама вызывать функции, которые пишут в базу: очередь одна,
+    и вложенная запись ждала бы сама себя.
+    mark_update=False - не отмечать текущее обновление обработанным: так пишутся
+    обслуживание, PRAGMA, явные транзакции, буферы и повторяемые без вреда записи,
+    после которых обработчик еще что-то меняет.
+    Если писатель остановился после ошибки - RuntimeError (снова запускает его close_connection).
+    """
+    global _write_queue, _writer_task
+    if _writer_task is None:
+        _write_queue = asyncio.Queue(WRITE_QUEUE_SIZE)
+        _writer_task = asyncio.create_task(_writer_loop())
+    elif _writer_task.done():
+        raise _writer_stopped(None if _writer_task.cancelled() else _writer_task.exception())
+    writer = _writer_task
+    update_id = current_update_id.get()
+    if mark_update and update_id is not None:
+        job = _marking_update(job, update_id)
+    future = asyncio.get_running_loop().create_future()
+    await _write_queue.put((job, future))
+    if writer.done():
+        # Писатель остановился, пока запись ждала места в очереди
+        _fail_pending_writes(None if writer.cancelled() else writer.exception())
+    return await future
+
+def _marking_update(job: Callable[[aiosqlite.Connection], Awaitable], update_id: int):
+    """job, которая вместе с изменением отмечает обновление обработанным"""
+    global _marked_updates
+    _marked_updates += 1
+    trim = _marked_updates % UPDATE_WINDOW == 0
+
+    async def apply(db):
+        await db.execute("INSERT OR IGNORE INTO processed_updates (update_id) VALUES (?)", (update_id,))
+        if trim:
+            await db.execute(
+                "DELETE FROM processed_updates WHERE seq <= (SELECT MAX(seq) FROM processed_updates) - ?",
+                (UPDATE_WINDOW,)
+            )
+        return await job(db)
+    return apply
+
+@contextmanager
+def _update_mark_deferred():
+    """Записи внутри блока не отмечают обновление: его отметит последняя запись операции"""
+    token = current_update_id.set(None)
+    try:
+        yield
+    finally:
+        current_update_id.reset(token)
+
+@asynccontextmanager
+async def _reader():
+    """Соединение только для чтения из пула"""
+    global _read_pool
+    if _read_pool is None:
+        _read_pool = asyncio.Queue()
+    if _read_pool.empty() and len(_read_connections) < READ_POOL_SIZE:
+        # Место в пуле занимается до открытия, чтобы параллельные вызовы не открыли лишних
+        db = aiosqlite.connect(f"file:{DB_NAME}?mode=ro", uri=True)
+        _read_connections.append(db)
+        try:
+            await db
+        except Exception:
+            _read_connections.remove(db)
+            raise
+        db.row_factory = aiosqlite.Row
+    else:
+        db = await _read_pool.get()
+    try:
+        yield db
+    finally:
+        _read_pool.put_nowait(db)
+
+async def open_connection():
+    """Открыть соединение записи и запустить очередь записи заранее, при запуске бота"""
+    await _write(lambda db: asyncio.sleep(0), mark_update=False)
+
+async def close_connection():
+    """Сбросить буферы, дождаться очереди записи и закрыть все соединения"""
+    global _connection, _writer_task, _read_pool
+    if _writer_task is not None and _writer_task.done():
+        logger.error("Очередь записи остановлена, буферы не сброшены")
+    else:
+        await flush_buffers()
+    if _writer_task is not None:
+        await _write_queue.join()
+        _writer_task.cancel()
+        await asyncio.gather(_writer_task, return_exceptions=True)
+        _writer_task = None
+    for db in _read_connections:
+        await db.close()
+    _read_connections.clear()
+    _read_pool = None
+    if _connection is not None:
+        await _connection.close()
+        _connection = None
+
+async def init_db():
+    """Инициализация базы данных"""
+    async with aiosqlite.connect(DB_NAME) as db:
+        # WAL: чтения из пула не ждут записи (режим сохраняется в файле базы)
+        await db.execute("PRAGMA journal_mode = WAL")
+        # Освобожденные страницы возвращаются по частям (incremental_vacuum); у старой
+        # базы режим меняется только полным VACUUM, он выполняется один раз
+        cursor = await db.execute("PRAGMA auto_vacuum")
+        if (await cursor.fetchone())[0] != 2:
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await db.execute("VACUUM")
+        
+        # Таблица пользователей
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                stars INTEGER DEFAULT 200,
+                last_collect TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Буст от NFT хранится в профиле, чтобы не пересчитывать его по таблице nfts
+        add_boost_column = await _add_column(db, "users", "boost", "REAL DEFAULT 1.0")
+        # Подписка на напоминание об окончании активации ферм
+        await _add_column(db, "users", "remind_expiry", "INTEGER DEFAULT 0")
+        # Когда выяснилось, что пользователю нельзя писать (заблокировал бота, удален);
+        # рассылка и напоминания обходят только доступных по частичному индексу
+        await _add_column(db, "users", "unreachable_at", "TIMESTAMP")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_users_reachable ON users (user_id) WHERE unreachable_at IS NULL")
+        
+        # Таблица ферм
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS farms (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                farm_type INTEGER,
+                purchased_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_activated TIMESTAMP,
+                is_active BOOLEAN DEFAULT 0,
+                FOREIGN KEY (user_id) REFERENCES users (user_id)
+            )
+        """)
+        
+        # Типы ферм и NFT хранятся кодами каталога (старые базы хранили текстовые ID)
+        catalog = get_catalog()
+        migrated_farms = await _migrate_type_codes(
+            db, "farms", "farm_type", {farm_id: data["code"] for farm_id, data in catalog.farms.items()}
+        )
+        
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_farms_type_user ON farms (farm_type, user_id)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_farms_user ON farms (user_id)")
+        
+        # Таблица NFT
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS nfts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                nft_type INTEGER,
+                purchased_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (user_id)
+            )
+        """)
+        migrated_nfts = await _migrate_type_codes(
+            db, "nfts", "nft_type", {nft_id: data["code"] for nft_id, data in catalog.nfts.items()}
+        )
+        
+        # Таблица рефералов
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS referrals (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                referrer_id INTEGER,
+                referred_id INTEGER,
+                reward_given BOOLEAN DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (referrer_id) REFERENCES users (user_id),
+                FOREIGN KEY (referred_id) REFERENCES users (user_id),
+                UNIQUE(referred_id)
+            )
+        """)
+        
+        # Таблица аукционов
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS auctions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                farm_type TEXT,
+                starting_price INTEGER,
+                current_bid INTEGER,
+                current_bidder_id INTEGER,
+                end_time TIMESTAMP,
+                status TEXT DEFAULT 'active',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (current_bidder_id) REFERENCES users (user_id)
+            )
+        """)
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_auctions_status_end ON auctions (status, end_time)")
+        
+        # Архив завершенных аукционов: только итог торгов
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS auctions_archive (
+                id INTEGER PRIMARY KEY,
+                farm_type TEXT,
+                final_bid INTEGER,
+                winner_id INTEGER,
+                end_time TIMESTAMP
+            )
+        """)
+        
+        # Таблица банов
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS bans (
+                user_id INTEGER PRIMARY KEY,
+                reason TEXT,
+                banned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                banned_by INTEGER
+            )
+        """)
+        
+        # Таблица чатов
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS chats (
+                chat_id INTEGER PRIMARY KEY,
+                chat_type TEXT,
+                title TEXT,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # Когда бота исключили из чата
+        await _add_column(db, "chats", "unreachable_at", "TIMESTAMP")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_chats_reachable ON chats (chat_id) WHERE unreachable_at IS NULL")
+        
+        # Таблица раундов казино
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS casino_rounds (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                game TEXT,
+                bet INTEGER,
+                payout INTEGER,
+                created_at TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (user_id)
+            )
+        """)
+        # Архив старых раундов (учтенных в статистике экономики)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS casino_rounds_archive (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER,
+                game TEXT,
+                bet INTEGER,
+                payout INTEGER,
+                created_at TIMESTAMP
+            )
+        """)
+        
+        # Журнал движения звезд (только добавление записей)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS star_ledger (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                delta INTEGER,
+                reason TEXT,
+                created_at TIMESTAMP
+            )
+        """)
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_star_ledger_user ON star_ledger (user_id, delta)")
+        
+        # Снимок балансов и отметки, до какой записи журнала он актуален
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS star_snapshots (
+                user_id INTEGER PRIMARY KEY,
+                stars INTEGER
+            )
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ledger_id INTEGER,
+                created_at TIMESTAMP
+            )
+        """)
+        
+        # Агрегаты экономики и отметки, до каких записей они посчитаны
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS economy_stats (
+                metric TEXT,
+                key TEXT,
+                value INTEGER DEFAULT 0,
+                PRIMARY KEY (metric, key)
+            )
+        """)
+        
+        # Активные пользователи по дням
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS daily_active (
+                day TEXT,
+                user_id INTEGER,
+                PRIMARY KEY (day, user_id)
+            ) WITHOUT ROWID
+        """)
+        
+        # Последние обработанные обновления Telegram в порядке обработки
+        # (update_id не всегда растет: после недели простоя Telegram начинает их заново)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS processed_updates (
+                seq INTEGER PRIMARY KEY,
+                update_id INTEGER UNIQUE
+            )
+        """)
+        
+        # Заполняем сохраненный буст по уже купленным NFT
+        if add_boost_column:
+            await _backfill_boosts(db)
+        
+        # Агрегаты по типам были посчитаны по текстовым ID: пересчитываются заново по кодам
+        if migrated_farms or migrated_nfts:
+            await db.execute(
+                "DELETE FROM economy_stats WHERE metric IN ('farms', 'nfts') "
+                "OR (metric = 'hwm' AND key IN ('farms', 'nfts'))"
+            )
+        
+        # Открывающие записи для балансов, накопленных до появления журнала
+        await db.execute(
+            "INSERT INTO star_ledger (user_id, delta, reason, created_at) "
+            "SELECT user_id, stars, 'opening', ? FROM users "
+            "WHERE NOT EXISTS (SELECT 1 FROM star_ledger)",
+            (datetime.now().isoformat(),)
+        )
+        
+        await db.commit()
+
+async def _add_column(db: aiosqlite.Connection, table: str, column: str, definition: str) -> bool:
+    """Добавить колонку, если ее еще нет (возвращает True, если добавлена)"""
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    if column in [row[1] for row in await cursor.fetchall()]:
+        return False
+    await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+async def _migrate_type_codes(db: aiosqlite.Connection, table: str, column: str, codes: Dict[str, int]) -> bool:
+    """Переписать текстовую колонку типа в INTEGER с кодами каталога (возвращает True, если переписана).
+    
+    Если в таблице есть типы, которых нет в каталоге, миграция не выполняется: их
+    строки потерялись бы, а раньше они только не учитывались до возвращения типа
+    в каталог. SQLite не меняет тип колонки на месте, поэтому таблица
+    пересоздается с теми же ID строк.
+    """
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    types = {row[1]: row[2] for row in await cursor.fetchall()}
+    if types.get(column) != "TEXT":
+        return False
+    
+    cursor = await db.execute(f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL")
+    unknown = sorted(row[0] for row in await cursor.fetchall() if row[0] not in codes)
+    if unknown:
+        raise ValueError(
+            f"В {table} есть типы, которых нет в каталоге: {', '.join(unknown)}. "
+            "Добавьте их в каталог (CATALOG_PATH) со своими кодами и запустите бота снова"
+        )
+    
+    cursor = await db.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    schema = (await cursor.fetchone())[0]
+    await db.execute(
+        schema.replace(f"{column} TEXT", f"{column} INTEGER", 1).replace(table, f"{table}_coded", 1)
+    )
+    columns = ", ".join(types)
+    values = ", ".join("(?, ?)" for _ in codes) or "(NULL, NULL)"
+    await db.execute(
+        f"INSERT INTO {table}_coded ({columns}) "
+        f"WITH codes (type_id, code) AS (VALUES {values}) "
+        f"SELECT {columns.replace(column, f'COALESCE((SELECT code FROM codes WHERE type_id = {table}.{column}), 0)', 1)} "
+        f"FROM {table}",
+        [value for item in codes.items() for value in item]
+    )
+    await db.execute(f"DROP TABLE {table}")
+    await db.execute(f"ALTER TABLE {table}_coded RENAME TO {table}")
+    return True
+
+async def _backfill_boosts(db: aiosqlite.Connection):
+    """Пересчитать users.boost по таблице nfts (для миграции)"""
+    catalog = get_catalog()
+    
+    boosts = {}
+    cursor = await db.execute("SELECT user_id, nft_type, COUNT(*) FROM nfts GROUP BY user_id, nft_type")
+    for user_id, code, count in await cursor.fetchall():
+        if catalog.is_nft_code(code):
+            boosts[user_id] = boosts.get(user_id, 1.0) * catalog.nft_boosts[code] ** count
+    await db.executemany(
+        "UPDATE users SET boost = ? WHERE user_id = ?",
+        [(boost, user_id) for user_id, boost in boosts.items()]
+    )
+
+async def _ledger_append(db: aiosqlite.Connection, user_id: int, delta: int, reason: str):
+    """Добавить запись в журнал звезд.
+    
+    Вызывается внутри записи, которая меняет баланс: запись журнала коммитится
+    вместе с балансом, поэтому журнал не может отстать от users.stars.
+    """
+    if delta:
+        await db.execute(
+            "INSERT INTO star_ledger (user_id, delta, reason, created_at) VALUES (?, ?, ?, ?)",
+            (user_id, delta, reason, datetime.now().isoformat())
+        )
+
+async def checkpoint_balances() -> int:
+    """Сохранить снимок users.stars, согласованный с журналом (возвращает ID последней записи)"""
+    async def apply(db: aiosqlite.Connection) -> int:
+        # Соединение записи одно, поэтому между чтением журнала и снимком никто не пишет
+        cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM star_ledger")
+        ledger_id = (await cursor.fetchone())[0]
+        await db.execute("DELETE FROM star_snapshots")
+        await db.execute("INSERT INTO star_snapshots (user_id, stars) SELECT user_id, stars FROM users")
+        await db.execute(
+            "INSERT INTO ledger_checkpoints (ledger_id, created_at) VALUES (?, ?)",
+            (ledger_id, datetime.now().isoformat())
+        )
+        return ledger_id
+    return await _write(apply, mark_update=False)
+
+async def ledger_checkpointer(interval: float = LEDGER_CHECKPOINT_INTERVAL):
+    """Фоновая задача: периодически сохранять снимок балансов"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await checkpoint_balances()
+        except Exception:
+            logger.exception("Не удалось сохранить снимок балансов")
+
+# Причины записей журнала, из которых считаются ставки аукциона и казино
+AUCTION_LEDGER_REASONS = ("bid", "bid_refund")
+CASINO_LEDGER_REASONS = ("dice", "slots", "roulette", "casino")
+
+async def _economy_hwm(db: aiosqlite.Connection, source: str) -> int:
+    """Последний учтенный ID записи источника"""
+    cursor = await db.execute(
+        "SELECT value FROM economy_stats WHERE metric = 'hwm' AND key = ?",
+        (source,)
+    )
+    row = await cursor.fetchone()
+    return row[0] if row else 0
+
+async def _economy_add(db: aiosqlite.Connection, rows: List[tuple]):
+    """Прибавить приращения к агрегатам (metric, key, delta)"""
+    await db.executemany(
+        "INSERT INTO economy_stats (metric, key, value) VALUES (?, ?, ?) "
+        "ON CONFLICT (metric, key) DO UPDATE SET value = value + excluded.value",
+        rows
+    )
+
+async def _economy_set(db: aiosqlite.Connection, rows: List[tuple]):
+    """Записать значения агрегатов (metric, key, value)"""
+    await db.executemany(
+        "INSERT OR REPLACE INTO economy_stats (metric, key, value) VALUES (?, ?, ?)",
+        rows
+    )
+
+async def _economy_increment(db: aiosqlite.Connection, source: str, query: str) -> List[tuple]:
+    """Выполнить query по новым записям источника и сдвинуть отметку.
+    
+    query получает границы (hwm, max_id] и возвращает строки (metric, key, delta).
+    """
+    hwm = await _economy_hwm(db, source)
+    cursor = await db.execute(f"SELECT COALESCE(MAX(id), 0) FROM {source}")
+    max_id = (await cursor.fetchone())[0]
+    if max_id <= hwm:
+        return []
+    
+    cursor = await db.execute(query, (hwm, max_id))
+    rows = [tuple(row) for row in await cursor.fetchall()]
+    await _economy_add(db, rows)
+    await _economy_set(db, [("hwm", source, max_id)])
+    return rows
+
+async def refresh_economy_stats():
+    """Пересчитать агрегаты экономики по записям, появившимся с прошлого раза"""
+    placeholders_auction = ", ".join("?" * len(AUCTION_LEDGER_REASONS))
+    placeholders_casino = ", ".join("?" * len(CASINO_LEDGER_REASONS))
+    
+    await flush_buffers()
+    
+    async def apply(db: aiosqlite.Connection):
+        # Звезды в обороте и объем ставок аукциона по журналу звезд
+        hwm = await _economy_hwm(db, "star_ledger")
+        cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM star_ledger")
+        max_id = (await cursor.fetchone())[0]
+        if max_id > hwm:
+            cursor = await db.execute(
+                "SELECT COALESCE(SUM(delta), 0), "
+                f"COALESCE(-SUM(CASE WHEN reason IN ({placeholders_auction}) THEN delta END), 0), "
+                f"COALESCE(-SUM(CASE WHEN reason IN ({placeholders_casino}) THEN delta END), 0) "
+                "FROM star_ledger WHERE id > ? AND id <= ?",
+                (*AUCTION_LEDGER_REASONS, *CASINO_LEDGER_REASONS, hwm, max_id)
+            )
+            total, auction_volume, casino_net = await cursor.fetchone()
+            await _economy_add(db, [
+                ("stars", "total", total),
+                ("auction", "volume", auction_volume),
+                ("casino", "net", casino_net),
+            ])
+            await _economy_set(db, [("hwm", "star_ledger", max_id)])
+    
+        # Фермы и NFT по типам
+        await _economy_increment(
+            db, "farms",
+            "SELECT 'farms', farm_type, COUNT(*) FROM farms WHERE id > ? AND id <= ? GROUP BY farm_type"
+        )
+        await _economy_increment(
+            db, "nfts",
+            "SELECT 'nfts', nft_type, COUNT(*) FROM nfts WHERE id > ? AND id <= ? GROUP BY nft_type"
+        )
+    
+        # Количество раундов казино
+        await _economy_increment(
+            db, "casino_rounds",
+            "SELECT 'casino', 'rounds', COUNT(*) FROM casino_rounds WHERE id > ? AND id <= ?"
+        )
+    
+        # DAU за сегодня (поиск по первичному ключу daily_active)
+        cursor = await db.execute(
+            "SELECT COUNT(*) FROM daily_active WHERE day = ?",
+            (datetime.now().date().isoformat(),)
+        )
+        dau = (await cursor.fetchone())[0]
+        await _economy_set(db, [
+            ("activity", "dau", dau),
+            ("meta", "refreshed_at", int(datetime.now().timestamp())),
+        ])
+    
+    await _write(apply, mark_update=False)
+
+async def economy_refresher(interval: float = ECONOMY_REFRESH_INTERVAL):
+    """Фоновая задача: периодически обновлять агрегаты экономики"""
+    while True:
+        try:
+            await refresh_economy_stats()
+        except Exception:
+            logger.exception("Не удалось обновить статистику экономики")
+        await asyncio.sleep(interval)
+
+async def _archive_chunk(table: str, archive: str, columns: str, where: str, params: tuple) -> int:
+    """Перенести в архив одну пачку строк table, подходящих под where (возвращает их число)"""
+    async def apply(db: aiosqlite.Connection) -> int:
+        cursor = await db.execute(
+            f"SELECT MAX(id) FROM (SELECT id FROM {table} WHERE {where} ORDER BY id LIMIT ?)",
+            (*params, ARCHIVE_CHUNK_SIZE)
+        )
+        last_id = (await cursor.fetchone())[0]
+        if last_id is None:
+            return 0
+        await db.execute(
+            f"INSERT OR IGNORE INTO {archive} SELECT {columns} FROM {table} WHERE id <= ? AND {where}",
+            (last_id, *params)
+        )
+        cursor = await db.execute(f"DELETE FROM {table} WHERE id <= ? AND {where}", (last_id, *params))
+        return cursor.rowcount
+    return await _write(apply, mark_update=False)
+
+async def archive_history() -> Dict[str, int]:
+    """Перенести холодные строки в архивные таблицы пачками (возвращает число перенесенных строк)"""
+    moved = {"auctions": 0, "casino_rounds": 0}
+    
+    # Завершенные аукционы: они больше не показываются и не меняются
+    auction_cutoff = (datetime.now() - timedelta(days=AUCTION_ARCHIVE_DAYS)).isoformat()
+    while True:
+        count = await _archive_chunk(
+            "auctions", "auctions_archive", "id, farm_type, current_bid, current_bidder_id, end_time",
+            "status = 'ended' AND end_time < ?", (auction_cutoff,)
+        )
+        moved["auctions"] += count
+        if count < ARCHIVE_CHUNK_SIZE:
+            break
+    
+    # Раунды казино старше CASINO_ARCHIVE_DAYS, уже учтенные в статистике экономики
+    await flush_casino_rounds()
+    async with _reader() as db:
+        counted = await _economy_hwm(db, "casino_rounds")
+    casino_cutoff = (datetime.now() - timedelta(days=CASINO_ARCHIVE_DAYS)).isoformat()
+    while True:
+        count = await _archive_chunk(
+            "casino_rounds", "casino_rounds_archive", "id, user_id, game, bet, payout, created_at",
+            "id <= ? AND created_at < ?", (counted, casino_cutoff)
+        )
+        moved["casino_rounds"] += count
+        if count < ARCHIVE_CHUNK_SIZE:
+            break
+    
+    return moved
+
+async def vacuum_free_pages() -> int:
+    """Вернуть свободные страницы файлу базы пачками (возвращает число освобожденных страниц)"""
+    async def apply(db: aiosqlite.Connection) -> int:
+        cursor = await db.execute("PRAGMA freelist_count")
+        free = (await cursor.fetchone())[0]
+        if free:
+            # executescript проходит прагму до конца (execute освободил бы одну страницу)
+            await db.executescript(f"PRAGMA incremental_vacuum({VACUUM_CHUNK_PAGES});")
+        return min(free, VACUUM_CHUNK_PAGES)
+    
+    freed = 0
+    while True:
+        pages = await _write(apply, mark_update=False)
+        freed += pages
+        if pages < VACUUM_CHUNK_PAGES:
+            return freed
+
+async def archiver(interval: float = ARCHIVE_INTERVAL):
+    """Фоновая задача: периодически архивировать историю и уменьшать файл базы"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await archive_history()
+            await vacuum_free_pages()
+        except Exception:
+            logger.exception("Не удалось архивировать историю")
+
+class BackupRestarted(Exception):
+    """Копирование слишком часто начиналось заново из-за записи в базу"""
+
+async def backup_database(path: str) -> int:
+    """Сделать резервную копию базы в path (возвращает число страниц).
+    
+    Копирует отдельное соединение только для чтения шагами по BACKUP_STEP_PAGES
+    страниц: в режиме WAL шаг держит только снимок для чтения и не мешает ни
+    записи, ни чтениям. Если база меняется между шагами, SQLite начинает
+    копирование заново; после BACKUP_MAX_RESTARTS таких раз база копируется
+    за один шаг (тоже с одного снимка, без блокировки записи).
+    """
+    restarts = 0
+    last_remaining = None
+    
+    def progress(status: int, remaining: int, total: int):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > BACKUP_MAX_RESTARTS:
+                raise BackupRestarted()
+        last_remaining = remaining
+    
+    partial = f"{path}.part"
+    source = await aiosqlite.connect(f"file:{DB_NAME}?mode=ro", uri=True)
+    # Копия пишется из потока соединения-источника
+    target = sqlite3.connect(partial, check_same_thread=False)
+    try:
+        try:
+            await source.backup(target, pages=BACKUP_STEP_PAGES, progress=progress, sleep=BACKUP_STEP_SLEEP)
+        except BackupRestarted:
+            await source.backup(target, pages=-1)
+        cursor = await source.execute("PRAGMA page_count")
+        pages = (await cursor.fetchone())[0]
+    finally:
+        target.close()
+        await source.close()
+    os.replace(partial, path)
+    return pages
+
+async def make_backup() -> str:
+    """Резервная копия в BACKUP_DIR; старые копии сверх BACKUP_KEEP удаляются"""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(DB_NAME))[0]
+    path = os.path.join(BACKUP_DIR, f"{stem}-{datetime.now():%Y%m%d-%H%M%S}.db")
+    pages = await backup_database(path)
+    backups = sorted(
+        name for name in os.listdir(BACKUP_DIR) if name.startswith(f"{stem}-") and name.endswith(".db")
+    )
+    for name in backups[:-BACKUP_KEEP]:
+        os.remove(os.path.join(BACKUP_DIR, name))
+    return f"{path}, страниц: {pages}"
+
+async def analyze() -> str:
+    """Обновить статистику планировщика запросов (ANALYZE с ограничением по строкам)"""
+    async def apply(db: aiosqlite.Connection):
+        await db.execute(f"PRAGMA analysis_limit = {ANALYZE_ROW_LIMIT}")
+        await db.execute("ANALYZE")
+    await _write(apply, mark_update=False)
+    return "ok"
+
+async def optimize() -> str:
+    """PRAGMA optimize: SQLite сам решает, какие таблицы переанализировать"""
+    await _write(lambda db: db.execute("PRAGMA optimize"), mark_update=False)
+    return "ok"
+
+def _wal_size() -> int:
+    """Размер файла WAL в байтах"""
+    try:
+        return os.path.getsize(f"{DB_NAME}-wal")
+    except OSError:
+        return 0
+
+async def checkpoint_wal() -> str:
+    """Перенести WAL в файл базы и обрезать его (возвращает размер WAL до и после)"""
+    async def apply(db: aiosqlite.Connection) -> int:
+        cursor = await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return (await cursor.fetchone())[0]
+    before = _wal_size()
+    busy = await _write(apply, mark_update=False)
+    # busy - контрольную точку не дали довести до конца читатели; ее повторит следующий запуск
+    return f"WAL: {before // 1024} КБ -> {_wal_size() // 1024} КБ" + (" (заняты читателями)" if busy else "")
+
+async def get_economy_stats() -> Dict[str, Dict[str, int]]:
+    """Получить агрегаты экономики ({metric: {key: value}})"""
+    async with _reader() as db:
+        cursor = await db.execute("SELECT metric, key, value FROM economy_stats WHERE metric != 'hwm'")
+        stats = {}
+        for metric, key, value in await cursor.fetchall():
+            stats.setdefault(metric, {})[key] = value
+        return stats
+
+async def get_or_create_user(user_id: int) -> Dict:
+    """Получить или создать пользователя"""
+    async with _reader() as db:
+        cursor = await db.execute(
+            "SELECT * FROM users WHERE user_id = ?",
+            (user_id,)
+        )
+        user = await cursor.fetchone()
+    if user:
+        return dict(user)
+    
+    async def apply(db: aiosqlite.Connection):
+        cursor = await db.execute(
+            "INSERT OR IGNORE INTO users (user_id, stars, last_collect) VALUES (?, ?, ?)",
+            (user_id, 200, datetime.now().isoformat())
+        )
+        if cursor.rowcount:
+            await _ledger_append(db, user_id, 200, "signup")
+    # Создание пользователя повторяется без вреда и обычно идет перед изменением обработчика
+    await _write(apply, mark_update=False)
+    
+    async with _reader() as db:
+        cursor = await db.execute(
+            "SELECT * FROM users WHERE user_id = ?",
+            (user_id,)
+        )
+        return dict(await cursor.fetchone())
+
+async def get_user_stars(user_id: int) -> int:
+    """Получить количество звезд пользователя"""
+    user = await get_or_create_user(user_id)
+    return user['stars']
+
+async def add_stars(user_id: int, amount: int, reason: str = "add"):
+    """Добавить звезды пользователю"""
+    async def apply(db: aiosqlite.Connection):
+        cursor = await db.execute(
+            "UPDATE users SET stars = stars + ? WHERE user_id = ?",
+            (amount, user_id)
+        )
+        if cursor.rowcount:
+            await _ledger_append(db, user_id, amount, reason)
+    await _write(apply)
+    _bump_state(user_id)
+
+async def spend_stars(user_id: int, amount: int, reason: str = "spend") -> bool:
+    """Потратить звезды (возвращает True если успешно)"""
+    current_stars = await get_user_stars(user_id)
+    if current_stars < amount:
+        return False
+    
+    async def apply(db: aiosqlite.Connection) -> bool:
+        cursor = await db.execute(
+            "UPDATE users SET stars = stars - ? WHERE user_id = ? AND stars >= ?",
+            (amount, user_id, amount)
+        )
+        if not cursor.rowcount:
+            return False
+        await _ledger_append(db, user_id, -amount, reason)
+        return True
+    if not await _write(apply):
+        return False
+    _bump_state(user_id)
+    return True
+
+async def settle_bet(user_id: int, bet: int, payout: int, game: str = "") -> Optional[int]:
+    """Рассчитать раунд казино одним запросом (возвращает новый баланс или None, если звезд не хватает)"""
+    async def apply(db: aiosqlite.Connection) -> Optional[tuple]:
+        # Списание ставки и выплата выигрыша в одном условном UPDATE
+        cursor = await db.execute(
+            "UPDATE users SET stars = stars - ? + ? WHERE user_id = ? AND stars >= ? RETURNING stars",
+            (bet, payout, user_id, bet)
+        )
+        row = await cursor.fetchone()
+        await cursor.close()
+        if row is not None:
+            await _ledger_append(db, user_id, payout - bet, game or "casino")
+        return row
+    row = await _write(apply)
+    
+    if row is None:
+        return None
+    
+    _bump_state(user_id)
+    _casino_rounds_buffer.append((user_id, game, bet, payout, datetime.now().isoformat()))
+    if len(_casino_rounds_buffer) >= CASINO_ROUNDS_BATCH_SIZE:
+        # Раунд уже рассчитан: ошибка записи пачки не должна сорвать ответ игроку
+        try:
+            await flush_casino_rounds()
+        except Exception:
+            logger.exception("Не удалось записать раунды казино")
+    
+    return row[0]
+
+async def flush_casino_rounds():
+    """Записать накопленные раунды казино одной пачкой"""
+    global _casino_rounds_buffer
+    if not _casino_rounds_buffer:
+        return
+    
+    # Буфер подменяется новым: раунды, сыгранные во время записи, попадут в следующую пачку
+    batch, _casino_rounds_buffer = _casino_rounds_buffer, []
+    try:
+        await _write(lambda db: db.executemany(
+            "INSERT INTO casino_rounds (user_id, game, bet, payout, created_at) VALUES (?, ?, ?, ?, ?)",
+            batch
+        ), mark_update=False)
+    except BaseException:
+        # Запись не удалась: раунды возвращаются в буфер и запишутся следующей пачкой
+        _casino_rounds_buffer[:0] = batch
+        raise
+
+def mark_active(user_id: int):
+    """Отметить пользователя активным сегодня (пишется пачкой в daily_active)"""
+    _active_users.add(user_id)
+
+async def flush_active_users():
+    """Записать накопленных активных пользователей"""
+    if not _active_users:
+        return
+    
+    day = datetime.now().date().isoformat()
+    users = set(_active_users)
+    _active_users.clear()
+    
+    try:
+        await _write(lambda db: db.executemany(
+            "INSERT OR IGNORE INTO daily_active (day, user_id) VALUES (?, ?)",
+            [(day, user_id) for user_id in users]
+        ), mark_update=False)
+    except BaseException:
+        # Запись не удалась: пользователи вернутся в следующую пачку
+        _active_users.update(users)
+        raise
+
+async def flush_buffers():
+    """Записать все накопленные в памяти буферы"""
+    await flush_casino_rounds()
+    await flush_active_users()
+
+async def buffers_flusher(interval: float = 5.0):
+    """Фоновая задача: периодически сбрасывать буферы записи"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush_buffers()
+        except Exception:
+            logger.exception("Не удалось сбросить буферы записи")
+
+async def _buy_items(user_id: int, price: int, quantity: Optional[int], reason: str,
+                     insert_query: str, insert_params: tuple, boost: float = 1.0) -> tuple[int, int]:
+    """Купить quantity одинаковых предметов одним списанием и одной вставкой.
+    
+    quantity=None - купить столько, сколько хватает звезд (не больше MAX_PURCHASE_QUANTITY).
+    insert_query вставляет строки из CTE seq(n), insert_params подставляются перед количеством.
+    boost - множитель к users.boost за каждый купленный предмет.
+    Возвращает (куплено, баланс после покупки).
+    """
+    from config import MAX_PURCHASE_QUANTITY
+    
+    async def apply(db: aiosqlite.Connection) -> tuple[int, Optional[tuple]]:
+        count = quantity
+        if count is None:
+            cursor = await db.execute("SELECT stars FROM users WHERE user_id = ?", (user_id,))
+            row = await cursor.fetchone()
+            count = min(row[0] // price, MAX_PURCHASE_QUANTITY) if row else 0
+        count = min(count, MAX_PURCHASE_QUANTITY)
+        
+        row = None
+        if count > 0:
+            cost = price * count
+            cursor = await db.execute(
+                "UPDATE users SET stars = stars - ? WHERE user_id = ? AND stars >= ? RETURNING stars",
+                (cost, user_id, cost)
+            )
+            row = await cursor.fetchone()
+            await cursor.close()
+        
+        if row is not None:
+            await db.execute(
+                "WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < ?) "
+                + insert_query,
+                (count, *insert_params)
+            )
+            if boost != 1.0:
+                await db.execute(
+                    "UPDATE users SET boost = boost * ? WHERE user_id = ?",
+                    (boost ** count, user_id)
+                )
+            await _ledger_append(db, user_id, -cost, reason)
+        return count, row
+    quantity, row = await _write(apply)
+    
+    if row is None:
+        return 0, await get_user_stars(user_id)
+    _bump_state(user_id)
+    return quantity, row[0]
+
+async def buy_farms(user_id: int, farm_type: str, quantity: Optional[int] = 1) -> tuple[int, int]:
+    """Купить несколько ферм (возвращает (куплено, баланс)); quantity=None - на все звезды"""
+    catalog = get_catalog()
+    
+    if farm_type not in catalog.farms:
+        return 0, await get_user_stars(user_id)
+    
+    return await _buy_items(
+        user_id, catalog.farms[farm_type]["price"], quantity, "farm",
+        "INSERT INTO farms (user_id, farm_type, last_activated, is_active) SELECT ?, ?, ?, 0 FROM seq",
+        (user_id, catalog.farm_code(farm_type), datetime.now().isoformat())
+    )
+
+async def buy_farm(user_id: int, farm_type: str) -> bool:
+    """Купить ферму"""
+    bought, _ = await buy_farms(user_id, farm_type, 1)
+    return bought > 0
+
+async def activate_farms(user_id: int) -> tuple[int, int]:
+    """Активировать все фермы пользователя (возвращает (активировано, всего))"""
+    farms = await get_user_farms(user_id)
+    if not farms:
+        return 0, 0
+    
+    activated_count = 0
+    now = datetime.now()
+    
+    updates = []
+    for farm in farms:
+        last_activated = farm.get('last_activated')
+        is_active = farm.get('is_active', 0)
+        
+        # Если ферма не активирована или прошло больше 6 часов
+        can_activate = False
+        if not last_activated or not is_active:
+            can_activate = True
+        else:
+            last_activated_dt = datetime.fromisoformat(last_activated)
+            hours_passed = (now - last_activated_dt).total_seconds() / 3600
+            if hours_passed >= 6:
+                can_activate = True
+        
+        if can_activate:
+            updates.append((now.isoformat(), farm['id']))
+            activated_count += 1
+    
+    if updates:
+        await _write(lambda db: db.executemany(
+            "UPDATE farms SET last_activated = ?, is_active = 1 WHERE id = ?",
+            updates
+        ))
+    
+    if activated_count:
+        _bump_state(user_id)
+    return activated_count, len(farms)
+
+async def set_expiry_reminder(user_id: int, enabled: bool):
+    """Включить или выключить напоминание об окончании активации ферм"""
+    await _write(lambda db: db.execute(
+        "UPDATE users SET remind_expiry = ? WHERE user_id = ?",
+        (int(enabled), user_id)
+    ))
+
+async def iter_reminder_subscribers() -> AsyncIterator[List[tuple]]:
+    """Подписчики напоминаний пачками [(user_id, самая ранняя активация активных ферм или None)]"""
+    last_id = -1
+    while True:
+        async with _reader() as db:
+            cursor = await db.execute(
+                "SELECT u.user_id, MIN(f.last_activated) FROM users u "
+                "LEFT JOIN farms f ON f.user_id = u.user_id AND f.is_active = 1 "
+                "WHERE u.remind_expiry = 1 AND u.unreachable_at IS NULL AND u.user_id > ? "
+                "GROUP BY u.user_id ORDER BY u.user_id LIMIT ?",
+                (last_id, STREAM_CHUNK_SIZE)
+            )
+            rows = [tuple(row) for row in await cursor.fetchall()]
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+        if len(rows) < STREAM_CHUNK_SIZE:
+            return
+
+async def get_user_farms(user_id: int) -> List[Dict]:
+    """Получить все фермы пользователя"""
+    async with _reader() as db:
+        cursor = await db.execute(
+            "SELECT * FROM farms WHERE user_id = ?",
+            (user_id,)
+        )
+        farms = await cursor.fetchall()
+        return [dict(farm) for farm in farms]
+
+async def get_farm_histogram(user_id: int) -> tuple[List[int], List[int], Optional[str]]:
+    """Фермы пользователя векторами по кодам: (всего, работающих), и самая ранняя активация работающих"""
+    catalog = get_catalog()
+    since = (datetime.now() - timedelta(hours=6)).isoformat()
+    async with _reader() as db:
+        cursor = await db.execute(
+            "SELECT farm_type, COUNT(*), "
+            "       SUM(is_active = 1 AND last_activated > ?), "
+            "       MIN(CASE WHEN is_active = 1 AND last_activated > ? THEN last_activated END) "
+            "FROM farms WHERE user_id = ? GROUP BY farm_type",
+            (since, since, user_id)
+        )
+        rows = await cursor.fetchall()
+    return (
+        catalog.farm_vector({row[0]: row[1] for row in rows}),
+        catalog.farm_vector({row[0]: row[2] for row in rows}),
+        min((row[3] for row in rows if row[3]), default=None),
+    )
+
+async def get_nft_histogram(user_id: int) -> List[int]:
+    """NFT пользователя вектором количеств по кодам"""
+    async with _reader() as db:
+        cursor = await db.execute(
+            "SELECT nft_type, COUNT(*) FROM nfts WHERE user_id = ? GROUP BY nft_type",
+            (user_id,)
+        )
+        rows = await cursor.fetchall()
+    return get_catalog().nft_vector(dict(rows))
+
+async def buy_nfts(user_id: int, nft_type: str, quantity: Optional[int] = 1) -> tuple[int, int]:
+    """Купить несколько NFT (возвращает (куплено, баланс)); quantity=None - на все звезды"""
+    catalog = get_catalog()
+    
+    if nft_type not in catalog.nfts:
+        return 0, await get_user_stars(user_id)
+    
+    return await _buy_items(
+        user_id, catalog.nfts[nft_type]["price"], quantity, "nft",
+        "INSERT INTO nfts (user_id, nft_type) SELECT ?, ? FROM seq",
+        (user_id, catalog.nft_code(nft_type)), catalog.nfts[nft_type]["boost"]
+    )
+
+async def buy_nft(user_id: int, nft_type: str) -> bool:
+    """Купить NFT"""
+    bought, _ = await buy_nfts(user_id, nft_type, 1)
+    return bought > 0
+
+async def get_user_nfts(user_id: int) -> List[Dict]:
+    """Получить все NFT пользователя"""
+    async with _reader() as db:
+        cursor = await db.execute(
+            "SELECT * FROM nfts WHERE user_id = ?",
+            (user_id,)
+        )
+        nfts = await cursor.fetchall()
+        return [dict(nft) for nft in nfts]
+
+async def calculate_total_boost(user_id: int) -> float:
+    """Общий буст от всех NFT (хранится в users.boost)"""
+    user = await get_or_create_user(user_id)
+    return user['boost'] or 1.0
+
+async def collect_farm_income(user_id: int) -> int:
+    """Собрать доход с ферм (только с активированных ферм)"""
+    from config import INCOME_ACCRUAL_MODE
+    catalog = get_catalog()
+    
+    # В режиме серверного начисления доход уже зачислен фоновой задачей
+    if INCOME_ACCRUAL_MODE == "server":
+        return 0
+    
+    user = await get_or_create_user(user_id)
+    farms = await get_user_farms(user_id)
+    
+    if not farms:
+        return 0
+    
+    # Получаем время последнего сбора
+    last_collect = datetime.fromisoformat(user['last_collect']) if user['last_collect'] else datetime.now()
+    now = datetime.now()
+    hours_passed = (now - last_collect).total_seconds() / 3600
+    
+    # Ограничиваем максимум 24 часа
+    hours_passed = min(hours_passed, 24)
+    
+    # Рассчитываем базовый доход только с активированных ферм
+    total_income = 0
+    expired = []
+    for farm in farms:
+        # Проверяем, активирована ли ферма
+        is_active = farm.get('is_active', 0)
+        if not is_active:
+            continue
+        
+        # Проверяем, не прошло ли 6 часов с активации
+        last_activated = farm.get('last_activated')
+        if last_activated:
+            last_activated_dt = datetime.fromisoformat(last_activated)
+            hours_since_activation = (now - last_activated_dt).total_seconds() / 3600
+            if hours_since_activation >= 6:
+                # Ферма деактивировалась
+                expired.append((farm['id'],))
+                continue
+        
+        code = farm['farm_type']
+        if catalog.is_farm_code(code):
+            income_per_hour = catalog.farm_rates[code]
+            # Доход рассчитывается только за время с момента активации или последнего сбора
+            if last_activated:
+                last_activated_dt = datetime.fromisoformat(last_activated)
+                collect_from = max(last_activated_dt, last_collect)
+                hours_for_income = (now - collect_from).total_seconds() / 3600
+                hours_for_income = min(hours_for_income, hours_passed)
+            else:
+                hours_for_income = hours_passed
+            
+            total_income += income_per_hour * hours_for_income
+    
+    # Применяем буст от NFT
+    total_income = int(total_income * (user['boost'] or 1.0))
+    
+    # Деактивация ферм, время сбора и звезды пишутся одной транзакцией
+    async def apply(db: aiosqlite.Connection):
+        if expired:
+            await db.executemany("UPDATE farms SET is_active = 0 WHERE id = ?", expired)
+        await db.execute(
+            "UPDATE users SET last_collect = ?, stars = stars + ? WHERE user_id = ?",
+            (now.isoformat(), max(total_income, 0), user_id)
+        )
+        if total_income > 0:
+            await _ledger_append(db, user_id, total_income, "collect")
+    await _write(apply)
+    if expired or total_income > 0:
+        _bump_state(user_id)
+    
+    return total_income
+
+async def accrue_all_income() -> tuple[int, int]:
+    """Начислить накопленный доход всем пользователям за один проход.
+    
+    Доход каждой активной фермы считается за отрезок от max(активация, последний сбор)
+    до min(сейчас, активация + 6 часов), умножается на сохраненный буст и зачисляется
+    несколькими множественными запросами в одной транзакции.
+    Возвращает (пользователей, начислено звезд).
+    """
+    catalog = get_catalog()
+    
+    now = datetime.now()
+    expired_before = (now - timedelta(hours=6)).isoformat()
+    rates = catalog.income_rates
+    rates_sql = ", ".join("(?, ?)" for _ in rates)
+    rates_params = [value for rate in rates for value in rate]
+    
+    async def apply(db: aiosqlite.Connection) -> tuple[int, int]:
+        await db.execute("BEGIN IMMEDIATE")
+        await db.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS accrual (user_id INTEGER PRIMARY KEY, amount INTEGER)"
+        )
+        await db.execute("DELETE FROM accrual")
+        await db.execute(
+            f"INSERT INTO accrual (user_id, amount) "
+            f"WITH rates (farm_type, income_per_hour) AS (VALUES {rates_sql}) "
+            "SELECT u.user_id, CAST(u.boost * SUM(r.income_per_hour * 24 * MAX(0, "
+            "    MIN(julianday(?), julianday(f.last_activated) + 0.25) "
+            "    - MAX(julianday(f.last_activated), COALESCE(julianday(u.last_collect), 0))"
+            ")) AS INTEGER) "
+            "FROM farms f "
+            "JOIN rates r ON r.farm_type = f.farm_type "
+            "JOIN users u ON u.user_id = f.user_id "
+            "WHERE f.is_active = 1 AND f.last_activated IS NOT NULL "
+            "GROUP BY u.user_id",
+            (*rates_params, now.isoformat())
+        )
+        await db.execute(
+            "UPDATE users SET stars = stars + accrual.amount, last_collect = ? "
+            "FROM accrual WHERE users.user_id = accrual.user_id",
+            (now.isoformat(),)
+        )
+        await db.execute(
+            "INSERT INTO star_ledger (user_id, delta, reason, created_at) "
+            "SELECT user_id, amount, 'accrual', ? FROM accrual WHERE amount > 0",
+            (now.isoformat(),)
+        )
+        # Фермы, у которых закончились 6 часов, деактивируются
+        await db.execute(
+            "UPDATE farms SET is_active = 0 WHERE is_active = 1 AND last_activated <= ?",
+            (expired_before,)
+        )
+        cursor = await db.execute("SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM accrual WHERE amount > 0")
+        return tuple(await cursor.fetchone())
+    users, total = await _write(apply, mark_update=False)
+    _bump_all_states()
+    return users, total
+
+async def income_accruer(interval_minutes: float):
+    """Фоновая задача: периодически начислять доход всем пользователям"""
+    while True:
+        await asyncio.sleep(interval_minutes * 60)
+        try:
+            await accrue_all_income()
+        except Exception:
+            logger.exception("Не удалось начислить доход")
+
+# Реферальная система
+async def register_referral(referrer_id: int, referred_id: int) -> bool:
+    """Зарегистрировать реферала (возвращает True если это новый реферал)"""
+    # Запрещаем переход по своей ссылке
+    if referrer_id == referred_id:
+        return False
+    
+    # Проверка и вставка в одной записи: повторный переход ничего не вставит
+    async def apply(db: aiosqlite.Connection) -> bool:
+        cursor = await db.execute(
+            "INSERT INTO referrals (referrer_id, referred_id, reward_given) "
+            "SELECT ?, ?, 0 WHERE NOT EXISTS (SELECT 1 FROM referrals WHERE referred_id = ?)",
+            (referrer_id, referred_id, referred_id)
+        )
+        return cursor.rowcount > 0
+    # Обновление отметит награда (give_referral_reward), которая пишется следом
+    if not await _write(apply, mark_update=False):
+        return False
+    _bump_state(referrer_id)
+    return True
+
+async def give_referral_reward(referred_id: int) -> bool:
+    """Выдать награду рефералу (возвращает True если награда была выдана)"""
+    from config import REFERRAL_REWARD
+    
+    # Отметка награды и звезды в одной записи: из двух одновременных вызовов строку изменит только один
+    async def apply(db: aiosqlite.Connection) -> bool:
+        cursor = await db.execute(
+            "UPDATE referrals SET reward_given = 1 WHERE referred_id = ? AND reward_given = 0",
+            (referred_id,)
+        )
+        if not cursor.rowcount:
+            return False
+        cursor = await db.execute(
+            "UPDATE users SET stars = stars + ? WHERE user_id = ?",
+            (REFERRAL_REWARD, referred_id)
+        )
+        if cursor.rowcount:
+            await _ledger_append(db, referred_id, REFERRAL_REWARD, "referral")
+        return True
+    if not await _write(apply):
+        return False
+    _bump_state(referred_id)
+    return True
+
+async def record_referral(referrer_id: int, referred_id: int):
+    """Записать реферала в базу шарда реферера (сам реферал зарегистрирован на своем шарде)"""
+    await _write(lambda db: db.execute(
+        "INSERT OR IGNORE INTO referrals (referrer_id, referred_id, reward_given) VALUES (?, ?, 1)",
+        (referrer_id, referred_id)
+    ))
+    _bump_state(referrer_id)
+
+async def get_referral_count(user_id: int) -> int:
+    """Получить количество рефералов пользователя"""
+    async with _reader() as db:
+        cursor = await db.execute(
+            "SELECT COUNT(*) as count FROM referrals WHERE referrer_id = ?",
+            (user_id,)
+        )
+        result = await cursor.fetchone()
+        return result[0] if result else 0
+
+# Система аукциона
+async def create_auction(farm_type: str, starting_price: int, duration_hours: int = 24) -> int:
+    """Создать аукцион (возвращает ID аукциона)"""
+    catalog = get_catalog()
+    
+    if farm_type not in catalog.farms:
+        return 0
+    
+    end_time = datetime.now() + timedelta(hours=duration_hours)
+    
+    async def apply(db: aiosqlite.Connection) -> int:
+        cursor = await db.execute(
+            "INSERT INTO auctions (farm_type, starting_price, current_bid, end_time, status) VALUES (?, ?, ?, ?, 'active')",
+            (farm_type, starting_price, starting_price, end_time.isoformat())
+        )
+        return cursor.lastrowid
+    return await _write(apply)
+
+async def get_active_auctions() -> List[Dict]:
+    """Получить все активные аукционы"""
+    async with _reader() as db:
+        cursor = await db.execute(
+            "SELECT * FROM auctions WHERE status = 'active' AND end_time > datetime('now') ORDER BY end_time ASC"
+        )
+        auctions = await cursor.fetchall()
+        return [dict(auction) for auction in auctions]
+
+async def place_bid(auction_id: int, user_id: int, bid_amount: int,
+                    debit=None, credit=None) -> tuple[bool, str]:
+    """Сделать ставку на аукционе (возвращает (успех, сообщение)).
+
+    Без debit и credit списание ставки, возврат предыдущей и изменение аукциона
+    пишутся одной транзакцией. При шардировании координатор передает сюда
+    вызовы шардов, которым принадлежат участники; тогда обновление отмечается
+    обработанным последней записью - изменением аукциона.
+    """
+    # Получаем информацию об аукционе
+    async with _reader() as db:
+        cursor = await db.execute(
+            "SELECT * FROM auctions WHERE id = ? AND status = 'active'",
+            (auction_id,)
+        )
+        auction = await cursor.fetchone()
+    
+    if not auction:
+        return False, "Аукцион не найден или уже завершен"
+    
+    auction_dict = dict(auction)
+    
+    # Проверяем, не истекло ли время
+    end_time = datetime.fromisoformat(auction_dict['end_time'])
+    if datetime.now() >= end_time:
+        await _write(lambda db: db.execute(
+            "UPDATE auctions SET status = 'ended' WHERE id = ?",
+            (auction_id,)
+        ))
+        return False, "Аукцион уже завершен"
+    
+    # Проверяем, что ставка больше текущей
+    current_bid = auction_dict['current_bid']
+    if bid_amount <= current_bid:
+        return False, f"Ставка должна быть больше {current_bid} ⭐"
+    
+    previous_bidder = auction_dict['current_bidder_id']
+    
+    if debit is None and credit is None:
+        async def apply(db: aiosqlite.Connection) -> bool:
+            # Списываем новую ставку (не хватит звезд - ставка не принимается)
+            cursor = await db.execute(
+                "UPDATE users SET stars = stars - ? WHERE user_id = ? AND stars >= ?",
+                (bid_amount, user_id, bid_amount)
+            )
+            if not cursor.rowcount:
+                return False
+            await _ledger_append(db, user_id, -bid_amount, "bid")
+            # Возвращаем предыдущую ставку предыдущему участнику
+            if previous_bidder:
+                cursor = await db.execute(
+                    "UPDATE users SET stars = stars + ? WHERE user_id = ?",
+                    (current_bid, previous_bidder)
+                )
+                if cursor.rowcount:
+                    await _ledger_append(db, previous_bidder, current_bid, "bid_refund")
+            await db.execute(
+                "UPDATE auctions SET current_bid = ?, current_bidder_id = ? WHERE id = ?",
+                (bid_amount, user_id, auction_id)
+            )
+            return True
+        if not await _write(apply):
+            return False, "Недостаточно звезд"
+        _bump_state(user_id, *([previous_bidder] if previous_bidder else []))
+        return True, f"Ставка принята: {bid_amount} ⭐"
+    
+    with _update_mark_deferred():
+        # Списываем новую ставку (не хватит звезд - ставка не принимается)
+        if not await debit(user_id, bid_amount, "bid"):
+            return False, "Недостаточно звезд"
+        
+        # Возвращаем предыдущую ставку предыдущему участнику
+        if previous_bidder:
+            await credit(previous_bidder, current_bid, "bid_refund")
+    
+    # Обновляем аукцион
+    await _write(lambda db: db.execute(
+        "UPDATE auctions SET current_bid = ?, current_bidder_id = ? WHERE id = ?",
+        (bid_amount, user_id, auction_id)
+    ))
+    
+    return True, f"Ставка принята: {bid_amount} ⭐"
+
+async def grant_farm(user_id: int, farm_type: str):
+    """Выдать ферму (выигрыш аукциона)"""
+    await _write(lambda db: db.execute(
+        "INSERT INTO farms (user_id, farm_type) VALUES (?, ?)",
+        (user_id, get_catalog().farm_code(farm_type))
+    ))
+    _bump_state(user_id)
+
+async def end_auction(auction_id: int, grant=None) -> Optional[Dict]:
+    """Завершить аукцион и выдать ферму победителю (возвращает информацию об аукционе).
+    
+    Без grant ферма выдается в той же транзакции, что и завершение аукциона.
+    """
+    async with _reader() as db:
+        cursor = await db.execute(
+            "SELECT * FROM auctions WHERE id = ?",
+            (auction_id,)
+        )
+        auction = await cursor.fetchone()
+    
+    if not auction:
+        return None
+    
+    auction_dict = dict(auction)
+    
+    if auction_dict['status'] != 'active':
+        return None
+    
+    winner_id = auction_dict['current_bidder_id']
+    
+    # Обновляем статус (условно: аукцион завершает только один вызов)
+    async def apply(db: aiosqlite.Connection) -> bool:
+        cursor = await db.execute(
+            "UPDATE auctions SET status = 'ended' WHERE id = ? AND status = 'active'",
+            (auction_id,)
+        )
+        if not cursor.rowcount:
+            return False
+        if winner_id and grant is None:
+            await db.execute(
+                "INSERT INTO farms (user_id, farm_type) VALUES (?, ?)",
+                (winner_id, get_catalog().farm_code(auction_dict['farm_type']))
+            )
+        return True
+    if not await _write(apply):
+        return None
+    
+    # Если есть победитель, выдаем ему ферму
+    if winner_id:
+        if grant is None:
+            _bump_state(winner_id)
+        else:
+            await grant(winner_id, auction_dict['farm_type'])
+    
+    return auction_dict
+
+async def load_processed_updates(limit: int = UPDATE_WINDOW) -> List[int]:
+    """Последние обработанные update_id (от новых к старым)"""
+    async with _reader() as db:
+        cursor = await db.execute(
+            "SELECT update_id FROM processed_updates ORDER BY seq DESC LIMIT ?",
+            (limit,)
+        )
+        return [row[0] for row in await cursor.fetchall()]
+
+# Админ функции
+async def load_bans() -> int:
+    """Загрузить список забаненных в память (возвращает их число)"""
+    global _banned_ids
+    async with _reader() as db:
+        cursor = await db.execute("SELECT user_id FROM bans")
+        _banned_ids = {row[0] for row in await cursor.fetchall()}
+    return len(_banned_ids)
+
+async def is_banned(user_id: int) -> bool:
+    """Проверить, забанен ли пользователь"""
+    if _banned_ids is not None:
+        return user_id in _banned_ids
+    async with _reader() as db:
+        cursor = await db.execute(
+            "SELECT * FROM bans WHERE user_id = ?",
+            (user_id,)
+        )
+        return await cursor.fetchone() is not None
+
+async def ban_user(user_id: int, reason: str, admin_id: int):
+    """Забанить пользователя"""
+    await _write(lambda db: db.execute(
+        "INSERT OR REPLACE INTO bans (user_id, reason, banned_by) VALUES (?, ?, ?)",
+        (user_id, reason, admin_id)
+    ))
+    if _banned_ids is not None:
+        _banned_ids.add(user_id)
+
+async def unban_user(user_id: int):
+    """Разбанить пользователя"""
+    await _write(lambda db: db.execute(
+        "DELETE FROM bans WHERE user_id = ?",
+        (user_id,)
+    ))
+    if _banned_ids is not None:
+        _banned_ids.discard(user_id)
+
+async def admin_add_stars(user_id: int, amount: int):
+    """Админ: добавить звезды пользователю"""
+    await add_stars(user_id, amount, "admin")
+
+async def admin_add_farm(user_id: int, farm_type: str):
+    """Админ: добавить ферму пользователю"""
+    await _write(lambda db: db.execute(
+        "INSERT INTO farms (user_id, farm_type, last_activated, is_active) VALUES (?, ?, ?, 0)",
+        (user_id, get_catalog().farm_code(farm_type), datetime.now().isoformat())
+    ))
+    _bump_state(user_id)
+
+async def admin_add_nft(user_id: int, nft_type: str):
+    """Админ: добавить NFT пользователю"""
+    catalog = get_catalog()
+    
+    async def apply(db: aiosqlite.Connection):
+        await db.execute(
+            "INSERT INTO nfts (user_id, nft_type) VALUES (?, ?)",
+            (user_id, catalog.nft_code(nft_type))
+        )
+        await db.execute(
+            "UPDATE users SET boost = boost * ? WHERE user_id = ?",
+            (catalog.nfts[nft_type]["boost"], user_id)
+        )
+    await _write(apply)
+    _bump_state(user_id)
+
+# Массовая выдача
+BULK_FILTERS = ("all", "farm", "before")
+
+async def iter_user_ids(kind: str, value: str = None,
+                        chunk_size: int = BULK_GRANT_CHUNK_SIZE) -> AsyncIterator[List[int]]:
+    """Потоково выбрать ID пользователей по фильтру пачками.
+    
+    kind: all - все, farm - владельцы фермы типа value, before - зарегистрированные до даты value.
+    """
+    if kind == "all":
+        query = "SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?"
+        params = ()
+    elif kind == "farm":
+        catalog = get_catalog()
+        if value not in catalog.farms:
+            raise ValueError(f"Неизвестный тип фермы: {value}")
+        query = "SELECT DISTINCT user_id FROM farms WHERE farm_type = ? AND user_id > ? ORDER BY user_id LIMIT ?"
+        params = (catalog.farm_code(value),)
+    elif kind == "before":
+        query = "SELECT user_id FROM users WHERE created_at < ? AND user_id > ? ORDER BY user_id LIMIT ?"
+        params = (value,)
+    else:
+        raise ValueError(f"Неизвестный фильтр: {kind}")
+    
+    last_id = -1
+    while True:
+        # Соединение из пула берется на одну пачку и не держится, пока пачку обрабатывают
+        async with _reader() as db:
+            cursor = await db.execute(query, (*params, last_id, chunk_size))
+            user_ids = [row[0] for row in await cursor.fetchall()]
+        if not user_ids:
+            return
+        last_id = user_ids[-1]
+        yield user_ids
+        if len(user_ids) < chunk_size:
+            return
+
+async def filter_existing_users(user_ids: List[int]) -> set:
+    """Оставить только существующих пользователей"""
+    existing = set()
+    async with _reader() as db:
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            cursor = await db.execute(
+                f"SELECT user_id FROM users WHERE user_id IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+            existing.update(row[0] for row in await cursor.fetchall())
+    return existing
+
+async def bulk_add_stars(grants: List[tuple[int, int]], mark_update: bool = True):
+    """Админ: выдать звезды пачке пользователей одной транзакцией ([(user_id, amount)]).
+    
+    mark_update=False - для всех пачек выдачи, кроме последней: обновление отмечает она.
+    """
+    now = datetime.now().isoformat()
+    
+    async def apply(db: aiosqlite.Connection):
+        await db.executemany(
+            "UPDATE users SET stars = stars + ? WHERE user_id = ?",
+            [(amount, user_id) for user_id, amount in grants]
+        )
+        # Журнал пишется в той же транзакции, что и балансы
+        await db.executemany(
+            "INSERT INTO star_ledger (user_id, delta, reason, created_at) VALUES (?, ?, 'admin', ?)",
+            [(user_id, amount, now) for user_id, amount in grants if amount]
+        )
+    await _write(apply, mark_update)
+    _bump_state(*(user_id for user_id, _ in grants))
+
+async def bulk_add_farms(grants: List[tuple[int, str]], mark_update: bool = True):
+    """Админ: выдать фермы пачке пользователей одной транзакцией ([(user_id, farm_type)])"""
+    now = datetime.now().isoformat()
+    catalog = get_catalog()
+    await _write(lambda db: db.executemany(
+        "INSERT INTO farms (user_id, farm_type, last_activated, is_active) VALUES (?, ?, ?, 0)",
+        [(user_id, catalog.farm_code(farm_type), now) for user_id, farm_type in grants]
+    ), mark_update)
+    _bump_state(*(user_id for user_id, _ in grants))
+
+async def bulk_add_nfts(grants: List[tuple[int, str]], mark_update: bool = True):
+    """Админ: выдать NFT пачке пользователей одной транзакцией ([(user_id, nft_type)])"""
+    catalog = get_catalog()
+    
+    async def apply(db: aiosqlite.Connection):
+        await db.executemany(
+            "INSERT INTO nfts (user_id, nft_type) VALUES (?, ?)",
+            [(user_id, catalog.nft_code(nft_type)) for user_id, nft_type in grants]
+        )
+        await db.executemany(
+            "UPDATE users SET boost = boost * ? WHERE user_id = ?",
+            [(catalog.nfts[nft_type]["boost"], user_id) for user_id, nft_type in grants]
+        )
+    await _write(apply, mark_update)
+    _bump_state(*(user_id for user_id, _ in grants))
+
+async def warm_hot_users() -> int:
+    """Прочитать строки пользователей, активных сегодня и вчера, чтобы их страницы
+    оказались в кэше до первых запросов (возвращает число пользователей)"""
+    since = (datetime.now() - timedelta(days=1)).date().isoformat()
+    async with _reader() as db:
+        # Агрегаты по столбцам таблиц (а не только по индексам) читают сами строки
+        cursor = await db.execute(
+            "WITH hot AS (SELECT DISTINCT user_id FROM daily_active WHERE day >= ?) "
+            "SELECT (SELECT COUNT(*) FROM hot), "
+            "       (SELECT SUM(stars) FROM users WHERE user_id IN hot), "
+            "       (SELECT COUNT(last_activated) FROM farms WHERE user_id IN hot), "
+            "       (SELECT COUNT(nft_type) FROM nfts WHERE user_id IN hot)",
+            (since,)
+        )
+        row = await cursor.fetchone()
+        await cursor.close()
+    return row[0]
+
+async def get_all_users() -> List[Dict]:
+    """Получить всех пользователей"""
+    async with _reader() as db:
+        cursor = await db.execute("SELECT * FROM users")
+        users = await cursor.fetchall()
+        return [dict(user) for user in users]
+
+async def get_all_chats() -> List[Dict]:
+    """Получить все чаты"""
+    async with _reader() as db:
+        cursor = await db.execute("SELECT * FROM chats")
+        chats = await cursor.fetchall()
+        return [dict(chat) for chat in chats]
+
+async def iter_table(table: str, chunk_size: int = STREAM_CHUNK_SIZE, where: str = "1") -> AsyncIterator[List[Dict]]:
+    """Потоково обойти таблицу пачками по chunk_size строк (только строки, подходящие под where).
+    
+    Каждая пачка читается отдельным коротким запросом по ключу (keyset pagination),
+    поэтому обход не держит блокировку чтения и в памяти лежит не больше одной пачки.
+    """
+    key = STREAM_TABLES[table]
+    last_key = None
+    while True:
+        async with _reader() as db:
+            if last_key is None:
+                cursor = await db.execute(
+                    f"SELECT * FROM {table} WHERE {where} ORDER BY {key} LIMIT ?",
+                    (chunk_size,)
+                )
+            else:
+                cursor = await db.execute(
+                    f"SELECT * FROM {table} WHERE {where} AND {key} > ? ORDER BY {key} LIMIT ?",
+                    (last_key, chunk_size)
+                )
+            rows = await cursor.fetchall()
+            await cursor.close()
+        if not rows:
+            return
+        last_key = rows[-1][key]
+        yield [dict(row) for row in rows]
+        if len(rows) < chunk_size:
+            return
+
+async def iter_users(chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[List[Dict]]:
+    """Потоково обойти пачками пользователей, которым можно писать"""
+    async for chunk in iter_table("users", chunk_size, "unreachable_at IS NULL"):
+        yield chunk
+
+async def iter_chats(chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[List[Dict]]:
+    """Потоково обойти пачками чаты, в которых остался бот"""
+    async for chunk in iter_table("chats", chunk_size, "unreachable_at IS NULL"):
+        yield chunk
+
+async def count_rows(table: str) -> int:
+    """Количество строк в таблице"""
+    if table not in STREAM_TABLES:
+        raise ValueError(f"Неизвестная таблица: {table}")
+    async with _reader() as db:
+        cursor = await db.execute(f"SELECT COUNT(*) FROM {table}")
+        result = await cursor.fetchone()
+        return result[0] if result else 0
+
+async def add_chat(chat_id: int, chat_type: str, title: str = None):
+    """Добавить чат в базу"""
+    await _write(lambda db: db.execute(
+        "INSERT OR IGNORE INTO chats (chat_id, chat_type, title) VALUES (?, ?, ?)",
+        (chat_id, chat_type, title)
+    ), mark_update=False)
+
+async def mark_unreachable(chat_ids: List[int]):
+    """Отметить пользователей и чаты, которым больше нельзя писать (ID чата лички - ID пользователя)"""
+    rows = [(datetime.now().isoformat(), chat_id) for chat_id in chat_ids]
+    
+    async def apply(db: aiosqlite.Connection):
+        await db.executemany(
+            "UPDATE users SET unreachable_at = ? WHERE user_id = ? AND unreachable_at IS NULL", rows
+        )
+        await db.executemany(
+            "UPDATE chats SET unreachable_at = ? WHERE chat_id = ? AND unreachable_at IS NULL", rows
+        )
+    await _write(apply)
+
+async def mark_reachable(chat_id: int):
+    """Снова писать пользователю или в чат (разблокировал бота, бота вернули в чат)"""
+    async def apply(db: aiosqlite.Connection):
+        await db.execute("UPDATE users SET unreachable_at = NULL WHERE user_id = ?", (chat_id,))
+        await db.execute("UPDATE chats SET unreachable_at = NULL WHERE chat_id = ?", (chat_id,))
+    await _write(apply)
+
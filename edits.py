@@ -0,0 +1,83 @@
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, Message
+
+# Для скольких сообщений помнить последний отправленный текст
+EDIT_CACHE_SIZE = 20000
+
+class CallbackDeduplicator:
+    """Нажатия кнопок в обработке: повтор того же нажатия того же пользователя отбрасывается.
+
+    Двойное нажатие приходит двумя обновлениями с одинаковыми данными кнопки;
+    пока первое обрабатывается, второе не должно еще раз покупать или ставить.
+    """
+
+    def __init__(self):
+        self._keys: set = set()
+
+    def claim(self, key: Hashable) -> bool:
+        """Занять нажатие (False, если такое же уже обрабатывается)"""
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        return True
+
+    def release(self, key: Hashable):
+        """Освободить нажатие после обработки"""
+        self._keys.discard(key)
+
+def _digest(text: str, reply_markup: Optional[InlineKeyboardMarkup]) -> bytes:
+    """Хэш текста и клавиатуры сообщения"""
+    h = hashlib.blake2b(text.encode(), digest_size=16)
+    if reply_markup is not None:
+        h.update(reply_markup.model_dump_json().encode())
+    return h.digest()
+
+class EditCoalescer:
+    """Редактирование сообщений без лишних запросов к Bot API.
+
+    Правка пропускается, если текст и клавиатура совпадают с последними
+    отправленными в это сообщение. Пока правка сообщения идет, новые правки
+    не отправляются, а заменяют друг друга: после текущей уходит только
+    последняя из них.
+    """
+
+    def __init__(self, max_size: int = EDIT_CACHE_SIZE):
+        self.max_size = max_size
+        self._sent: OrderedDict = OrderedDict()
+        # Сообщения, правка которых идет, и отложенная последняя правка (или None)
+        self._pending: Dict[tuple, Optional[tuple]] = {}
+
+    async def edit(self, message: Message, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None):
+        """Изменить текст и клавиатуру сообщения"""
+        key = (message.chat.id, message.message_id)
+        edit = (message, text, reply_markup, _digest(text, reply_markup))
+        if key in self._pending:
+            self._pending[key] = edit
+            return
+
+        self._pending[key] = None
+        try:
+            while edit is not None:
+                await self._send(key, *edit)
+                edit = self._pending[key]
+                self._pending[key] = None
+        finally:
+            del self._pending[key]
+
+    async def _send(self, key: tuple, message: Message, text: str, reply_markup, digest: bytes):
+        """Отправить правку, если сообщение от нее изменится"""
+        if self._sent.get(key) == digest:
+            return
+        try:
+            await message.edit_text(text, reply_markup=reply_markup)
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
+        self._sent[key] = digest
+        self._sent.move_to_end(key)
+        if len(self._sent) > self.max_size:
+            self._sent.popitem(last=False)
@@ -0,0 +1,110 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime
+
+from catalog import get_catalog, known_code
+from repository import repo
+
+# Таблицы, которые попадают в выгрузку
+EXPORT_TABLES = ("users", "farms", "nfts", "auctions")
+EXPORT_FORMATS = ("csv", "ndjson")
+# Колонки, где тип хранится кодом каталога: в выгрузке вместо кода - ID типа
+TYPE_COLUMNS = {
+    "farms": ("farm_type", lambda catalog: catalog.farm_ids),
+    "nfts": ("nft_type", lambda catalog: catalog.nft_ids),
+}
+
+def _decode_types(table: str, rows: list, catalog) -> list:
+    """Заменить коды типов на ID из каталога (код типа, которого нет в каталоге, остается числом)"""
+    if table not in TYPE_COLUMNS:
+        return rows
+    column, get_ids = TYPE_COLUMNS[table]
+    ids = get_ids(catalog)
+    for row in rows:
+        code = row[column]
+        if isinstance(code, int) and known_code(code, ids):
+            row[column] = ids[code]
+    return rows
+
+async def _write_table(archive: zipfile.ZipFile, table: str, fmt: str) -> int:
+    """Записать таблицу в архив построчно (возвращает число строк)"""
+    rows_written = 0
+    catalog = get_catalog()
+    with archive.open(f"{table}.{fmt}", "w", force_zip64=True) as raw:
+        stream = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+        writer = None
+        async for chunk in repo.iter_table(table):
+            chunk = _decode_types(table, chunk, catalog)
+            if fmt == "csv":
+                if writer is None:
+                    writer = csv.DictWriter(stream, fieldnames=list(chunk[0].keys()))
+                    writer.writeheader()
+                writer.writerows(chunk)
+            else:
+                stream.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in chunk))
+            rows_written += len(chunk)
+        stream.flush()
+        stream.detach()
+    return rows_written
+
+async def export_dump(fmt: str = "csv", tables=EXPORT_TABLES) -> tuple[str, dict]:
+    """Выгрузить таблицы в сжатый zip во временном файле (возвращает (путь, строк по таблицам)).
+
+    Строки читаются и сжимаются пачками, поэтому память не зависит от размера таблиц.
+    Удалить файл после отправки должен вызывающий код.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+
+    fd, path = tempfile.mkstemp(prefix=f"export_{datetime.now():%Y%m%d_%H%M%S}_", suffix=".zip")
+    os.close(fd)
+    counts = {}
+    try:
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for table in tables:
+                counts[table] = await _write_table(archive, table, fmt)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, counts
+
+def merge_dumps(paths: list, fmt: str, tables=EXPORT_TABLES) -> str:
+    """Склеить выгрузки шардов в один zip (возвращает путь; исходные файлы удаляются).
+
+    Строки каждой таблицы идут подряд по частям, заголовок CSV пишется один раз.
+    Одна часть возвращается как есть.
+    """
+    if len(paths) == 1:
+        return paths[0]
+
+    fd, path = tempfile.mkstemp(prefix=f"export_{datetime.now():%Y%m%d_%H%M%S}_", suffix=".zip")
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for table in tables:
+                name = f"{table}.{fmt}"
+                with archive.open(name, "w", force_zip64=True) as out:
+                    header_written = False
+                    for part in paths:
+                        with zipfile.ZipFile(part) as source, source.open(name) as rows:
+                            if fmt == "csv":
+                                # Пустая таблица шарда записана без заголовка
+                                header = rows.readline()
+                                if not header:
+                                    continue
+                                if not header_written:
+                                    out.write(header)
+                                    header_written = True
+                            shutil.copyfileobj(rows, out)
+    except Exception:
+        os.remove(path)
+        raise
+    finally:
+        for part in paths:
+            os.remove(part)
+    return path
@@ -1,85 +1,161 @@
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-from config import FARM_TYPES, NFT_GIFTS
-
-def get_main_menu():
-    """Главное меню"""
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="⭐ Мой профиль"), KeyboardButton(text="🌾 Мои фермы")],
-            [KeyboardButton(text="🛒 Магазин ферм"), KeyboardButton(text="🎁 Магазин NFT")],
-            [KeyboardButton(text="💰 Собрать доход"), KeyboardButton(text="🔗 Реферальная ссылка")],
-            [KeyboardButton(text="🔨 Аукцион"), KeyboardButton(text="🎰 Казино")]
-        ],
-        resize_keyboard=True
-    )
-    return keyboard
-
-def get_farm_shop_keyboard():
-    """Клавиатура магазина ферм"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
-    
-    for farm_id, farm_data in FARM_TYPES.items():
-        keyboard.inline_keyboard.append([
-            InlineKeyboardButton(
-                text=f"{farm_data['name']} - {farm_data['price']} ⭐",
-                callback_data=f"buy_farm_{farm_id}"
-            )
-        ])
-    
-    keyboard.inline_keyboard.append([
-        InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")
-    ])
-    
-    return keyboard
-
-def get_nft_shop_keyboard():
-    """Клавиатура магазина NFT"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
-    
-    for nft_id, nft_data in NFT_GIFTS.items():
-        boost_text = f"+{int((nft_data['boost'] - 1) * 100)}%"
-        keyboard.inline_keyboard.append([
-            InlineKeyboardButton(
-                text=f"{nft_data['name']} - {nft_data['price']} ⭐ ({boost_text})",
-                callback_data=f"buy_nft_{nft_id}"
-            )
-        ])
-    
-    keyboard.inline_keyboard.append([
-        InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")
-    ])
-    
-    return keyboard
-
-def get_back_keyboard():
-    """Клавиатура с кнопкой назад"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")]
-    ])
-    return keyboard
-
-def get_auction_keyboard(auction_id: int, current_bid: int):
-    """Клавиатура для аукциона"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(
-                text=f"💰 Ставка: {current_bid + 100} ⭐",
-                callback_data=f"bid_{auction_id}_{current_bid + 100}"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                text=f"💰 Ставка: {current_bid + 500} ⭐",
-                callback_data=f"bid_{auction_id}_{current_bid + 500}"
-            )
-        ],
-        [
-            InlineKeyboardButton(
-                text=f"💰 Ставка: {current_bid + 1000} ⭐",
-                callback_data=f"bid_{auction_id}_{current_bid + 1000}"
-            )
-        ],
-        [InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")]
-    ])
-    return keyboard
-
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+from catalog import get_catalog
+from templates import DEFAULT_LOCALE, t, fragment, farm_name, nft_name
+from callbacks import BuyFarm, BuyNft, Bid, AdminFarm, AdminNft
+
+# Кнопки покупки нескольких предметов (0 - на все звезды)
+PURCHASE_QUANTITIES = (("×10", 10), ("×100", 100), ("max", 0))
+
+# Шаги ставок на аукционе
+AUCTION_BID_STEPS = (100, 500, 1000)
+
+def _quantity_row(data_class, code: int):
+    """Ряд кнопок покупки нескольких предметов"""
+    return [
+        InlineKeyboardButton(text=text, callback_data=data_class(code=code, qty=qty).pack())
+        for text, qty in PURCHASE_QUANTITIES
+    ]
+
+def get_main_menu(locale: str = DEFAULT_LOCALE):
+    """Главное меню"""
+    return fragment(locale, "kb.main_menu", _build_main_menu)
+
+def _build_main_menu(locale: str):
+    """Собрать главное меню для локали"""
+    keyboard = ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text=t(locale, "menu.profile")), KeyboardButton(text=t(locale, "menu.farms"))],
+            [KeyboardButton(text=t(locale, "menu.farm_shop")), KeyboardButton(text=t(locale, "menu.nft_shop"))],
+            [KeyboardButton(text=t(locale, "menu.collect")), KeyboardButton(text=t(locale, "menu.referral"))],
+            [KeyboardButton(text=t(locale, "menu.auction")), KeyboardButton(text=t(locale, "menu.casino"))]
+        ],
+        resize_keyboard=True
+    )
+    return keyboard
+
+def get_farm_shop_keyboard(locale: str = DEFAULT_LOCALE):
+    """Клавиатура магазина ферм"""
+    return fragment(locale, "kb.farm_shop", _build_farm_shop_keyboard)
+
+def _build_farm_shop_keyboard(locale: str):
+    """Собрать клавиатуру магазина ферм для локали"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
+    
+    for farm_id, farm_data in get_catalog().farms.items():
+        keyboard.inline_keyboard.append([
+            InlineKeyboardButton(
+                text=t(locale, "shop.farm_button", name=farm_name(locale, farm_id), price=farm_data['price']),
+                callback_data=BuyFarm(code=farm_data['code'], qty=1).pack()
+            )
+        ])
+        keyboard.inline_keyboard.append(_quantity_row(BuyFarm, farm_data['code']))
+    
+    keyboard.inline_keyboard.append([
+        InlineKeyboardButton(text=t(locale, "button.back"), callback_data="back_to_main")
+    ])
+    
+    return keyboard
+
+def get_nft_shop_keyboard(locale: str = DEFAULT_LOCALE):
+    """Клавиатура магазина NFT"""
+    return fragment(locale, "kb.nft_shop", _build_nft_shop_keyboard)
+
+def _build_nft_shop_keyboard(locale: str):
+    """Собрать клавиатуру магазина NFT для локали"""
+    catalog = get_catalog()
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
+    
+    for nft_id, nft_data in catalog.nfts.items():
+        keyboard.inline_keyboard.append([
+            InlineKeyboardButton(
+                text=t(
+                    locale, "shop.nft_button", name=nft_name(locale, nft_id),
+                    price=nft_data['price'], boost=catalog.nft_boost_percent[nft_id]
+                ),
+                callback_data=BuyNft(code=nft_data['code'], qty=1).pack()
+            )
+        ])
+        keyboard.inline_keyboard.append(_quantity_row(BuyNft, nft_data['code']))
+    
+    keyboard.inline_keyboard.append([
+        InlineKeyboardButton(text=t(locale, "button.back"), callback_data="back_to_main")
+    ])
+    
+    return keyboard
+
+def get_back_keyboard(locale: str = DEFAULT_LOCALE):
+    """Клавиатура с кнопкой назад"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=t(locale, "button.back"), callback_data="back_to_main")]
+    ])
+    return keyboard
+
+def get_auction_keyboard(auction_id: int, current_bid: int, locale: str = DEFAULT_LOCALE):
+    """Клавиатура для аукциона"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(
+                text=t(locale, "button.bid", amount=current_bid + step),
+                callback_data=Bid(id=auction_id, amount=current_bid + step).pack()
+            )
+        ]
+        for step in AUCTION_BID_STEPS
+    ])
+    keyboard.inline_keyboard.append([
+        InlineKeyboardButton(text=t(locale, "button.back"), callback_data="back_to_main")
+    ])
+    return keyboard
+
+def get_casino_menu(locale: str = DEFAULT_LOCALE):
+    """Меню казино"""
+    return fragment(locale, "kb.casino_menu", _build_casino_menu)
+
+def _build_casino_menu(locale: str):
+    """Собрать меню казино для локали"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=t(locale, "button.dice"), callback_data="casino_dice")],
+        [InlineKeyboardButton(text=t(locale, "button.slots"), callback_data="casino_slots")],
+        [InlineKeyboardButton(text=t(locale, "button.roulette"), callback_data="casino_roulette")],
+        [InlineKeyboardButton(text=t(locale, "button.back"), callback_data="back_to_main")]
+    ])
+    return keyboard
+
+def get_admin_menu():
+    """Админ меню"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="💰 Выдать звезды", callback_data="admin_give_stars")],
+        [InlineKeyboardButton(text="🌾 Выдать ферму", callback_data="admin_give_farm")],
+        [InlineKeyboardButton(text="🎁 Выдать NFT", callback_data="admin_give_nft")],
+        [InlineKeyboardButton(text="📊 Экономика", callback_data="admin_economy")]
+    ])
+    return keyboard
+
+def get_farm_select_keyboard():
+    """Админ: клавиатура выбора фермы"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
+    
+    for farm_id, farm_data in get_catalog().farms.items():
+        keyboard.inline_keyboard.append([
+            InlineKeyboardButton(text=farm_data['name'], callback_data=AdminFarm(code=farm_data['code']).pack())
+        ])
+    
+    keyboard.inline_keyboard.append([
+        InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")
+    ])
+    
+    return keyboard
+
+def get_nft_select_keyboard():
+    """Админ: клавиатура выбора NFT"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[])
+    
+    for nft_id, nft_data in get_catalog().nfts.items():
+        keyboard.inline_keyboard.append([
+            InlineKeyboardButton(text=nft_data['name'], callback_data=AdminNft(code=nft_data['code']).pack())
+        ])
+    
+    keyboard.inline_keyboard.append([
+        InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")
+    ])
+    
+    return keyboard
@@ -0,0 +1,86 @@
+"""Восстановление балансов звезд из журнала star_ledger.
+
+Берет последний снимок балансов (star_snapshots) и докатывает поверх него записи
+журнала, сделанные после снимка. Агрегация идет внутри SQLite (GROUP BY по покрывающему
+индексу), поэтому журнал читается со скоростью в миллионы записей в секунду.
+
+Запуск:
+    python ledger_replay.py                 # сверить журнал с users.stars
+    python ledger_replay.py --full          # пересчитать с нуля, без снимка
+    python ledger_replay.py --until 123456  # балансы на момент записи журнала
+    python ledger_replay.py --apply         # записать восстановленные балансы в users
+"""
+import argparse
+import sqlite3
+import time
+
+from database import DB_NAME
+
+def load_snapshot(db: sqlite3.Connection, until: int = None) -> tuple[dict, int]:
+    """Последний снимок балансов (балансы, ID записи журнала) или пустой, если он позже until"""
+    checkpoint = db.execute("SELECT ledger_id FROM ledger_checkpoints ORDER BY id DESC LIMIT 1").fetchone()
+    # Хранится только последний снимок, для более ранних точек считаем с нуля
+    if not checkpoint or (until is not None and checkpoint[0] > until):
+        return {}, 0
+    return dict(db.execute("SELECT user_id, stars FROM star_snapshots")), checkpoint[0]
+
+def replay(db: sqlite3.Connection, balances: dict, after: int, until: int = None) -> int:
+    """Докатить записи журнала (after, until] на balances (возвращает число записей)"""
+    if until is None:
+        until = db.execute("SELECT COALESCE(MAX(id), 0) FROM star_ledger").fetchone()[0]
+    # Полная докатка идет по покрывающему индексу (user_id, delta) без сортировки,
+    # короткий хвост после снимка дешевле читать по диапазону rowid
+    source = "star_ledger INDEXED BY idx_star_ledger_user" if after == 0 else "star_ledger"
+    rows = 0
+    for user_id, delta, count in db.execute(
+        f"SELECT user_id, SUM(delta), COUNT(*) FROM {source} WHERE id > ? AND id <= ? GROUP BY user_id",
+        (after, until)
+    ):
+        balances[user_id] = balances.get(user_id, 0) + delta
+        rows += count
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Восстановление балансов из журнала звезд")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--full", action="store_true", help="пересчитать с нуля, без снимка")
+    parser.add_argument("--until", type=int, default=None, help="последняя учитываемая запись журнала")
+    parser.add_argument("--apply", action="store_true", help="записать балансы в users.stars")
+    parser.add_argument("--show", type=int, default=20, help="сколько расхождений вывести")
+    args = parser.parse_args()
+    if args.apply and args.until is not None:
+        parser.error("--apply нельзя сочетать с --until: это откатит текущие балансы")
+
+    db = sqlite3.connect(args.db)
+    started = time.perf_counter()
+
+    balances, after = ({}, 0) if args.full else load_snapshot(db, args.until)
+    rows = replay(db, balances, after, args.until)
+
+    elapsed = time.perf_counter() - started
+    speed = rows / elapsed if elapsed > 0 else 0
+    source = f"снимок на записи {after}" if after else "с нуля"
+    print(f"Восстановлено ({source}): {rows:,} записей за {elapsed:.3f} с ({speed:,.0f} записей/с)")
+    print(f"Пользователей: {len(balances):,}")
+
+    mismatches = [
+        (user_id, stars, balances.get(user_id, 0))
+        for user_id, stars in db.execute("SELECT user_id, stars FROM users")
+        if balances.get(user_id, 0) != stars
+    ]
+    print(f"Расхождений с users.stars: {len(mismatches):,}")
+    for user_id, stars, rebuilt in mismatches[:args.show]:
+        print(f"  {user_id}: в users {stars}, по журналу {rebuilt} ({rebuilt - stars:+})")
+
+    if args.apply:
+        db.executemany(
+            "UPDATE users SET stars = ? WHERE user_id = ?",
+            [(rebuilt, user_id) for user_id, _, rebuilt in mismatches]
+        )
+        db.commit()
+        print(f"Исправлено балансов: {len(mismatches):,}")
+
+    db.close()
+
+if __name__ == "__main__":
+    main()
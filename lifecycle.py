@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд при остановке ждать завершения начатых обновлений и отправки очереди
+DRAIN_TIMEOUT = 20
+
+class Lifecycle:
+    """Запуск и остановка бота по шагам.
+
+    При запуске по очереди выполняются шаги подготовки (миграции, соединения,
+    прогрев кэшей), затем стартуют фоновые задачи; прием обновлений начинается
+    только после этого. При остановке прием уже прекращен диспетчером, поэтому
+    остается дождаться начатых обновлений (не дольше DRAIN_TIMEOUT), остановить
+    фоновые задачи и выполнить шаги закрытия (сброс буферов, соединения).
+    """
+
+    def __init__(self, drain_timeout: float = DRAIN_TIMEOUT):
+        self.drain_timeout = drain_timeout
+        self.in_flight = 0
+        self.ready_seconds = None
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._startup_steps: List[tuple[str, Callable[[], Awaitable]]] = []
+        self._drain_steps: List[tuple[str, Callable[[], Awaitable]]] = []
+        self._shutdown_steps: List[tuple[str, Callable[[], Awaitable]]] = []
+        self._background: List[Callable[[], Awaitable]] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def on_startup(self, name: str, step: Callable[[], Awaitable]):
+        """Добавить шаг запуска"""
+        self._startup_steps.append((name, step))
+
+    def on_drain(self, name: str, step: Callable[[], Awaitable]):
+        """Добавить ожидание при остановке (пока работают фоновые задачи, в пределах DRAIN_TIMEOUT)"""
+        self._drain_steps.append((name, step))
+
+    def on_shutdown(self, name: str, step: Callable[[], Awaitable]):
+        """Добавить шаг остановки"""
+        self._shutdown_steps.append((name, step))
+
+    def background(self, factory: Callable[[], Awaitable]):
+        """Добавить фоновую задачу (запускается после шагов запуска)"""
+        self._background.append(factory)
+
+    async def middleware(self, handler, event, data):
+        """Внешний middleware: считает обновления в обработке"""
+        self.in_flight += 1
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            if not self.in_flight:
+                self._idle.set()
+
+    async def startup(self):
+        """Выполнить шаги запуска и запустить фоновые задачи"""
+        started = time.perf_counter()
+        for name, step in self._startup_steps:
+            step_started = time.perf_counter()
+            result = await step()
+            details = f" ({result})" if result is not None else ""
+            logger.info(f"Запуск: {name}{details} за {time.perf_counter() - step_started:.3f} с")
+        self._tasks = [asyncio.create_task(factory()) for factory in self._background]
+        self.ready_seconds = time.perf_counter() - started
+        logger.info(f"Бот готов к работе за {self.ready_seconds:.3f} с")
+
+    async def shutdown(self):
+        """Дождаться начатых обновлений, остановить фоновые задачи и выполнить шаги остановки"""
+        started = time.perf_counter()
+        deadline = started + self.drain_timeout
+        # Задачи обработки уже созданы диспетчером, но могли еще не дойти до middleware
+        await asyncio.sleep(0)
+        for name, step in [("обновления в обработке", self._idle.wait), *self._drain_steps]:
+            try:
+                await asyncio.wait_for(step(), max(deadline - time.perf_counter(), 0))
+            except asyncio.TimeoutError:
+                logger.warning(f"Остановка: не дождались ({name}) за {self.drain_timeout} с")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        for name, step in self._shutdown_steps:
+            try:
+                await step()
+            except Exception:
+                logger.exception(f"Остановка: ошибка на шаге {name}")
+        logger.info(f"Бот остановлен за {time.perf_counter() - started:.3f} с")
@@ -1,1240 +1,1803 @@
-import asyncio
-import logging
-from aiogram import Bot, Dispatcher, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.filters import Command, CommandStart
-from config import BOT_TOKEN, FARM_TYPES, NFT_GIFTS, GAME_NAME, ADMIN_IDS
-from database import (
-    init_db, get_or_create_user, get_user_stars, 
-    buy_farm, get_user_farms, buy_nft, get_user_nfts,
-    calculate_total_boost, collect_farm_income,
-    register_referral, give_referral_reward, get_referral_count,
-    create_auction, get_active_auctions, place_bid, end_auction,
-    activate_farms, is_banned, ban_user, unban_user,
-    admin_add_stars, admin_add_farm, admin_add_nft,
-    get_all_users, get_all_chats, add_chat, spend_stars, add_stars
-)
-from keyboards import (
-    get_main_menu, get_farm_shop_keyboard, 
-    get_nft_shop_keyboard, get_back_keyboard, get_auction_keyboard,
-    get_admin_menu, get_casino_menu, get_farm_select_keyboard, get_nft_select_keyboard
-)
-
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-# Инициализация бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
-
-@dp.message(CommandStart())
-async def cmd_start(message: Message):
-    """Обработчик команды /start"""
-    user_id = message.from_user.id
-    
-    # Проверка на бан
-    if await is_banned(user_id):
-        await message.answer("❌ Вы заблокированы в боте!")
-        return
-    
-    args = message.text.split()[1:] if len(message.text.split()) > 1 else []
-    
-    # Проверяем реферальную ссылку
-    is_new_user = False
-    if args:
-        try:
-            referrer_id = int(args[0])
-            # Запрещаем переход по своей ссылке
-            if referrer_id != user_id:
-                is_new_user = await register_referral(referrer_id, user_id)
-                if is_new_user:
-                    await give_referral_reward(user_id)
-                    # Уведомляем реферера
-                    try:
-                        from config import REFERRAL_REWARD
-                        referrer_name = message.from_user.full_name or f"@{message.from_user.username}" if message.from_user.username else "Пользователь"
-                        referrer_mention = f"@{message.from_user.username}" if message.from_user.username else referrer_name
-                        notification = (
-                            f"🎉 Новый пользователь {referrer_mention} зарегистрировался по вашей реферальной ссылке!\n"
-                            f"💰 Вам зачислено {REFERRAL_REWARD} ⭐"
-                        )
-                        await bot.send_message(referrer_id, notification)
-                    except:
-                        pass
-        except ValueError:
-            pass
-    
-    user = await get_or_create_user(user_id)
-    
-    welcome_text = (
-        f"🌟 Добро пожаловать в {GAME_NAME}!\n\n"
-        "💰 Валюта: Звезды ⭐\n"
-        "🌾 Покупайте фермы, которые приносят звезды\n"
-        "🎁 Покупайте NFT подарки для буста к доходу\n\n"
-    )
-    
-    if is_new_user:
-        from config import REFERRAL_REWARD
-        welcome_text += f"🎉 Вы получили {REFERRAL_REWARD} ⭐ за регистрацию по реферальной ссылке!\n\n"
-    
-    welcome_text += "Используйте меню для навигации или команду /help для списка команд!"
-    
-    # В группах не показываем клавиатуру
-    if message.chat.type == "private":
-        await message.answer(welcome_text, reply_markup=get_main_menu())
-    else:
-        await message.reply(welcome_text)
-
-@dp.message(Command("help"))
-async def cmd_help(message: Message):
-    """Обработчик команды /help"""
-    help_text = (
-        f"📖 Справка по командам {GAME_NAME}\n\n"
-        "🔹 /start - Начать игру или зарегистрироваться\n"
-        "🔹 /help - Показать эту справку\n"
-        "🔹 /profile - Показать ваш профиль\n"
-        "🔹 /farms - Показать ваши фермы\n"
-        "🔹 /shop - Открыть магазин ферм\n"
-        "🔹 /nft - Открыть магазин NFT\n"
-        "🔹 /collect - Собрать доход с ферм\n"
-        "🔹 /activate - Активировать фермы (каждые 6 часов)\n"
-        "🔹 /referral - Получить реферальную ссылку\n"
-        "🔹 /auction - Показать активные аукционы\n\n"
-        "💡 Важно:\n"
-        "• Фермы нужно активировать каждые 6 часов\n"
-        "• Только активированные фермы приносят доход\n"
-        "• Используйте NFT для увеличения дохода\n"
-        "• Приглашайте друзей по реферальной ссылке!"
-    )
-    
-    if message.chat.type == "private":
-        await message.answer(help_text)
-    else:
-        await message.reply(help_text)
-
-@dp.message(Command("profile"))
-async def cmd_profile(message: Message):
-    """Команда /profile"""
-    await show_profile_handler(message)
-
-@dp.message(F.text == "⭐ Мой профиль")
-async def show_profile(message: Message):
-    """Показать профиль пользователя"""
-    await show_profile_handler(message)
-
-async def show_profile_handler(message: Message):
-    """Обработчик показа профиля"""
-    user_id = message.from_user.id
-    user = await get_or_create_user(user_id)
-    stars = user['stars']
-    
-    farms = await get_user_farms(user_id)
-    nfts = await get_user_nfts(user_id)
-    boost = await calculate_total_boost(user_id)
-    referrals = await get_referral_count(user_id)
-    
-    # Подсчитываем активные фермы
-    from datetime import datetime
-    active_farms = 0
-    for farm in farms:
-        is_active = farm.get('is_active', 0)
-        if is_active:
-            last_activated = farm.get('last_activated')
-            if last_activated:
-                last_activated_dt = datetime.fromisoformat(last_activated)
-                hours_passed = (datetime.now() - last_activated_dt).total_seconds() / 3600
-                if hours_passed < 6:
-                    active_farms += 1
-    
-    profile_text = (
-        f"👤 Ваш профиль\n\n"
-        f"⭐ Звезд: {stars}\n"
-        f"🌾 Ферм: {len(farms)} (активных: {active_farms})\n"
-        f"🎁 NFT: {len(nfts)}\n"
-        f"⚡ Буст к доходу: {int((boost - 1) * 100)}%\n"
-        f"🔗 Рефералов: {referrals}\n\n"
-    )
-    
-    if farms:
-        profile_text += "Ваши фермы:\n"
-        farm_counts = {}
-        for farm in farms:
-            farm_type = farm['farm_type']
-            farm_counts[farm_type] = farm_counts.get(farm_type, 0) + 1
-        
-        for farm_type, count in farm_counts.items():
-            if farm_type in FARM_TYPES:
-                profile_text += f"  {FARM_TYPES[farm_type]['name']}: {count} шт.\n"
-    
-    if nfts:
-        profile_text += "\nВаши NFT:\n"
-        nft_counts = {}
-        for nft in nfts:
-            nft_type = nft['nft_type']
-            nft_counts[nft_type] = nft_counts.get(nft_type, 0) + 1
-        
-        for nft_type, count in nft_counts.items():
-            if nft_type in NFT_GIFTS:
-                profile_text += f"  {NFT_GIFTS[nft_type]['name']}: {count} шт.\n"
-    
-    if message.chat.type == "private":
-        await message.answer(profile_text)
-    else:
-        await message.reply(profile_text)
-
-@dp.message(Command("farms"))
-async def cmd_farms(message: Message):
-    """Команда /farms"""
-    await show_farms_handler(message)
-
-@dp.message(F.text == "🌾 Мои фермы")
-async def show_farms(message: Message):
-    """Показать фермы пользователя"""
-    await show_farms_handler(message)
-
-async def show_farms_handler(message: Message):
-    """Обработчик показа ферм"""
-    user_id = message.from_user.id
-    farms = await get_user_farms(user_id)
-    
-    if not farms:
-        response = "У вас пока нет ферм. Купите их в магазине! 🛒"
-        if message.chat.type == "private":
-            await message.answer(response)
-        else:
-            await message.reply(response)
-        return
-    
-    from datetime import datetime
-    farm_counts = {}
-    active_count = 0
-    inactive_count = 0
-    
-    for farm in farms:
-        farm_type = farm['farm_type']
-        farm_counts[farm_type] = farm_counts.get(farm_type, {'total': 0, 'active': 0})
-        farm_counts[farm_type]['total'] += 1
-        
-        is_active = farm.get('is_active', 0)
-        if is_active:
-            last_activated = farm.get('last_activated')
-            if last_activated:
-                last_activated_dt = datetime.fromisoformat(last_activated)
-                hours_passed = (datetime.now() - last_activated_dt).total_seconds() / 3600
-                if hours_passed < 6:
-                    farm_counts[farm_type]['active'] += 1
-                    active_count += 1
-                else:
-                    inactive_count += 1
-            else:
-                inactive_count += 1
-        else:
-            inactive_count += 1
-    
-    farms_text = "🌾 Ваши фермы:\n\n"
-    total_income = 0
-    total_active_income = 0
-    
-    for farm_type, data in farm_counts.items():
-        if farm_type in FARM_TYPES:
-            farm_data = FARM_TYPES[farm_type]
-            total = data['total']
-            active = data['active']
-            inactive = total - active
-            
-            income = farm_data['income_per_hour'] * active  # Только активные
-            total_active_income += income
-            total_income += farm_data['income_per_hour'] * total
-            
-            income_per_min = round(income / 60, 2)
-            status = "✅" if active > 0 else "❌"
-            farms_text += f"{status} {farm_data['name']}: {total} шт. (активных: {active})\n"
-            if active > 0:
-                farms_text += f"  Доход: {income_per_min} ⭐/мин | {income} ⭐/час\n\n"
-            else:
-                farms_text += f"  ⚠️ Требуется активация (/activate)\n\n"
-    
-    boost = await calculate_total_boost(user_id)
-    if boost > 1.0:
-        total_income_boosted = int(total_active_income * boost)
-        total_income_boosted_per_min = round(total_income_boosted / 60, 2)
-        farms_text += f"📊 Доход (активные): {round(total_active_income / 60, 2)} ⭐/мин | {total_active_income} ⭐/час\n"
-        farms_text += f"⚡ С бустом: {total_income_boosted_per_min} ⭐/мин | {total_income_boosted} ⭐/час\n"
-    else:
-        total_income_per_min = round(total_active_income / 60, 2)
-        farms_text += f"📊 Доход (активные): {total_income_per_min} ⭐/мин | {total_active_income} ⭐/час\n"
-    
-    if inactive_count > 0:
-        farms_text += f"\n⚠️ {inactive_count} ферм требуют активации! Используйте /activate"
-    
-    if message.chat.type == "private":
-        await message.answer(farms_text)
-    else:
-        await message.reply(farms_text)
-
-@dp.message(Command("shop"))
-async def cmd_shop(message: Message):
-    """Команда /shop"""
-    await show_farm_shop_handler(message)
-
-@dp.message(F.text == "🛒 Магазин ферм")
-async def show_farm_shop(message: Message):
-    """Показать магазин ферм"""
-    await show_farm_shop_handler(message)
-
-async def show_farm_shop_handler(message: Message):
-    """Обработчик магазина ферм"""
-    user_id = message.from_user.id
-    stars = await get_user_stars(user_id)
-    
-    shop_text = f"🛒 Магазин ферм\n\n⭐ Ваши звезды: {stars}\n\n"
-    
-    for farm_id, farm_data in FARM_TYPES.items():
-        income_per_min = round(farm_data['income_per_hour'] / 60, 2)
-        shop_text += (
-            f"{farm_data['name']}\n"
-            f"💰 Цена: {farm_data['price']} ⭐\n"
-            f"📈 Доход: {income_per_min} ⭐/мин | {farm_data['income_per_hour']} ⭐/час\n\n"
-        )
-    
-    if message.chat.type == "private":
-        await message.answer(shop_text, reply_markup=get_farm_shop_keyboard())
-    else:
-        await message.reply(shop_text + "\n💡 В группах используйте команды для покупки")
-
-@dp.message(Command("nft"))
-async def cmd_nft(message: Message):
-    """Команда /nft"""
-    await show_nft_shop_handler(message)
-
-@dp.message(F.text == "🎁 Магазин NFT")
-async def show_nft_shop(message: Message):
-    """Показать магазин NFT"""
-    await show_nft_shop_handler(message)
-
-async def show_nft_shop_handler(message: Message):
-    """Обработчик магазина NFT"""
-    user_id = message.from_user.id
-    stars = await get_user_stars(user_id)
-    
-    shop_text = (
-        f"🎁 Магазин NFT подарков\n\n"
-        f"⭐ Ваши звезды: {stars}\n\n"
-        f"NFT дают буст к доходу с ферм!\n\n"
-    )
-    
-    for nft_id, nft_data in NFT_GIFTS.items():
-        boost_text = f"+{int((nft_data['boost'] - 1) * 100)}%"
-        shop_text += (
-            f"{nft_data['name']}\n"
-            f"💰 Цена: {nft_data['price']} ⭐\n"
-            f"⚡ Буст: {boost_text}\n\n"
-        )
-    
-    if message.chat.type == "private":
-        await message.answer(shop_text, reply_markup=get_nft_shop_keyboard())
-    else:
-        await message.reply(shop_text + "\n💡 В группах используйте команды для покупки")
-
-@dp.message(Command("activate"))
-async def cmd_activate(message: Message):
-    """Команда /activate - активировать фермы"""
-    user_id = message.from_user.id
-    farms = await get_user_farms(user_id)
-    
-    if not farms:
-        response = "У вас нет ферм для активации! Купите фермы в магазине. 🛒"
-        if message.chat.type == "private":
-            await message.answer(response)
-        else:
-            await message.reply(response)
-        return
-    
-    activated, total = await activate_farms(user_id)
-    
-    if activated > 0:
-        response = (
-            f"✅ Активировано ферм: {activated} из {total}\n\n"
-            f"🌾 Ваши фермы активны на следующие 6 часов!\n"
-            f"💡 Не забудьте собрать доход командой /collect"
-        )
-    else:
-        from datetime import datetime
-        # Проверяем, когда можно будет активировать снова
-        can_activate_soon = False
-        min_hours_left = 6
-        for farm in farms:
-            last_activated = farm.get('last_activated')
-            if last_activated:
-                last_activated_dt = datetime.fromisoformat(last_activated)
-                hours_passed = (datetime.now() - last_activated_dt).total_seconds() / 3600
-                hours_left = 6 - hours_passed
-                if hours_left > 0:
-                    min_hours_left = min(min_hours_left, hours_left)
-                    can_activate_soon = True
-        
-        if can_activate_soon:
-            hours = int(min_hours_left)
-            minutes = int((min_hours_left - hours) * 60)
-            response = (
-                f"⏰ Все фермы уже активированы!\n\n"
-                f"🔄 Следующая активация через: {hours}ч {minutes}м"
-            )
-        else:
-            response = (
-                f"✅ Все фермы активированы!\n\n"
-                f"💡 Фермы активны на 6 часов. Используйте /collect для сбора дохода."
-            )
-    
-    if message.chat.type == "private":
-        await message.answer(response)
-    else:
-        await message.reply(response)
-
-@dp.message(Command("collect"))
-async def cmd_collect(message: Message):
-    """Команда /collect"""
-    await collect_income_handler(message)
-
-@dp.message(F.text == "💰 Собрать доход")
-async def collect_income(message: Message):
-    """Собрать доход с ферм"""
-    await collect_income_handler(message)
-
-async def collect_income_handler(message: Message):
-    """Обработчик сбора дохода"""
-    user_id = message.from_user.id
-    farms = await get_user_farms(user_id)
-    
-    if not farms:
-        response = "У вас нет ферм для сбора дохода! Купите фермы в магазине. 🛒"
-        if message.chat.type == "private":
-            await message.answer(response)
-        else:
-            await message.reply(response)
-        return
-    
-    income = await collect_farm_income(user_id)
-    stars = await get_user_stars(user_id)
-    boost = await calculate_total_boost(user_id)
-    
-    # Рассчитываем текущий доход в минуту и час (только активные фермы)
-    from datetime import datetime
-    total_income_per_hour = 0
-    active_farms_count = 0
-    for farm in farms:
-        is_active = farm.get('is_active', 0)
-        if is_active:
-            last_activated = farm.get('last_activated')
-            if last_activated:
-                last_activated_dt = datetime.fromisoformat(last_activated)
-                hours_passed = (datetime.now() - last_activated_dt).total_seconds() / 3600
-                if hours_passed < 6:
-                    farm_type = farm['farm_type']
-                    if farm_type in FARM_TYPES:
-                        total_income_per_hour += FARM_TYPES[farm_type]['income_per_hour']
-                        active_farms_count += 1
-    
-    total_income_per_hour_boosted = int(total_income_per_hour * boost)
-    total_income_per_min_boosted = round(total_income_per_hour_boosted / 60, 2)
-    total_income_per_min = round(total_income_per_hour / 60, 2)
-    
-    if income > 0:
-        boost_text = ""
-        if boost > 1.0:
-            boost_text = f"\n⚡ Буст от NFT: {int((boost - 1) * 100)}%"
-        
-        response = (
-            f"💰 Вы собрали доход!\n\n"
-            f"⭐ Получено: {income} звезд{boost_text}\n"
-            f"💎 Всего звезд: {stars}\n\n"
-            f"📊 Текущий доход ({active_farms_count} активных ферм):\n"
-            f"   {total_income_per_min} ⭐/мин | {total_income_per_hour} ⭐/час"
-        )
-        if boost > 1.0:
-            response += f"\n   ⚡ С бустом: {total_income_per_min_boosted} ⭐/мин | {total_income_per_hour_boosted} ⭐/час"
-    else:
-        if active_farms_count == 0:
-            response = (
-                f"⚠️ У вас нет активных ферм!\n"
-                f"💎 Ваши звезды: {stars}\n\n"
-                f"💡 Используйте /activate для активации ферм"
-            )
-        else:
-            response = (
-                f"⏰ Доход еще не накоплен.\n"
-                f"💎 Ваши звезды: {stars}\n\n"
-                f"📊 Текущий доход ({active_farms_count} активных ферм):\n"
-                f"   {total_income_per_min} ⭐/мин | {total_income_per_hour} ⭐/час"
-            )
-            if boost > 1.0:
-                response += f"\n   ⚡ С бустом: {total_income_per_min_boosted} ⭐/мин | {total_income_per_hour_boosted} ⭐/час"
-            response += "\n\nДоход накапливается каждый час!"
-    
-    if message.chat.type == "private":
-        await message.answer(response)
-    else:
-        await message.reply(response)
-
-@dp.callback_query(F.data.startswith("buy_farm_"))
-async def handle_buy_farm(callback: CallbackQuery):
-    """Обработчик покупки фермы"""
-    farm_id = callback.data.split("_")[2]
-    
-    if farm_id not in FARM_TYPES:
-        await callback.answer("Ошибка: неверный тип фермы", show_alert=True)
-        return
-    
-    user_id = callback.from_user.id
-    farm_data = FARM_TYPES[farm_id]
-    
-    success = await buy_farm(user_id, farm_id)
-    
-    if success:
-        stars = await get_user_stars(user_id)
-        await callback.answer(
-            f"✅ Вы купили {farm_data['name']}!",
-            show_alert=True
-        )
-        
-        shop_text = f"🛒 Магазин ферм\n\n⭐ Ваши звезды: {stars}\n\n"
-        shop_text += f"✅ Вы купили {farm_data['name']}!\n\n"
-        
-        for farm_id_item, farm_data_item in FARM_TYPES.items():
-            income_per_min = round(farm_data_item['income_per_hour'] / 60, 2)
-            shop_text += (
-                f"{farm_data_item['name']}\n"
-                f"💰 Цена: {farm_data_item['price']} ⭐\n"
-                f"📈 Доход: {income_per_min} ⭐/мин | {farm_data_item['income_per_hour']} ⭐/час\n\n"
-            )
-        
-        await callback.message.edit_text(shop_text, reply_markup=get_farm_shop_keyboard())
-    else:
-        stars = await get_user_stars(user_id)
-        await callback.answer(
-            f"❌ Недостаточно звезд! Нужно {farm_data['price']}, у вас {stars}",
-            show_alert=True
-        )
-
-@dp.callback_query(F.data.startswith("buy_nft_"))
-async def handle_buy_nft(callback: CallbackQuery):
-    """Обработчик покупки NFT"""
-    nft_id = callback.data.split("_")[2]
-    
-    if nft_id not in NFT_GIFTS:
-        await callback.answer("Ошибка: неверный тип NFT", show_alert=True)
-        return
-    
-    user_id = callback.from_user.id
-    nft_data = NFT_GIFTS[nft_id]
-    
-    success = await buy_nft(user_id, nft_id)
-    
-    if success:
-        stars = await get_user_stars(user_id)
-        boost = await calculate_total_boost(user_id)
-        boost_text = f"+{int((nft_data['boost'] - 1) * 100)}%"
-        
-        await callback.answer(
-            f"✅ Вы купили {nft_data['name']}! Буст: {boost_text}",
-            show_alert=True
-        )
-        
-        shop_text = (
-            f"🎁 Магазин NFT подарков\n\n"
-            f"⭐ Ваши звезды: {stars}\n\n"
-            f"✅ Вы купили {nft_data['name']}!\n"
-            f"⚡ Общий буст: {int((boost - 1) * 100)}%\n\n"
-        )
-        
-        for nft_id_item, nft_data_item in NFT_GIFTS.items():
-            boost_item_text = f"+{int((nft_data_item['boost'] - 1) * 100)}%"
-            shop_text += (
-                f"{nft_data_item['name']}\n"
-                f"💰 Цена: {nft_data_item['price']} ⭐\n"
-                f"⚡ Буст: {boost_item_text}\n\n"
-            )
-        
-        await callback.message.edit_text(shop_text, reply_markup=get_nft_shop_keyboard())
-    else:
-        stars = await get_user_stars(user_id)
-        await callback.answer(
-            f"❌ Недостаточно звезд! Нужно {nft_data['price']}, у вас {stars}",
-            show_alert=True
-        )
-
-@dp.message(Command("referral"))
-async def cmd_referral(message: Message):
-    """Команда /referral"""
-    await show_referral_link_handler(message)
-
-@dp.message(F.text == "🔗 Реферальная ссылка")
-async def show_referral_link(message: Message):
-    """Показать реферальную ссылку"""
-    await show_referral_link_handler(message)
-
-async def show_referral_link_handler(message: Message):
-    """Обработчик реферальной ссылки"""
-    user_id = message.from_user.id
-    referrals = await get_referral_count(user_id)
-    
-    from config import REFERRAL_REWARD
-    bot_username = (await bot.get_me()).username
-    referral_link = f"https://t.me/{bot_username}?start={user_id}"
-    
-    referral_text = (
-        f"🔗 Ваша реферальная ссылка:\n\n"
-        f"{referral_link}\n\n"
-        f"💰 За каждого приглашенного друга вы получаете награду!\n"
-        f"🎁 Новый пользователь получает {REFERRAL_REWARD} ⭐\n\n"
-        f"👥 Приглашено друзей: {referrals}"
-    )
-    
-    if message.chat.type == "private":
-        await message.answer(referral_text)
-    else:
-        await message.reply(referral_text)
-
-@dp.message(Command("auction"))
-async def cmd_auction(message: Message):
-    """Команда /auction"""
-    await show_auctions_handler(message)
-
-@dp.message(F.text == "🔨 Аукцион")
-async def show_auctions(message: Message):
-    """Показать активные аукционы"""
-    await show_auctions_handler(message)
-
-async def show_auctions_handler(message: Message):
-    """Обработчик показа аукционов"""
-    user_id = message.from_user.id
-    
-    # Проверяем и завершаем истекшие аукционы
-    from datetime import datetime
-    active_auctions = await get_active_auctions()
-    for auction in active_auctions:
-        end_time = datetime.fromisoformat(auction['end_time'])
-        if datetime.now() >= end_time:
-            await end_auction(auction['id'])
-    
-    auctions = await get_active_auctions()
-    
-    if not auctions:
-        # Создаем несколько аукционов, если их нет
-        from random import choice
-        
-        farm_types = list(FARM_TYPES.keys())[-4:]  # Последние 4 типа ферм
-        for i in range(3):
-            farm_type = choice(farm_types)
-            farm_data = FARM_TYPES[farm_type]
-            starting_price = farm_data['price'] // 2  # Начальная цена = половина обычной
-            await create_auction(farm_type, starting_price, 24)
-        
-        auctions = await get_active_auctions()
-    
-    if not auctions:
-        response = "Сейчас нет активных аукционов. Попробуйте позже!"
-        if message.chat.type == "private":
-            await message.answer(response)
-        else:
-            await message.reply(response)
-        return
-    
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    
-    auctions_text = "🔨 Активные аукционы:\n\n"
-    keyboard_buttons = []
-    
-    for auction in auctions:
-        farm_type = auction['farm_type']
-        if farm_type in FARM_TYPES:
-            farm_data = FARM_TYPES[farm_type]
-            end_time = datetime.fromisoformat(auction['end_time'])
-            time_left = end_time - datetime.now()
-            hours_left = int(time_left.total_seconds() / 3600)
-            minutes_left = int((time_left.total_seconds() % 3600) / 60)
-            
-            auctions_text += (
-                f"{farm_data['name']}\n"
-                f"💰 Текущая ставка: {auction['current_bid']} ⭐\n"
-                f"⏰ Осталось: {hours_left}ч {minutes_left}м\n\n"
-            )
-            
-            keyboard_buttons.append([
-                InlineKeyboardButton(
-                    text=f"{farm_data['name']} - {auction['current_bid']} ⭐",
-                    callback_data=f"auction_{auction['id']}"
-                )
-            ])
-    
-    keyboard_buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")])
-    keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-    
-    if message.chat.type == "private":
-        await message.answer(auctions_text, reply_markup=keyboard)
-    else:
-        await message.reply(auctions_text + "\n💡 В группах используйте команды для участия в аукционах")
-
-@dp.callback_query(F.data.startswith("auction_"))
-async def handle_auction_select(callback: CallbackQuery):
-    """Обработчик выбора аукциона"""
-    auction_id = int(callback.data.split("_")[1])
-    
-    auctions = await get_active_auctions()
-    auction = next((a for a in auctions if a['id'] == auction_id), None)
-    
-    if not auction:
-        await callback.answer("Аукцион не найден или уже завершен", show_alert=True)
-        return
-    
-    from datetime import datetime
-    farm_type = auction['farm_type']
-    if farm_type in FARM_TYPES:
-        farm_data = FARM_TYPES[farm_type]
-        end_time = datetime.fromisoformat(auction['end_time'])
-        time_left = end_time - datetime.now()
-        hours_left = int(time_left.total_seconds() / 3600)
-        minutes_left = int((time_left.total_seconds() % 3600) / 60)
-        
-        auction_text = (
-            f"🔨 Аукцион: {farm_data['name']}\n\n"
-            f"💰 Текущая ставка: {auction['current_bid']} ⭐\n"
-            f"⏰ Осталось: {hours_left}ч {minutes_left}м\n\n"
-            f"Выберите размер ставки:"
-        )
-        await callback.message.edit_text(auction_text, reply_markup=get_auction_keyboard(auction_id, auction['current_bid']))
-
-@dp.callback_query(F.data.startswith("bid_"))
-async def handle_bid(callback: CallbackQuery):
-    """Обработчик ставки на аукционе"""
-    parts = callback.data.split("_")
-    auction_id = int(parts[1])
-    bid_amount = int(parts[2])
-    
-    user_id = callback.from_user.id
-    success, message_text = await place_bid(auction_id, user_id, bid_amount)
-    
-    if success:
-        await callback.answer(f"✅ {message_text}", show_alert=True)
-        # Обновляем информацию об аукционе
-        auctions = await get_active_auctions()
-        auction = next((a for a in auctions if a['id'] == auction_id), None)
-        if auction:
-            from datetime import datetime
-            farm_type = auction['farm_type']
-            if farm_type in FARM_TYPES:
-                farm_data = FARM_TYPES[farm_type]
-                end_time = datetime.fromisoformat(auction['end_time'])
-                time_left = end_time - datetime.now()
-                hours_left = int(time_left.total_seconds() / 3600)
-                minutes_left = int((time_left.total_seconds() % 3600) / 60)
-                
-                auction_text = (
-                    f"🔨 Аукцион: {farm_data['name']}\n\n"
-                    f"💰 Текущая ставка: {auction['current_bid']} ⭐\n"
-                    f"⏰ Осталось: {hours_left}ч {minutes_left}м\n\n"
-                    f"✅ Ваша ставка принята!\n\n"
-                    f"Выберите размер следующей ставки:"
-                )
-                await callback.message.edit_text(auction_text, reply_markup=get_auction_keyboard(auction_id, auction['current_bid']))
-    else:
-        await callback.answer(f"❌ {message_text}", show_alert=True)
-
-@dp.callback_query(F.data == "back_to_main")
-async def handle_back(callback: CallbackQuery):
-    """Обработчик кнопки назад"""
-    await callback.answer()
-    await callback.message.delete()
-
-# Админ панель
-@dp.message(Command("admin"))
-async def cmd_admin(message: Message):
-    """Команда /admin"""
-    if message.from_user.id not in ADMIN_IDS:
-        await message.answer("❌ У вас нет доступа к админ панели!")
-        return
-    
-    admin_text = (
-        "🔐 Админ панель\n\n"
-        "Выберите действие:"
-    )
-    await message.answer(admin_text, reply_markup=get_admin_menu())
-
-@dp.callback_query(F.data == "admin_back")
-async def admin_back(callback: CallbackQuery):
-    """Вернуться в админ меню"""
-    if callback.from_user.id not in ADMIN_IDS:
-        await callback.answer("❌ Нет доступа!", show_alert=True)
-        return
-    await callback.message.edit_text("🔐 Админ панель\n\nВыберите действие:", reply_markup=get_admin_menu())
-
-@dp.callback_query(F.data == "admin_give_stars")
-async def admin_give_stars_handler(callback: CallbackQuery):
-    """Админ: выдать звезды"""
-    if callback.from_user.id not in ADMIN_IDS:
-        await callback.answer("❌ Нет доступа!", show_alert=True)
-        return
-    await callback.message.edit_text(
-        "💰 Выдача звезд\n\n"
-        "Отправьте в формате:\n"
-        "<code>/give_stars user_id amount</code>\n\n"
-        "Пример: /give_stars 123456789 1000",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")]
-        ])
-    )
-
-@dp.message(Command("give_stars"))
-async def cmd_give_stars(message: Message):
-    """Выдать звезды пользователю"""
-    if message.from_user.id not in ADMIN_IDS:
-        return
-    
-    args = message.text.split()
-    if len(args) < 3:
-        await message.reply("Использование: /give_stars user_id amount")
-        return
-    
-    try:
-        user_id = int(args[1])
-        amount = int(args[2])
-        await admin_add_stars(user_id, amount)
-        await message.reply(f"✅ Пользователю {user_id} выдано {amount} ⭐")
-    except ValueError:
-        await message.reply("❌ Неверный формат!")
-
-@dp.callback_query(F.data == "admin_give_farm")
-async def admin_give_farm_handler(callback: CallbackQuery):
-    """Админ: выдать ферму"""
-    if callback.from_user.id not in ADMIN_IDS:
-        await callback.answer("❌ Нет доступа!", show_alert=True)
-        return
-    await callback.message.edit_text(
-        "🌾 Выдача фермы\n\n"
-        "Выберите тип фермы:",
-        reply_markup=get_farm_select_keyboard()
-    )
-
-@dp.callback_query(F.data.startswith("admin_farm_"))
-async def admin_give_farm_select(callback: CallbackQuery):
-    """Админ: выбор фермы"""
-    if callback.from_user.id not in ADMIN_IDS:
-        await callback.answer("❌ Нет доступа!", show_alert=True)
-        return
-    
-    farm_id = callback.data.split("_")[2]
-    await callback.message.edit_text(
-        f"🌾 Выдача фермы\n\n"
-        f"Тип: {FARM_TYPES[farm_id]['name']}\n\n"
-        f"Отправьте ID пользователя:\n"
-        f"<code>/give_farm {farm_id} user_id</code>",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔙 Назад", callback_data="admin_give_farm")]
-        ])
-    )
-
-@dp.message(Command("give_farm"))
-async def cmd_give_farm(message: Message):
-    """Выдать ферму пользователю"""
-    if message.from_user.id not in ADMIN_IDS:
-        return
-    
-    args = message.text.split()
-    if len(args) < 3:
-        await message.reply("Использование: /give_farm farm_id user_id")
-        return
-    
-    try:
-        farm_id = args[1]
-        user_id = int(args[2])
-        if farm_id not in FARM_TYPES:
-            await message.reply("❌ Неверный тип фермы!")
-            return
-        await admin_add_farm(user_id, farm_id)
-        await message.reply(f"✅ Пользователю {user_id} выдана {FARM_TYPES[farm_id]['name']}")
-    except ValueError:
-        await message.reply("❌ Неверный формат!")
-
-@dp.callback_query(F.data == "admin_give_nft")
-async def admin_give_nft_handler(callback: CallbackQuery):
-    """Админ: выдать NFT"""
-    if callback.from_user.id not in ADMIN_IDS:
-        await callback.answer("❌ Нет доступа!", show_alert=True)
-        return
-    await callback.message.edit_text(
-        "🎁 Выдача NFT\n\n"
-        "Выберите NFT:",
-        reply_markup=get_nft_select_keyboard()
-    )
-
-@dp.callback_query(F.data.startswith("admin_nft_"))
-async def admin_give_nft_select(callback: CallbackQuery):
-    """Админ: выбор NFT"""
-    if callback.from_user.id not in ADMIN_IDS:
-        await callback.answer("❌ Нет доступа!", show_alert=True)
-        return
-    
-    nft_id = callback.data.split("_")[2]
-    await callback.message.edit_text(
-        f"🎁 Выдача NFT\n\n"
-        f"Тип: {NFT_GIFTS[nft_id]['name']}\n\n"
-        f"Отправьте ID пользователя:\n"
-        f"<code>/give_nft {nft_id} user_id</code>",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔙 Назад", callback_data="admin_give_nft")]
-        ])
-    )
-
-@dp.message(Command("give_nft"))
-async def cmd_give_nft(message: Message):
-    """Выдать NFT пользователю"""
-    if message.from_user.id not in ADMIN_IDS:
-        return
-    
-    args = message.text.split()
-    if len(args) < 3:
-        await message.reply("Использование: /give_nft nft_id user_id")
-        return
-    
-    try:
-        nft_id = args[1]
-        user_id = int(args[2])
-        if nft_id not in NFT_GIFTS:
-            await message.reply("❌ Неверный тип NFT!")
-            return
-        await admin_add_nft(user_id, nft_id)
-        await message.reply(f"✅ Пользователю {user_id} выдано {NFT_GIFTS[nft_id]['name']}")
-    except ValueError:
-        await message.reply("❌ Неверный формат!")
-
-@dp.message(Command("ban"))
-async def cmd_ban(message: Message):
-    """Забанить пользователя"""
-    if message.from_user.id not in ADMIN_IDS:
-        return
-    
-    args = message.text.split(maxsplit=2)
-    if len(args) < 2:
-        await message.reply("Использование: /ban user_id [причина]")
-        return
-    
-    try:
-        user_id = int(args[1])
-        reason = args[2] if len(args) > 2 else "Нарушение правил"
-        await ban_user(user_id, reason, message.from_user.id)
-        await message.reply(f"✅ Пользователь {user_id} забанен. Причина: {reason}")
-    except ValueError:
-        await message.reply("❌ Неверный формат!")
-
-@dp.message(Command("unban"))
-async def cmd_unban(message: Message):
-    """Разбанить пользователя"""
-    if message.from_user.id not in ADMIN_IDS:
-        return
-    
-    args = message.text.split()
-    if len(args) < 2:
-        await message.reply("Использование: /unban user_id")
-        return
-    
-    try:
-        user_id = int(args[1])
-        await unban_user(user_id)
-        await message.reply(f"✅ Пользователь {user_id} разбанен")
-    except ValueError:
-        await message.reply("❌ Неверный формат!")
-
-@dp.message(Command("broadcast"))
-async def cmd_broadcast(message: Message):
-    """Рассылка всем пользователям"""
-    if message.from_user.id not in ADMIN_IDS:
-        return
-    
-    if not message.reply_to_message:
-        await message.reply("Ответьте на сообщение для рассылки")
-        return
-    
-    text = message.reply_to_message.text or message.reply_to_message.caption
-    if not text:
-        await message.reply("Сообщение должно содержать текст")
-        return
-    
-    users = await get_all_users()
-    chats = await get_all_chats()
-    
-    sent = 0
-    failed = 0
-    
-    await message.reply(f"📢 Начинаю рассылку...\nПользователей: {len(users)}\nЧатов: {len(chats)}")
-    
-    # Рассылка пользователям
-    for user in users:
-        try:
-            await bot.send_message(user['user_id'], text)
-            sent += 1
-        except:
-            failed += 1
-    
-    # Рассылка в чаты
-    for chat in chats:
-        try:
-            await bot.send_message(chat['chat_id'], text)
-            sent += 1
-        except:
-            failed += 1
-    
-    await message.reply(f"✅ Рассылка завершена!\nОтправлено: {sent}\nОшибок: {failed}")
-
-# Казино
-@dp.message(F.text == "🎰 Казино")
-async def show_casino(message: Message):
-    """Показать казино"""
-    user_id = message.from_user.id
-    if await is_banned(user_id):
-        return
-    
-    stars = await get_user_stars(user_id)
-    casino_text = (
-        f"🎰 Казино\n\n"
-        f"⭐ Ваши звезды: {stars}\n\n"
-        f"Выберите игру:"
-    )
-    await message.answer(casino_text, reply_markup=get_casino_menu())
-
-@dp.callback_query(F.data == "casino_dice")
-async def casino_dice(callback: CallbackQuery):
-    """Игра в кости"""
-    user_id = callback.from_user.id
-    if await is_banned(user_id):
-        await callback.answer("❌ Вы заблокированы!", show_alert=True)
-        return
-    
-    await callback.message.edit_text(
-        "🎲 Кости\n\n"
-        "Ставка: удвоение\n\n"
-        "Отправьте сумму ставки:\n"
-        "<code>/dice amount</code>",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")]
-        ])
-    )
-
-@dp.message(Command("dice"))
-async def cmd_dice(message: Message):
-    """Игра в кости"""
-    user_id = message.from_user.id
-    if await is_banned(user_id):
-        return
-    
-    args = message.text.split()
-    if len(args) < 2:
-        await message.reply("Использование: /dice amount")
-        return
-    
-    try:
-        bet = int(args[1])
-        stars = await get_user_stars(user_id)
-        
-        if bet < 10:
-            await message.reply("❌ Минимальная ставка: 10 ⭐")
-            return
-        
-        if bet > stars:
-            await message.reply("❌ Недостаточно звезд!")
-            return
-        
-        await spend_stars(user_id, bet)
-        
-        import random
-        player_dice = random.randint(1, 6)
-        bot_dice = random.randint(1, 6)
-        
-        if player_dice > bot_dice:
-            win = bet * 2
-            await add_stars(user_id, win)
-            await message.reply(
-                f"🎲 Вы: {player_dice}\n"
-                f"🎲 Бот: {bot_dice}\n\n"
-                f"✅ Вы выиграли {win} ⭐!"
-            )
-        else:
-            await message.reply(
-                f"🎲 Вы: {player_dice}\n"
-                f"🎲 Бот: {bot_dice}\n\n"
-                f"❌ Вы проиграли {bet} ⭐"
-            )
-    except ValueError:
-        await message.reply("❌ Неверный формат!")
-
-@dp.callback_query(F.data == "casino_slots")
-async def casino_slots_handler(callback: CallbackQuery):
-    """Игра в слоты"""
-    user_id = callback.from_user.id
-    if await is_banned(user_id):
-        await callback.answer("❌ Вы заблокированы!", show_alert=True)
-        return
-    
-    await callback.message.edit_text(
-        "🎰 Слоты\n\n"
-        "Ставка: утроение\n\n"
-        "Отправьте сумму ставки:\n"
-        "<code>/slots amount</code>",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")]
-        ])
-    )
-
-@dp.message(Command("slots"))
-async def cmd_slots(message: Message):
-    """Игра в слоты"""
-    user_id = message.from_user.id
-    if await is_banned(user_id):
-        return
-    
-    args = message.text.split()
-    if len(args) < 2:
-        await message.reply("Использование: /slots amount")
-        return
-    
-    try:
-        bet = int(args[1])
-        stars = await get_user_stars(user_id)
-        
-        if bet < 10:
-            await message.reply("❌ Минимальная ставка: 10 ⭐")
-            return
-        
-        if bet > stars:
-            await message.reply("❌ Недостаточно звезд!")
-            return
-        
-        await spend_stars(user_id, bet)
-        
-        import random
-        symbols = ["🍒", "🍋", "🍊", "🍇", "⭐", "💎"]
-        slot1 = random.choice(symbols)
-        slot2 = random.choice(symbols)
-        slot3 = random.choice(symbols)
-        
-        if slot1 == slot2 == slot3:
-            win = bet * 3
-            await add_stars(user_id, win)
-            await message.reply(
-                f"🎰 [{slot1}] [{slot2}] [{slot3}]\n\n"
-                f"🎉 ДЖЕКПОТ!\n"
-                f"✅ Вы выиграли {win} ⭐!"
-            )
-        elif slot1 == slot2 or slot2 == slot3 or slot1 == slot3:
-            win = bet * 2
-            await add_stars(user_id, win)
-            await message.reply(
-                f"🎰 [{slot1}] [{slot2}] [{slot3}]\n\n"
-                f"✅ Вы выиграли {win} ⭐!"
-            )
-        else:
-            await message.reply(
-                f"🎰 [{slot1}] [{slot2}] [{slot3}]\n\n"
-                f"❌ Вы проиграли {bet} ⭐"
-            )
-    except ValueError:
-        await message.reply("❌ Неверный формат!")
-
-@dp.callback_query(F.data == "casino_roulette")
-async def casino_roulette_handler(callback: CallbackQuery):
-    """Игра в рулетку"""
-    user_id = callback.from_user.id
-    if await is_banned(user_id):
-        await callback.answer("❌ Вы заблокированы!", show_alert=True)
-        return
-    
-    await callback.message.edit_text(
-        "🎯 Рулетка\n\n"
-        "Ставка: учетверение\n\n"
-        "Отправьте сумму ставки:\n"
-        "<code>/roulette amount</code>",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")]
-        ])
-    )
-
-@dp.message(Command("roulette"))
-async def cmd_roulette(message: Message):
-    """Игра в рулетку"""
-    user_id = message.from_user.id
-    if await is_banned(user_id):
-        return
-    
-    args = message.text.split()
-    if len(args) < 2:
-        await message.reply("Использование: /roulette amount")
-        return
-    
-    try:
-        bet = int(args[1])
-        stars = await get_user_stars(user_id)
-        
-        if bet < 10:
-            await message.reply("❌ Минимальная ставка: 10 ⭐")
-            return
-        
-        if bet > stars:
-            await message.reply("❌ Недостаточно звезд!")
-            return
-        
-        await spend_stars(user_id, bet)
-        
-        import random
-        colors = ["🔴", "⚫", "🟢"]
-        player_color = random.choice(colors)
-        wheel_color = random.choice(colors)
-        
-        if player_color == wheel_color:
-            multiplier = 5 if wheel_color == "🟢" else 4
-            win = bet * multiplier
-            await add_stars(user_id, win)
-            await message.reply(
-                f"🎯 Вы выбрали: {player_color}\n"
-                f"🎯 Выпало: {wheel_color}\n\n"
-                f"✅ Вы выиграли {win} ⭐!"
-            )
-        else:
-            await message.reply(
-                f"🎯 Вы выбрали: {player_color}\n"
-                f"🎯 Выпало: {wheel_color}\n\n"
-                f"❌ Вы проиграли {bet} ⭐"
-            )
-    except ValueError:
-        await message.reply("❌ Неверный формат!")
-
-# Приветствие при добавлении в чат
-@dp.message(F.new_chat_members)
-async def on_new_member(message: Message):
-    """Обработчик добавления бота в чат"""
-    for member in message.new_chat_members:
-        if member.id == bot.id:
-            await add_chat(message.chat.id, message.chat.type, message.chat.title)
-            welcome_text = (
-                f"🌟 Добро пожаловать в {GAME_NAME}!\n\n"
-                f"Я игровой бот с фермами, NFT и казино!\n\n"
-                f"Используйте команды:\n"
-                f"/start - Начать игру\n"
-                f"/help - Справка\n"
-                f"/profile - Профиль\n"
-                f"/casino - Казино"
-            )
-            await message.reply(welcome_text)
-
-async def main():
-    """Главная функция"""
-    # Инициализация базы данных
-    await init_db()
-    logger.info("База данных инициализирована")
-    
-    # Запуск бота
-    logger.info("Бот запущен")
-    await dp.start_polling(bot)
-
-if __name__ == "__main__":
-    asyncio.run(main())
-
+import asyncio
+import csv
+import io
+import logging
+import os
+import signal
+import time
+from typing import Optional
+from aiogram import Bot, Dispatcher, F
+from aiogram.types import (
+    Message, CallbackQuery, ChatMemberUpdated, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile,
+    BufferedInputFile
+)
+from aiogram.exceptions import TelegramAPIError
+from aiogram.filters import Command, CommandStart
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from config import (
+    BOT_TOKEN, GAME_NAME, ADMIN_IDS,
+    INCOME_ACCRUAL_MODE, INCOME_ACCRUAL_INTERVAL_MINUTES, NOTIFY_SEND_RATE, THROTTLE_LIMITS, BULK_GRANT_MAX_QUANTITY,
+    SHARD_INDEX, WORKER_HOST, WORKER_BASE_PORT, WEBHOOK_SECRET
+)
+from catalog import get_catalog, load_catalog
+from database import BULK_FILTERS, BULK_GRANT_CHUNK_SIZE
+from repository import repo
+from sharding import (
+    register_referral, create_auction, get_active_auctions, place_bid, end_auction,
+    call, call_owner, call_all, is_local, served_shards, owner_groups, rpc, rpc_handler, close_session
+)
+from reminders import SendQueue, ReminderScheduler, is_unreachable
+from render_cache import RenderCache
+from edits import CallbackDeduplicator, EditCoalescer
+from throttling import Throttle
+from lifecycle import Lifecycle
+from updates import UpdateDedup
+from maintenance import Maintenance
+from profiler import SamplingProfiler, summary
+from callbacks import (
+    CallbackRouter, TextRouter, BuyFarm, BuyNft, AuctionSelect, Bid, AdminFarm, AdminNft
+)
+from export import EXPORT_TABLES, EXPORT_FORMATS, export_dump, merge_dumps
+from casino import MIN_BET, SLOTS_JACKPOT_MULTIPLIER, play_dice, play_slots, play_roulette
+from keyboards import (
+    get_main_menu, get_farm_shop_keyboard, 
+    get_nft_shop_keyboard, get_back_keyboard, get_auction_keyboard,
+    get_admin_menu, get_casino_menu, get_farm_select_keyboard, get_nft_select_keyboard
+)
+from templates import (
+    DEFAULT_LOCALE, t, locale_for, labels, fragment, clear_fragments, farm_name, nft_name, available_locales
+)
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Инициализация бота и диспетчера
+bot = Bot(token=BOT_TOKEN)
+dp = Dispatcher()
+
+# Очередь уведомлений и напоминания об окончании активации ферм
+send_queue = SendQueue(bot, NOTIFY_SEND_RATE)
+reminders = ReminderScheduler(send_queue)
+# Заблокировавшим бота напоминания больше не ставятся
+send_queue.on_unreachable = reminders.unsubscribe
+
+# Кэш экранов профиля и ферм по версии состояния пользователя
+render_cache = RenderCache()
+
+# Повторные нажатия кнопок и правки сообщений, которые ничего не меняют
+callback_dedup = CallbackDeduplicator()
+edits = EditCoalescer()
+
+# Нажатия кнопок и кнопки меню разбираются поиском в словаре, а не перебором фильтров
+callback_router = CallbackRouter()
+text_router = TextRouter()
+
+# Учет обновлений в обработке для остановки без потерь (самый внешний middleware)
+lifecycle = Lifecycle()
+dp.update.outer_middleware(lifecycle.middleware)
+
+# Обслуживание базы в тихие периоды; middleware замеряет время обработки обновлений
+maintenance = Maintenance(repo.maintenance_tasks())
+dp.update.outer_middleware(maintenance.middleware)
+
+# Повторно доставленные после перезапуска обновления отбрасываются до обработчиков
+update_dedup = UpdateDedup()
+dp.update.outer_middleware(update_dedup.middleware)
+
+@dp.update.outer_middleware()
+async def activity_middleware(handler, event, data):
+    """Отмечает пользователя активным для статистики DAU"""
+    user = data.get("event_from_user")
+    if user:
+        repo.mark_active(user.id)
+    return await handler(event, data)
+
+# Классы ограничения частоты: команды, префиксы данных кнопок и кнопки меню
+THROTTLE_CLASSES = {
+    "casino": ("/dice", "/slots", "/roulette", "casino_dice", "casino_slots", "casino_roulette"),
+    "economy": (
+        "/collect", "/activate", BuyFarm.__prefix__, BuyNft.__prefix__, Bid.__prefix__, *labels("menu.collect")
+    ),
+    "views": (
+        "/profile", "/farms", "/shop", "/nft", "/auction", "/referral", AuctionSelect.__prefix__,
+        *labels("menu.profile"), *labels("menu.farms"), *labels("menu.farm_shop"), *labels("menu.nft_shop"),
+        *labels("menu.auction"), *labels("menu.referral"), *labels("menu.casino")
+    ),
+}
+throttle_classes = {key: name for name, keys in THROTTLE_CLASSES.items() for key in keys}
+
+def throttle_class(event) -> Optional[str]:
+    """Класс ограничения частоты для сообщения или нажатия кнопки (None - без ограничения)"""
+    if isinstance(event, CallbackQuery):
+        return throttle_classes.get((event.data or "").partition(":")[0])
+    text = event.text or ""
+    if text.startswith("/"):
+        text = text.split(maxsplit=1)[0].partition("@")[0]
+    return throttle_classes.get(text)
+
+# Лишние запросы отбрасываются до обработчиков, не доходя до базы
+throttle = Throttle(THROTTLE_LIMITS, throttle_class)
+dp.message.outer_middleware(throttle.middleware)
+dp.callback_query.outer_middleware(throttle.middleware)
+
+def user_locale(event) -> str:
+    """Локаль пользователя, от которого пришло сообщение или нажатие кнопки"""
+    return locale_for(event.from_user.language_code)
+
+def farm_shop_items(locale: str) -> str:
+    """Список ферм магазина (статичный, собирается один раз на локаль)"""
+    catalog = get_catalog()
+    return "".join(
+        t(
+            locale, "shop.farm_item", name=farm_name(locale, farm_id), price=farm_data['price'],
+            per_min=catalog.farm_per_minute[farm_id], per_hour=farm_data['income_per_hour']
+        )
+        for farm_id, farm_data in catalog.farms.items()
+    )
+
+def nft_shop_items(locale: str) -> str:
+    """Список NFT магазина (статичный, собирается один раз на локаль)"""
+    catalog = get_catalog()
+    return "".join(
+        t(
+            locale, "shop.nft_item", name=nft_name(locale, nft_id), price=nft_data['price'],
+            boost=catalog.nft_boost_percent[nft_id]
+        )
+        for nft_id, nft_data in catalog.nfts.items()
+    )
+
+@dp.callback_query()
+async def route_callback(callback: CallbackQuery):
+    """Передать нажатие кнопки обработчику по префиксу данных"""
+    key = (callback.from_user.id, callback.data)
+    if not callback_dedup.claim(key):
+        # Двойное нажатие: то же самое уже обрабатывается
+        await callback.answer()
+        return
+    try:
+        if not await callback_router.dispatch(callback):
+            # Кнопка из старого сообщения или с испорченными данными
+            await callback.answer(t(user_locale(callback), "callback.expired"), show_alert=True)
+    finally:
+        callback_dedup.release(key)
+
+@dp.message(F.text.in_(text_router.routes))
+async def route_menu_button(message: Message):
+    """Передать нажатие кнопки главного меню обработчику по тексту"""
+    await text_router.dispatch(message)
+
+@dp.message(CommandStart())
+async def cmd_start(message: Message):
+    """Обработчик команды /start"""
+    user_id = message.from_user.id
+    locale = user_locale(message)
+    
+    # Проверка на бан
+    if await repo.is_banned(user_id):
+        await message.answer(t(locale, "start.banned"))
+        return
+    
+    args = message.text.split()[1:] if len(message.text.split()) > 1 else []
+    
+    # Проверяем реферальную ссылку
+    is_new_user = False
+    if args:
+        try:
+            referrer_id = int(args[0])
+            # Запрещаем переход по своей ссылке
+            if referrer_id != user_id:
+                await register_referral(referrer_id, user_id)
+                # Награду пишет отдельная запись, которая и отмечает обновление: если обработку
+                # прервали после регистрации, повторная доставка /start выдаст награду один раз
+                is_new_user = await repo.give_referral_reward(user_id)
+                if is_new_user:
+                    # Уведомляем реферера (его язык неизвестен - локаль по умолчанию)
+                    try:
+                        from config import REFERRAL_REWARD
+                        referrer_name = message.from_user.full_name or f"@{message.from_user.username}" if message.from_user.username else t(DEFAULT_LOCALE, "start.someone")
+                        referrer_mention = f"@{message.from_user.username}" if message.from_user.username else referrer_name
+                        notification = t(
+                            DEFAULT_LOCALE, "start.referrer_notification",
+                            mention=referrer_mention, reward=REFERRAL_REWARD
+                        )
+                        await bot.send_message(referrer_id, notification)
+                    except:
+                        pass
+        except ValueError:
+            pass
+    
+    user = await repo.get_or_create_user(user_id)
+    
+    parts = [t(locale, "start.welcome", game=GAME_NAME)]
+    if is_new_user:
+        from config import REFERRAL_REWARD
+        parts.append(t(locale, "start.referral_bonus", reward=REFERRAL_REWARD))
+    parts.append(t(locale, "start.hint"))
+    welcome_text = "".join(parts)
+    
+    # В группах не показываем клавиатуру
+    if message.chat.type == "private":
+        await message.answer(welcome_text, reply_markup=get_main_menu(locale))
+    else:
+        await message.reply(welcome_text)
+
+@dp.message(Command("help"))
+async def cmd_help(message: Message):
+    """Обработчик команды /help"""
+    help_text = t(user_locale(message), "help.text", game=GAME_NAME)
+    
+    if message.chat.type == "private":
+        await message.answer(help_text)
+    else:
+        await message.reply(help_text)
+
+@dp.message(Command("profile"))
+async def cmd_profile(message: Message):
+    """Команда /profile"""
+    await show_profile_handler(message)
+
+@text_router.route(labels("menu.profile"))
+async def show_profile(message: Message):
+    """Показать профиль пользователя"""
+    await show_profile_handler(message)
+
+async def show_profile_handler(message: Message):
+    """Обработчик показа профиля"""
+    user_id = message.from_user.id
+    locale = user_locale(message)
+    key = (user_id, "profile", locale)
+    # Версию берем до чтения базы: изменение во время рендера сделает запись устаревшей
+    version = repo.state_version(user_id)
+    profile_text = render_cache.get(key, version)
+    if profile_text is None:
+        profile_text, expires = await render_profile(user_id, locale)
+        render_cache.put(key, version, profile_text, expires)
+    
+    if message.chat.type == "private":
+        await message.answer(profile_text)
+    else:
+        await message.reply(profile_text)
+
+def activation_expiry(last_activated: Optional[str]) -> Optional[float]:
+    """Когда закончится активация, начатая в last_activated (timestamp), или None"""
+    from datetime import datetime
+    if not last_activated:
+        return None
+    expires = datetime.fromisoformat(last_activated).timestamp() + 6 * 3600
+    return expires if expires > time.time() else None
+
+async def render_profile(user_id: int, locale: str) -> tuple[str, Optional[float]]:
+    """Текст профиля и момент, когда он устареет сам по себе"""
+    catalog = get_catalog()
+    user = await repo.get_or_create_user(user_id)
+    stars = user['stars']
+    
+    farm_counts, active_counts, earliest = await repo.get_farm_histogram(user_id)
+    nft_counts = await repo.get_nft_histogram(user_id)
+    boost = await repo.calculate_total_boost(user_id)
+    referrals = await repo.get_referral_count(user_id)
+    
+    parts = [t(
+        locale, "profile.header", stars=stars, farms=sum(farm_counts), active=sum(active_counts),
+        nfts=sum(nft_counts), boost=int((boost - 1) * 100), referrals=referrals
+    )]
+    
+    if any(farm_counts):
+        parts.append(t(locale, "profile.farms_title"))
+        for code, count in enumerate(farm_counts):
+            if count:
+                parts.append(t(locale, "profile.item", name=farm_name(locale, catalog.farm_ids[code]), count=count))
+    
+    if any(nft_counts):
+        parts.append(t(locale, "profile.nfts_title"))
+        for code, count in enumerate(nft_counts):
+            if count:
+                parts.append(t(locale, "profile.item", name=nft_name(locale, catalog.nft_ids[code]), count=count))
+    
+    # Текст устареет, когда закончится первая активация
+    return "".join(parts), activation_expiry(earliest)
+
+@dp.message(Command("farms"))
+async def cmd_farms(message: Message):
+    """Команда /farms"""
+    await show_farms_handler(message)
+
+@text_router.route(labels("menu.farms"))
+async def show_farms(message: Message):
+    """Показать фермы пользователя"""
+    await show_farms_handler(message)
+
+async def show_farms_handler(message: Message):
+    """Обработчик показа ферм"""
+    user_id = message.from_user.id
+    locale = user_locale(message)
+    key = (user_id, "farms", locale)
+    version = repo.state_version(user_id)
+    farms_text = render_cache.get(key, version)
+    if farms_text is None:
+        farms_text, expires = await render_farms(user_id, locale)
+        render_cache.put(key, version, farms_text, expires)
+    
+    if message.chat.type == "private":
+        await message.answer(farms_text)
+    else:
+        await message.reply(farms_text)
+
+async def render_farms(user_id: int, locale: str) -> tuple[str, Optional[float]]:
+    """Текст экрана ферм и момент, когда он устареет сам по себе"""
+    catalog = get_catalog()
+    farm_counts, active_counts, earliest = await repo.get_farm_histogram(user_id)
+    
+    if not any(farm_counts):
+        return t(locale, "farms.empty"), None
+    
+    parts = [t(locale, "farms.title")]
+    
+    for code, total in enumerate(farm_counts):
+        if not total:
+            continue
+        active = active_counts[code]
+        name = farm_name(locale, catalog.farm_ids[code])
+        if active > 0:
+            income = catalog.farm_rates[code] * active  # Только активные
+            parts.append(t(
+                locale, "farms.line_active", name=name, total=total, active=active,
+                per_min=round(income / 60, 2), per_hour=income
+            ))
+        else:
+            parts.append(t(locale, "farms.line_inactive", name=name, total=total))
+    
+    total_active_income = catalog.income_per_hour(active_counts)
+    parts.append(t(
+        locale, "farms.total", per_min=round(total_active_income / 60, 2), per_hour=total_active_income
+    ))
+    boost = await repo.calculate_total_boost(user_id)
+    if boost > 1.0:
+        total_income_boosted = int(total_active_income * boost)
+        parts.append(t(
+            locale, "farms.total_boosted", per_min=round(total_income_boosted / 60, 2), per_hour=total_income_boosted
+        ))
+    
+    inactive_count = sum(farm_counts) - sum(active_counts)
+    if inactive_count > 0:
+        parts.append(t(locale, "farms.need_activation", count=inactive_count))
+    
+    return "".join(parts), activation_expiry(earliest)
+
+@dp.message(Command("shop"))
+async def cmd_shop(message: Message):
+    """Команда /shop"""
+    await show_farm_shop_handler(message)
+
+@text_router.route(labels("menu.farm_shop"))
+async def show_farm_shop(message: Message):
+    """Показать магазин ферм"""
+    await show_farm_shop_handler(message)
+
+async def show_farm_shop_handler(message: Message):
+    """Обработчик магазина ферм"""
+    user_id = message.from_user.id
+    locale = user_locale(message)
+    stars = await repo.get_user_stars(user_id)
+    
+    shop_text = t(locale, "shop.farm_title", stars=stars) + fragment(locale, "farm_shop_items", farm_shop_items)
+    
+    if message.chat.type == "private":
+        await message.answer(shop_text, reply_markup=get_farm_shop_keyboard(locale))
+    else:
+        await message.reply(shop_text + t(locale, "shop.group_hint"))
+
+@dp.message(Command("nft"))
+async def cmd_nft(message: Message):
+    """Команда /nft"""
+    await show_nft_shop_handler(message)
+
+@text_router.route(labels("menu.nft_shop"))
+async def show_nft_shop(message: Message):
+    """Показать магазин NFT"""
+    await show_nft_shop_handler(message)
+
+async def show_nft_shop_handler(message: Message):
+    """Обработчик магазина NFT"""
+    user_id = message.from_user.id
+    locale = user_locale(message)
+    stars = await repo.get_user_stars(user_id)
+    
+    shop_text = t(locale, "shop.nft_title", stars=stars) + fragment(locale, "nft_shop_items", nft_shop_items)
+    
+    if message.chat.type == "private":
+        await message.answer(shop_text, reply_markup=get_nft_shop_keyboard(locale))
+    else:
+        await message.reply(shop_text + t(locale, "shop.group_hint"))
+
+@dp.message(Command("activate"))
+async def cmd_activate(message: Message):
+    """Команда /activate - активировать фермы"""
+    user_id = message.from_user.id
+    locale = user_locale(message)
+    farms = await repo.get_user_farms(user_id)
+    
+    if not farms:
+        response = t(locale, "activate.no_farms")
+        if message.chat.type == "private":
+            await message.answer(response)
+        else:
+            await message.reply(response)
+        return
+    
+    activated, total = await repo.activate_farms(user_id)
+    
+    if activated > 0:
+        # Напоминание ставится на самую раннюю активацию среди еще работающих ферм
+        from datetime import datetime
+        now = datetime.now()
+        earliest = now
+        for farm in farms:
+            if farm.get('is_active') and farm.get('last_activated'):
+                last_activated_dt = datetime.fromisoformat(farm['last_activated'])
+                if (now - last_activated_dt).total_seconds() < 6 * 3600:
+                    earliest = min(earliest, last_activated_dt)
+        reminders.on_activated(user_id, earliest)
+        
+        response = t(locale, "activate.done", activated=activated, total=total)
+    else:
+        from datetime import datetime
+        # Проверяем, когда можно будет активировать снова
+        can_activate_soon = False
+        min_hours_left = 6
+        for farm in farms:
+            last_activated = farm.get('last_activated')
+            if last_activated:
+                last_activated_dt = datetime.fromisoformat(last_activated)
+                hours_passed = (datetime.now() - last_activated_dt).total_seconds() / 3600
+                hours_left = 6 - hours_passed
+                if hours_left > 0:
+                    min_hours_left = min(min_hours_left, hours_left)
+                    can_activate_soon = True
+        
+        if can_activate_soon:
+            hours = int(min_hours_left)
+            minutes = int((min_hours_left - hours) * 60)
+            response = t(locale, "activate.wait", hours=hours, minutes=minutes)
+        else:
+            response = t(locale, "activate.all_active")
+    
+    if message.chat.type == "private":
+        await message.answer(response)
+    else:
+        await message.reply(response)
+
+@dp.message(Command("remind"))
+async def cmd_remind(message: Message):
+    """Команда /remind - включить или выключить напоминания об окончании активации"""
+    user_id = message.from_user.id
+    locale = user_locale(message)
+    await repo.get_or_create_user(user_id)
+    
+    if user_id in reminders.subscribers:
+        await repo.set_expiry_reminder(user_id, False)
+        reminders.unsubscribe(user_id)
+        response = t(locale, "remind.off")
+    else:
+        await repo.set_expiry_reminder(user_id, True)
+        # Если фермы уже работают, напоминание ставится на их ближайшее окончание
+        from datetime import datetime
+        now = datetime.now()
+        active = [
+            datetime.fromisoformat(farm['last_activated'])
+            for farm in await repo.get_user_farms(user_id)
+            if farm.get('is_active') and farm.get('last_activated')
+        ]
+        active = [dt for dt in active if (now - dt).total_seconds() < 6 * 3600]
+        reminders.subscribe(user_id, min(active) if active else None)
+        response = t(locale, "remind.on")
+    
+    if message.chat.type == "private":
+        await message.answer(response)
+    else:
+        await message.reply(response)
+
+@dp.message(Command("collect"))
+async def cmd_collect(message: Message):
+    """Команда /collect"""
+    await collect_income_handler(message)
+
+@text_router.route(labels("menu.collect"))
+async def collect_income(message: Message):
+    """Собрать доход с ферм"""
+    await collect_income_handler(message)
+
+async def collect_income_handler(message: Message):
+    """Обработчик сбора дохода"""
+    catalog = get_catalog()
+    user_id = message.from_user.id
+    locale = user_locale(message)
+    
+    # В режиме серверного начисления /collect только показывает баланс
+    if INCOME_ACCRUAL_MODE == "server":
+        user = await repo.get_or_create_user(user_id)
+        response = t(locale, "collect.server", minutes=INCOME_ACCRUAL_INTERVAL_MINUTES, stars=user['stars'])
+        if user['boost'] > 1.0:
+            response += t(locale, "collect.boost", boost=int((user['boost'] - 1) * 100))
+        if message.chat.type == "private":
+            await message.answer(response)
+        else:
+            await message.reply(response)
+        return
+    
+    farm_counts, _, _ = await repo.get_farm_histogram(user_id)
+    
+    if not any(farm_counts):
+        response = t(locale, "collect.no_farms")
+        if message.chat.type == "private":
+            await message.answer(response)
+        else:
+            await message.reply(response)
+        return
+    
+    income = await repo.collect_farm_income(user_id)
+    stars = await repo.get_user_stars(user_id)
+    boost = await repo.calculate_total_boost(user_id)
+    
+    # Текущий доход в минуту и час (только работающие фермы, после сбора)
+    _, active_counts, _ = await repo.get_farm_histogram(user_id)
+    total_income_per_hour = catalog.income_per_hour(active_counts)
+    active_farms_count = sum(active_counts)
+    
+    total_income_per_hour_boosted = int(total_income_per_hour * boost)
+    rate = t(
+        locale, "collect.rate", active=active_farms_count,
+        per_min=round(total_income_per_hour / 60, 2), per_hour=total_income_per_hour
+    )
+    rate_boosted = t(
+        locale, "collect.rate_boosted",
+        per_min=round(total_income_per_hour_boosted / 60, 2), per_hour=total_income_per_hour_boosted
+    ) if boost > 1.0 else ""
+    
+    if income > 0:
+        parts = [t(locale, "collect.done", income=income)]
+        if boost > 1.0:
+            parts.append(t(locale, "collect.boost", boost=int((boost - 1) * 100)))
+        parts += [t(locale, "collect.total", stars=stars), rate, rate_boosted]
+        response = "".join(parts)
+    elif active_farms_count == 0:
+        response = t(locale, "collect.no_active", stars=stars)
+    else:
+        response = "".join((
+            t(locale, "collect.not_yet", stars=stars), rate, rate_boosted, t(locale, "collect.accumulates")
+        ))
+    
+    if message.chat.type == "private":
+        await message.answer(response)
+    else:
+        await message.reply(response)
+
+@callback_router.route(BuyFarm)
+async def handle_buy_farm(callback: CallbackQuery, data: BuyFarm):
+    """Обработчик покупки ферм"""
+    catalog = get_catalog()
+    farm_id = catalog.farm_codes.get(data.code)
+    quantity = data.qty or None
+    locale = user_locale(callback)
+    
+    if farm_id not in catalog.farms:
+        await callback.answer(t(locale, "shop.bad_farm"), show_alert=True)
+        return
+    
+    user_id = callback.from_user.id
+    farm_data = catalog.farms[farm_id]
+    
+    bought, stars = await repo.buy_farms(user_id, farm_id, quantity)
+    
+    if bought:
+        name = farm_name(locale, farm_id)
+        count_text = f" ×{bought}" if bought > 1 else ""
+        await callback.answer(t(locale, "shop.bought", name=name, count=count_text), show_alert=True)
+        
+        shop_text = "".join((
+            t(locale, "shop.farm_title", stars=stars),
+            t(locale, "shop.bought_farm", name=name, count=count_text),
+            fragment(locale, "farm_shop_items", farm_shop_items)
+        ))
+        await edits.edit(callback.message, shop_text, get_farm_shop_keyboard(locale))
+    else:
+        need = farm_data['price'] * (quantity or 1)
+        await callback.answer(t(locale, "shop.not_enough", need=need, stars=stars), show_alert=True)
+
+@callback_router.route(BuyNft)
+async def handle_buy_nft(callback: CallbackQuery, data: BuyNft):
+    """Обработчик покупки NFT"""
+    catalog = get_catalog()
+    nft_id = catalog.nft_codes.get(data.code)
+    quantity = data.qty or None
+    locale = user_locale(callback)
+    
+    if nft_id not in catalog.nfts:
+        await callback.answer(t(locale, "shop.bad_nft"), show_alert=True)
+        return
+    
+    user_id = callback.from_user.id
+    nft_data = catalog.nfts[nft_id]
+    
+    bought, stars = await repo.buy_nfts(user_id, nft_id, quantity)
+    
+    if bought:
+        boost = await repo.calculate_total_boost(user_id)
+        name = nft_name(locale, nft_id)
+        count_text = f" ×{bought}" if bought > 1 else ""
+        
+        await callback.answer(
+            t(locale, "shop.bought_nft", name=name, count=count_text, boost=catalog.nft_boost_percent[nft_id]),
+            show_alert=True
+        )
+        
+        shop_text = t(
+            locale, "shop.nft_title_bought", stars=stars, name=name, count=count_text,
+            boost=int((boost - 1) * 100)
+        ) + fragment(locale, "nft_shop_items", nft_shop_items)
+        await edits.edit(callback.message, shop_text, get_nft_shop_keyboard(locale))
+    else:
+        need = nft_data['price'] * (quantity or 1)
+        await callback.answer(t(locale, "shop.not_enough", need=need, stars=stars), show_alert=True)
+
+@dp.message(Command("referral"))
+async def cmd_referral(message: Message):
+    """Команда /referral"""
+    await show_referral_link_handler(message)
+
+@text_router.route(labels("menu.referral"))
+async def show_referral_link(message: Message):
+    """Показать реферальную ссылку"""
+    await show_referral_link_handler(message)
+
+async def show_referral_link_handler(message: Message):
+    """Обработчик реферальной ссылки"""
+    user_id = message.from_user.id
+    referrals = await repo.get_referral_count(user_id)
+    
+    from config import REFERRAL_REWARD
+    bot_username = (await bot.get_me()).username
+    referral_link = f"https://t.me/{bot_username}?start={user_id}"
+    
+    referral_text = t(
+        user_locale(message), "referral.text", link=referral_link, reward=REFERRAL_REWARD, count=referrals
+    )
+    
+    if message.chat.type == "private":
+        await message.answer(referral_text)
+    else:
+        await message.reply(referral_text)
+
+@dp.message(Command("auction"))
+async def cmd_auction(message: Message):
+    """Команда /auction"""
+    await show_auctions_handler(message)
+
+@text_router.route(labels("menu.auction"))
+async def show_auctions(message: Message):
+    """Показать активные аукционы"""
+    await show_auctions_handler(message)
+
+def time_left(end_time: str) -> tuple[int, int]:
+    """Сколько осталось до конца аукциона (часы, минуты)"""
+    from datetime import datetime
+    seconds = (datetime.fromisoformat(end_time) - datetime.now()).total_seconds()
+    return int(seconds / 3600), int((seconds % 3600) / 60)
+
+async def show_auctions_handler(message: Message):
+    """Обработчик показа аукционов"""
+    catalog = get_catalog()
+    user_id = message.from_user.id
+    locale = user_locale(message)
+    
+    # Проверяем и завершаем истекшие аукционы
+    from datetime import datetime
+    active_auctions = await get_active_auctions()
+    for auction in active_auctions:
+        end_time = datetime.fromisoformat(auction['end_time'])
+        if datetime.now() >= end_time:
+            await end_auction(auction['id'])
+    
+    auctions = await get_active_auctions()
+    
+    if not auctions:
+        # Создаем несколько аукционов, если их нет
+        from random import choice
+        
+        for i in range(3):
+            farm_type = choice(catalog.auction_farms)
+            farm_data = catalog.farms[farm_type]
+            starting_price = farm_data['price'] // 2  # Начальная цена = половина обычной
+            await create_auction(farm_type, starting_price, 24)
+        
+        auctions = await get_active_auctions()
+    
+    if not auctions:
+        response = t(locale, "auction.none")
+        if message.chat.type == "private":
+            await message.answer(response)
+        else:
+            await message.reply(response)
+        return
+    
+    parts = [t(locale, "auction.title")]
+    keyboard_buttons = []
+    
+    for auction in auctions:
+        farm_type = auction['farm_type']
+        if farm_type in catalog.farms:
+            name = farm_name(locale, farm_type)
+            hours_left, minutes_left = time_left(auction['end_time'])
+            
+            parts.append(t(
+                locale, "auction.item", name=name, bid=auction['current_bid'],
+                hours=hours_left, minutes=minutes_left
+            ))
+            
+            keyboard_buttons.append([
+                InlineKeyboardButton(
+                    text=t(locale, "auction.button", name=name, bid=auction['current_bid']),
+                    callback_data=AuctionSelect(id=auction['id']).pack()
+                )
+            ])
+    
+    keyboard_buttons.append([InlineKeyboardButton(text=t(locale, "button.back"), callback_data="back_to_main")])
+    keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+    
+    auctions_text = "".join(parts)
+    if message.chat.type == "private":
+        await message.answer(auctions_text, reply_markup=keyboard)
+    else:
+        await message.reply(auctions_text + t(locale, "auction.group_hint"))
+
+@callback_router.route(AuctionSelect)
+async def handle_auction_select(callback: CallbackQuery, data: AuctionSelect):
+    """Обработчик выбора аукциона"""
+    catalog = get_catalog()
+    auction_id = data.id
+    locale = user_locale(callback)
+    
+    auctions = await get_active_auctions()
+    auction = next((a for a in auctions if a['id'] == auction_id), None)
+    
+    if not auction:
+        await callback.answer(t(locale, "auction.not_found"), show_alert=True)
+        return
+    
+    farm_type = auction['farm_type']
+    if farm_type in catalog.farms:
+        hours_left, minutes_left = time_left(auction['end_time'])
+        auction_text = t(
+            locale, "auction.detail", name=farm_name(locale, farm_type), bid=auction['current_bid'],
+            hours=hours_left, minutes=minutes_left
+        )
+        await edits.edit(
+            callback.message, auction_text, get_auction_keyboard(auction_id, auction['current_bid'], locale)
+        )
+
+@callback_router.route(Bid)
+async def handle_bid(callback: CallbackQuery, data: Bid):
+    """Обработчик ставки на аукционе"""
+    catalog = get_catalog()
+    auction_id = data.id
+    bid_amount = data.amount
+    locale = user_locale(callback)
+    
+    user_id = callback.from_user.id
+    success, message_text = await place_bid(auction_id, user_id, bid_amount)
+    
+    if success:
+        await callback.answer(t(locale, "auction.bid_ok", message=message_text), show_alert=True)
+        # Обновляем информацию об аукционе
+        auctions = await get_active_auctions()
+        auction = next((a for a in auctions if a['id'] == auction_id), None)
+        if auction:
+            farm_type = auction['farm_type']
+            if farm_type in catalog.farms:
+                hours_left, minutes_left = time_left(auction['end_time'])
+                auction_text = t(
+                    locale, "auction.detail_bid", name=farm_name(locale, farm_type), bid=auction['current_bid'],
+                    hours=hours_left, minutes=minutes_left
+                )
+                await edits.edit(
+                    callback.message, auction_text, get_auction_keyboard(auction_id, auction['current_bid'], locale)
+                )
+    else:
+        await callback.answer(t(locale, "auction.bid_failed", message=message_text), show_alert=True)
+
+@callback_router.route("back_to_main")
+async def handle_back(callback: CallbackQuery):
+    """Обработчик кнопки назад"""
+    await callback.answer()
+    await callback.message.delete()
+
+# Админ панель
+@dp.message(Command("admin"))
+async def cmd_admin(message: Message):
+    """Команда /admin"""
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("❌ У вас нет доступа к админ панели!")
+        return
+    
+    admin_text = (
+        "🔐 Админ панель\n\n"
+        "Выберите действие:"
+    )
+    await message.answer(admin_text, reply_markup=get_admin_menu())
+
+@callback_router.route("admin_back")
+async def admin_back(callback: CallbackQuery):
+    """Вернуться в админ меню"""
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer("❌ Нет доступа!", show_alert=True)
+        return
+    await callback.message.edit_text("🔐 Админ панель\n\nВыберите действие:", reply_markup=get_admin_menu())
+
+@dp.message(Command("economy"))
+async def cmd_economy(message: Message):
+    """Статистика экономики"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    await message.answer(await render_economy())
+
+@callback_router.route("admin_economy")
+async def admin_economy_handler(callback: CallbackQuery):
+    """Админ: статистика экономики"""
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer("❌ Нет доступа!", show_alert=True)
+        return
+    await callback.message.edit_text(
+        await render_economy(),
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")]
+        ])
+    )
+
+def merge_economy_stats(parts: list) -> dict:
+    """Сложить агрегаты экономики шардов (время обновления - самое раннее из шардов)"""
+    merged = {}
+    for stats in parts:
+        for metric, values in stats.items():
+            target = merged.setdefault(metric, {})
+            for key, value in values.items():
+                if metric == "meta":
+                    target[key] = min(target.get(key, value), value)
+                else:
+                    target[key] = target.get(key, 0) + value
+    return merged
+
+async def render_economy() -> str:
+    """Текст статистики экономики из заранее посчитанных агрегатов"""
+    from datetime import datetime
+    catalog = get_catalog()
+    stats = merge_economy_stats(await call_all("get_economy_stats"))
+    if not stats:
+        return "📊 Экономика\n\nСтатистика еще не посчитана, попробуйте через пару минут."
+    
+    refreshed_at = datetime.fromtimestamp(stats.get('meta', {}).get('refreshed_at', 0))
+    casino = stats.get('casino', {})
+    text = (
+        f"📊 Экономика\n\n"
+        f"⭐ Звезд в обороте: {stats.get('stars', {}).get('total', 0)}\n"
+        f"👥 Активных сегодня: {stats.get('activity', {}).get('dau', 0)}\n"
+        f"🔨 Объем ставок аукциона: {stats.get('auction', {}).get('volume', 0)} ⭐\n"
+        f"🎰 Казино: {casino.get('rounds', 0)} раундов, доход {casino.get('net', 0)} ⭐\n"
+    )
+    
+    farms = stats.get('farms', {})
+    if farms:
+        text += "\n🌾 Фермы по типам:\n"
+        for farm_data in catalog.farms.values():
+            if farms.get(str(farm_data['code'])):
+                text += f"  {farm_data['name']}: {farms[str(farm_data['code'])]}\n"
+    
+    nfts = stats.get('nfts', {})
+    if nfts:
+        text += "\n🎁 NFT:\n"
+        for nft_data in catalog.nfts.values():
+            if nfts.get(str(nft_data['code'])):
+                text += f"  {nft_data['name']}: {nfts[str(nft_data['code'])]}\n"
+    
+    text += f"\n🕒 Обновлено: {refreshed_at:%H:%M}"
+    return text
+
+@callback_router.route("admin_give_stars")
+async def admin_give_stars_handler(callback: CallbackQuery):
+    """Админ: выдать звезды"""
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer("❌ Нет доступа!", show_alert=True)
+        return
+    await callback.message.edit_text(
+        "💰 Выдача звезд\n\n"
+        "Отправьте в формате:\n"
+        "<code>/give_stars user_id amount</code>\n\n"
+        "Пример: /give_stars 123456789 1000",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🔙 Назад", callback_data="admin_back")]
+        ])
+    )
+
+@dp.message(Command("give_stars"))
+async def cmd_give_stars(message: Message):
+    """Выдать звезды пользователю"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    args = message.text.split()
+    if len(args) < 3:
+        await message.reply("Использование: /give_stars user_id amount")
+        return
+    
+    try:
+        user_id = int(args[1])
+        amount = int(args[2])
+        await call_owner(user_id, "admin_add_stars", user_id, amount)
+        await message.reply(f"✅ Пользователю {user_id} выдано {amount} ⭐")
+    except ValueError:
+        await message.reply("❌ Неверный формат!")
+
+@callback_router.route("admin_give_farm")
+async def admin_give_farm_handler(callback: CallbackQuery):
+    """Админ: выдать ферму"""
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer("❌ Нет доступа!", show_alert=True)
+        return
+    await callback.message.edit_text(
+        "🌾 Выдача фермы\n\n"
+        "Выберите тип фермы:",
+        reply_markup=get_farm_select_keyboard()
+    )
+
+@callback_router.route(AdminFarm)
+async def admin_give_farm_select(callback: CallbackQuery, data: AdminFarm):
+    """Админ: выбор фермы"""
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer("❌ Нет доступа!", show_alert=True)
+        return
+    
+    catalog = get_catalog()
+    farm_id = catalog.farm_codes.get(data.code)
+    if farm_id is None:
+        await callback.answer("❌ Такой фермы больше нет в каталоге", show_alert=True)
+        return
+    await callback.message.edit_text(
+        f"🌾 Выдача фермы\n\n"
+        f"Тип: {catalog.farms[farm_id]['name']}\n\n"
+        f"Отправьте ID пользователя:\n"
+        f"<code>/give_farm {farm_id} user_id</code>",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🔙 Назад", callback_data="admin_give_farm")]
+        ])
+    )
+
+@dp.message(Command("give_farm"))
+async def cmd_give_farm(message: Message):
+    """Выдать ферму пользователю"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    catalog = get_catalog()
+    args = message.text.split()
+    if len(args) < 3:
+        await message.reply("Использование: /give_farm farm_id user_id")
+        return
+    
+    try:
+        farm_id = args[1]
+        user_id = int(args[2])
+        if farm_id not in catalog.farms:
+            await message.reply("❌ Неверный тип фермы!")
+            return
+        await call_owner(user_id, "admin_add_farm", user_id, farm_id)
+        await message.reply(f"✅ Пользователю {user_id} выдана {catalog.farms[farm_id]['name']}")
+    except ValueError:
+        await message.reply("❌ Неверный формат!")
+
+@callback_router.route("admin_give_nft")
+async def admin_give_nft_handler(callback: CallbackQuery):
+    """Админ: выдать NFT"""
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer("❌ Нет доступа!", show_alert=True)
+        return
+    await callback.message.edit_text(
+        "🎁 Выдача NFT\n\n"
+        "Выберите NFT:",
+        reply_markup=get_nft_select_keyboard()
+    )
+
+@callback_router.route(AdminNft)
+async def admin_give_nft_select(callback: CallbackQuery, data: AdminNft):
+    """Админ: выбор NFT"""
+    if callback.from_user.id not in ADMIN_IDS:
+        await callback.answer("❌ Нет доступа!", show_alert=True)
+        return
+    
+    catalog = get_catalog()
+    nft_id = catalog.nft_codes.get(data.code)
+    if nft_id is None:
+        await callback.answer("❌ Такого NFT больше нет в каталоге", show_alert=True)
+        return
+    await callback.message.edit_text(
+        f"🎁 Выдача NFT\n\n"
+        f"Тип: {catalog.nfts[nft_id]['name']}\n\n"
+        f"Отправьте ID пользователя:\n"
+        f"<code>/give_nft {nft_id} user_id</code>",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🔙 Назад", callback_data="admin_give_nft")]
+        ])
+    )
+
+@dp.message(Command("give_nft"))
+async def cmd_give_nft(message: Message):
+    """Выдать NFT пользователю"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    catalog = get_catalog()
+    args = message.text.split()
+    if len(args) < 3:
+        await message.reply("Использование: /give_nft nft_id user_id")
+        return
+    
+    try:
+        nft_id = args[1]
+        user_id = int(args[2])
+        if nft_id not in catalog.nfts:
+            await message.reply("❌ Неверный тип NFT!")
+            return
+        await call_owner(user_id, "admin_add_nft", user_id, nft_id)
+        await message.reply(f"✅ Пользователю {user_id} выдано {catalog.nfts[nft_id]['name']}")
+    except ValueError:
+        await message.reply("❌ Неверный формат!")
+
+BULK_USAGE = (
+    "Массовая выдача:\n"
+    "<code>/bulk_stars amount фильтр</code>\n"
+    "<code>/bulk_farm farm_id фильтр</code>\n"
+    "<code>/bulk_nft nft_id фильтр</code>\n\n"
+    "Фильтры: all, farm:farm_id, before:ГГГГ-ММ-ДД\n"
+    "Или ответьте командой без фильтра на CSV файл со строками user_id[,количество]"
+)
+
+def parse_bulk_csv(lines, max_quantity: Optional[int] = None) -> list[tuple[int, Optional[int]]]:
+    """Разобрать строки CSV массовой выдачи ([(user_id, количество или None)]).
+    
+    max_quantity - наибольшее количество в строке (для ферм и NFT: каждая штука - отдельная строка в базе).
+    Неверная строка - ValueError с ее номером.
+    """
+    rows = []
+    for line_number, row in enumerate(csv.reader(lines), 1):
+        if not row or not row[0].strip().lstrip("-").isdigit():
+            continue  # Заголовок или пустая строка
+        quantity = None
+        if len(row) > 1 and row[1].strip():
+            if not row[1].strip().lstrip("-").isdigit():
+                raise ValueError(f"строка {line_number}: количество {row[1].strip()!r} не число")
+            quantity = int(row[1])
+            if max_quantity is not None and not 1 <= quantity <= max_quantity:
+                raise ValueError(f"строка {line_number}: количество {quantity}, можно от 1 до {max_quantity}")
+        rows.append((int(row[0]), quantity))
+    return rows
+
+async def read_bulk_csv(document, max_quantity: Optional[int] = None) -> list[tuple[int, Optional[int]]]:
+    """Прочитать CSV файл массовой выдачи ([(user_id, количество или None)])"""
+    data = await bot.download(document)
+    return parse_bulk_csv(io.TextIOWrapper(data, encoding="utf-8-sig"), max_quantity)
+
+def parse_bulk_filter(text: str) -> tuple[str, Optional[str]]:
+    """Разобрать фильтр массовой выдачи (kind, value); неверный фильтр - ValueError с причиной"""
+    from datetime import date
+    kind, _, value = text.partition(":")
+    if kind not in BULK_FILTERS:
+        raise ValueError(f"неизвестный фильтр {kind}")
+    if kind == "farm" and value not in get_catalog().farms:
+        raise ValueError(f"неизвестный тип фермы {value}")
+    if kind == "before":
+        try:
+            date.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"неверная дата {value}, нужна ГГГГ-ММ-ДД") from None
+    return kind, value or None
+
+@dp.message(Command("bulk_stars", "bulk_farm", "bulk_nft"))
+async def cmd_bulk_grant(message: Message):
+    """Массовая выдача звезд, ферм или NFT по фильтру или CSV файлу"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    catalog = get_catalog()
+    args = message.text.split()
+    command = args[0][1:].split("@")[0]
+    document = message.reply_to_message.document if message.reply_to_message else None
+    if len(args) < 2 or (len(args) < 3 and not document):
+        await message.reply(BULK_USAGE)
+        return
+    
+    target = args[1]
+    if command == "bulk_stars":
+        if not target.lstrip("-").isdigit():
+            await message.reply("❌ Неверное количество звезд!")
+            return
+        target = int(target)
+        target_name = f"{target} ⭐"
+    elif command == "bulk_farm":
+        if target not in catalog.farms:
+            await message.reply("❌ Неверный тип фермы!")
+            return
+        target_name = catalog.farms[target]['name']
+    else:
+        if target not in catalog.nfts:
+            await message.reply("❌ Неверный тип NFT!")
+            return
+        target_name = catalog.nfts[target]['name']
+    
+    # Фильтр и CSV проверяются до начала выдачи, каждый со своей ошибкой
+    rows = kind = value = None
+    if len(args) < 3:
+        try:
+            rows = await read_bulk_csv(document, None if command == "bulk_stars" else BULK_GRANT_MAX_QUANTITY)
+        except (ValueError, csv.Error) as error:
+            await message.reply(f"❌ Неверный формат CSV файла: {error}")
+            return
+    else:
+        try:
+            kind, value = parse_bulk_filter(args[2])
+        except ValueError as error:
+            await message.reply(f"❌ Неверный фильтр: {error}\n\n{BULK_USAGE}")
+            return
+    
+    # Каждый шард выдает своим пользователям: по фильтру - все шарды, строки CSV - шардам их владельцев
+    jobs = owner_groups(rows) if rows is not None else {shard: None for shard in served_shards()}
+    
+    progress = await message.reply(f"⏳ Массовая выдача: {target_name}\nОбработано: 0")
+    started = time.monotonic()
+    last_report = started
+    users_by_shard = {}
+    
+    async def report(shard: int, users: int):
+        """Учесть прогресс шарда и обновить сообщение"""
+        nonlocal last_report
+        users_by_shard[shard] = users
+        # Прогресс не чаще раза в пару секунд, чтобы не упереться в лимиты Telegram
+        if time.monotonic() - last_report >= 2:
+            last_report = time.monotonic()
+            await progress.edit_text(
+                f"⏳ Массовая выдача: {target_name}\nОбработано: {sum(users_by_shard.values())}"
+            )
+    
+    async def grant_on(shard: int, shard_rows: Optional[list]):
+        """Выдача на одном шарде (свой шард сообщает прогресс после каждой пачки)"""
+        if is_local(shard):
+            return await bulk_grant_local(
+                command, target, kind, value, shard_rows,
+                on_chunk=lambda users: report(shard, users)
+            )
+        result = await call(shard, "bulk_grant_local", command, target, kind, value, shard_rows)
+        await report(shard, result[0])
+        return result
+    
+    results = await asyncio.gather(*(grant_on(shard, shard_rows) for shard, shard_rows in jobs.items()))
+    
+    await progress.edit_text(
+        f"✅ Массовая выдача завершена: {target_name}\n"
+        f"👥 Пользователей: {sum(result[0] for result in results)}\n"
+        f"📦 Выдач: {sum(result[1] for result in results)}\n"
+        f"⏱ {time.monotonic() - started:.1f} с"
+    )
+
+@rpc
+async def bulk_grant_local(command: str, target, kind: Optional[str], value: Optional[str],
+                           rows: Optional[list] = None, on_chunk=None) -> tuple[int, int]:
+    """Массовая выдача пользователям своей базы по фильтру или строкам CSV [(user_id, количество)]
+    (возвращает (пользователей, выдач)). on_chunk(пользователей) вызывается после каждой пачки.
+    """
+    apply_chunk = {
+        "bulk_stars": repo.bulk_add_stars, "bulk_farm": repo.bulk_add_farms, "bulk_nft": repo.bulk_add_nfts
+    }[command]
+    
+    def build_grants(recipients):
+        """Выдачи для пачки [(user_id, количество)]"""
+        if command == "bulk_stars":
+            return [(user_id, quantity if quantity is not None else target) for user_id, quantity in recipients]
+        grants = []
+        for user_id, quantity in recipients:
+            grants.extend([(user_id, target)] * (quantity if quantity is not None else 1))
+        return grants
+    
+    async def recipient_chunks():
+        """Пачки получателей из строк CSV или по фильтру"""
+        if rows is not None:
+            existing = await repo.filter_existing_users([user_id for user_id, _ in rows])
+            # Пачка закрывается, набрав BULK_GRANT_CHUNK_SIZE выдач (строка CSV с фермами - несколько выдач)
+            chunk, size = [], 0
+            for user_id, quantity in rows:
+                if user_id not in existing:
+                    continue
+                chunk.append((user_id, quantity))
+                size += 1 if command == "bulk_stars" else quantity or 1
+                if size >= BULK_GRANT_CHUNK_SIZE:
+                    yield chunk
+                    chunk, size = [], 0
+            if chunk:
+                yield chunk
+            return
+        
+        async for user_ids in repo.iter_user_ids(kind, value):
+            yield [(user_id, None) for user_id in user_ids]
+    
+    users_done = 0
+    grants_done = 0
+    
+    async def apply_recipients(recipients, last: bool):
+        """Выдать пачку и сообщить прогресс"""
+        nonlocal users_done, grants_done
+        grants = build_grants(recipients)
+        await apply_chunk(grants, mark_update=last)
+        users_done += len(recipients)
+        grants_done += len(grants)
+        if on_chunk is not None:
+            await on_chunk(users_done)
+    
+    # Пачка выдается, когда известна следующая: обновление отмечает только последняя
+    pending = None
+    async for recipients in recipient_chunks():
+        if pending is not None:
+            await apply_recipients(pending, last=False)
+        pending = recipients
+    if pending is not None:
+        await apply_recipients(pending, last=True)
+    
+    return users_done, grants_done
+
+@dp.message(Command("ban"))
+async def cmd_ban(message: Message):
+    """Забанить пользователя"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    args = message.text.split(maxsplit=2)
+    if len(args) < 2:
+        await message.reply("Использование: /ban user_id [причина]")
+        return
+    
+    try:
+        user_id = int(args[1])
+        reason = args[2] if len(args) > 2 else "Нарушение правил"
+        await call_owner(user_id, "ban_user", user_id, reason, message.from_user.id)
+        await message.reply(f"✅ Пользователь {user_id} забанен. Причина: {reason}")
+    except ValueError:
+        await message.reply("❌ Неверный формат!")
+
+@dp.message(Command("unban"))
+async def cmd_unban(message: Message):
+    """Разбанить пользователя"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    args = message.text.split()
+    if len(args) < 2:
+        await message.reply("Использование: /unban user_id")
+        return
+    
+    try:
+        user_id = int(args[1])
+        await call_owner(user_id, "unban_user", user_id)
+        await message.reply(f"✅ Пользователь {user_id} разбанен")
+    except ValueError:
+        await message.reply("❌ Неверный формат!")
+
+@dp.message(Command("broadcast"))
+async def cmd_broadcast(message: Message):
+    """Рассылка всем пользователям"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    if not message.reply_to_message:
+        await message.reply("Ответьте на сообщение для рассылки")
+        return
+    
+    text = message.reply_to_message.text or message.reply_to_message.caption
+    if not text:
+        await message.reply("Сообщение должно содержать текст")
+        return
+    
+    users_count = sum(await call_all("count_rows", "users"))
+    chats_count = sum(await call_all("count_rows", "chats"))
+    
+    await message.reply(f"📢 Начинаю рассылку...\nПользователей: {users_count}\nЧатов: {chats_count}")
+    
+    # Каждый шард рассылает своим пользователям и чатам
+    results = await call_all("broadcast_local", text)
+    sent = sum(result[0] for result in results)
+    failed = sum(result[1] for result in results)
+    unreachable = sum(result[2] for result in results)
+    
+    await message.reply(
+        f"✅ Рассылка завершена!\nДоставлено: {sent}\n"
+        f"Недоступны (заблокировали бота или исключили его, больше не получат рассылку): {unreachable}\n"
+        f"Других ошибок: {failed}"
+    )
+
+@rpc
+async def broadcast_local(text: str) -> tuple[int, int, int]:
+    """Разослать текст пользователям и чатам своей базы (возвращает (доставлено, ошибок, недоступных)).
+    
+    Недоступные получатели (заблокировали бота, удалены, бот исключен из чата) не входят в ошибки.
+    """
+    sent = 0
+    failed = 0
+    unreachable = 0
+    
+    async def deliver(chat_ids: list):
+        """Отправить пачке получателей и отметить тех, кому больше нельзя писать"""
+        nonlocal sent, failed, unreachable
+        dead = []
+        for chat_id in chat_ids:
+            try:
+                await bot.send_message(chat_id, text)
+                sent += 1
+            except TelegramAPIError as error:
+                if is_unreachable(error):
+                    dead.append(chat_id)
+                else:
+                    failed += 1
+            except Exception:
+                failed += 1
+        if dead:
+            await repo.mark_unreachable(dead)
+            unreachable += len(dead)
+    
+    # Рассылка пользователям
+    async for users in repo.iter_users():
+        await deliver([user['user_id'] for user in users])
+    
+    # Рассылка в чаты
+    async for chats in repo.iter_chats():
+        await deliver([chat['chat_id'] for chat in chats])
+    
+    return sent, failed, unreachable
+
+@dp.message(Command("reload_catalog"))
+async def cmd_reload_catalog(message: Message):
+    """Перечитать каталог ферм и NFT без перезапуска"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    results = await call_all("reload_catalog_local")
+    errors = [f"Шард {shard}: {error}" for shard, (_, error) in enumerate(results) if error]
+    if errors:
+        await message.reply("❌ Каталог не загружен:\n" + "\n".join(errors))
+        return
+    
+    catalog = get_catalog()
+    await message.reply(
+        f"✅ Каталог версии {results[0][0]}\nФерм: {len(catalog.farms)}\nNFT: {len(catalog.nfts)}"
+    )
+
+@rpc
+async def reload_catalog_local() -> tuple[int, Optional[str]]:
+    """Перечитать каталог в своем процессе (возвращает (версия, ошибка или None))"""
+    try:
+        catalog = load_catalog()
+    except (OSError, ValueError) as error:
+        return get_catalog().version, str(error)
+    
+    if catalog is not None:
+        # Без await между подменой и пересборкой: обработчики не увидят старые куски с новым каталогом
+        clear_fragments()
+        render_cache.clear()
+        await warm_templates()
+    return get_catalog().version, None
+
+@dp.message(Command("throttle"))
+async def cmd_throttle(message: Message):
+    """Показать или изменить лимиты частоты запросов: /throttle [класс скорость запас]"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    args = message.text.split()
+    if len(args) == 4:
+        try:
+            rate, burst = float(args[2]), int(args[3])
+        except ValueError:
+            rate = burst = 0
+        if args[1] not in throttle.limits or rate <= 0 or burst < 1:
+            await message.reply(
+                f"❌ Использование: /throttle [{'|'.join(throttle.limits)}] <запросов в секунду> <запас>"
+            )
+            return
+        await call_all("set_throttle_local", args[1], rate, burst)
+    elif len(args) != 1:
+        await message.reply("❌ Использование: /throttle [класс скорость запас]")
+        return
+    
+    text = "🚦 Лимиты запросов:\n\n" + "".join(
+        f"{name}: {rate:g}/с, подряд {burst} (в памяти: {len(throttle.buckets[name])})\n"
+        for name, (rate, burst) in throttle.limits.items()
+    )
+    await message.reply(text + f"\nОтброшено: {throttle.dropped}")
+
+@rpc
+async def set_throttle_local(name: str, rate: float, burst: int):
+    """Изменить лимит класса в своем процессе"""
+    throttle.set_limit(name, rate, burst)
+
+@dp.message(Command("maintenance"))
+async def cmd_maintenance(message: Message):
+    """Показать последние запуски обслуживания базы или запустить задачу: /maintenance [задача]"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    args = message.text.split()
+    if len(args) > 1:
+        if args[1] not in maintenance.tasks:
+            await message.reply(f"❌ Использование: /maintenance [{'|'.join(maintenance.tasks)}]")
+            return
+        progress = await message.reply(f"⏳ Выполняется {args[1]}...")
+        reports = {args[1]: await call_all("run_maintenance_local", args[1])}
+    else:
+        progress = None
+        statuses = await call_all("maintenance_status_local")
+        reports = {name: [status.get(name) for status in statuses] for name in maintenance.tasks}
+    
+    lines = ["🛠 Обслуживание базы"]
+    for name, shard_reports in reports.items():
+        lines.append(f"\n{name}:")
+        for shard, report in enumerate(shard_reports):
+            prefix = f"  шард {shard}: " if len(shard_reports) > 1 else "  "
+            if report is None:
+                lines.append(prefix + "еще не запускалось")
+                continue
+            lines.append(
+                prefix + f"{report['result']}\n"
+                f"    {report['seconds']} с, обновлений за это время: {report['updates']}, "
+                f"p95 до: {report['p95_before_ms']} мс, во время: {report['p95_during_ms']} мс"
+            )
+    text = "\n".join(lines)
+    if progress is not None:
+        await progress.edit_text(text)
+    else:
+        await message.reply(text)
+
+@rpc
+async def run_maintenance_local(name: str) -> dict:
+    """Выполнить задачу обслуживания в своем процессе"""
+    return await maintenance.run_task(name)
+
+@rpc
+async def maintenance_status_local() -> dict:
+    """Последние запуски задач обслуживания в своем процессе"""
+    return maintenance.history
+
+# Профилирование по запросу админа: поток выборок есть только во время профилирования
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 300
+profiler = SamplingProfiler()
+_profile_task: Optional[asyncio.Task] = None
+
+def handler_codes() -> set:
+    """Код всех обработчиков: диспетчера, нажатий кнопок и кнопок меню"""
+    handlers = [handler.callback for observer in dp.observers.values() for handler in observer.handlers]
+    handlers += [handler for handler, _ in callback_router.routes.values()]
+    handlers += list(text_router.routes.values())
+    return {handler.__code__ for handler in handlers if hasattr(handler, "__code__")}
+
+@dp.message(Command("profile_start"))
+async def cmd_profile_start(message: Message):
+    """Запустить профилирование: /profile_start [секунд]"""
+    global _profile_task
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    args = message.text.split()
+    seconds = int(args[1]) if len(args) > 1 and args[1].isdigit() else PROFILE_DEFAULT_SECONDS
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+    if _profile_task is not None and not _profile_task.done():
+        await message.reply("❌ Профилирование уже идет, остановите его: /profile_stop")
+        return
+    
+    if not all(await call_all("profile_start_local", seconds)):
+        await message.reply("❌ Профилирование уже идет на одном из шардов")
+        return
+    _profile_task = asyncio.create_task(_finish_profile(message, seconds))
+    await message.reply(f"🔬 Профилирование на {seconds} с. Остановить раньше: /profile_stop")
+
+@dp.message(Command("profile_stop"))
+async def cmd_profile_stop(message: Message):
+    """Остановить профилирование и прислать результат"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    if _profile_task is None or _profile_task.done():
+        await message.reply("❌ Профилирование не запущено")
+        return
+    _profile_task.cancel()
+    await send_profile(message)
+
+async def _finish_profile(message: Message, seconds: int):
+    """Прислать результат, когда закончится окно профилирования"""
+    await asyncio.sleep(seconds)
+    await send_profile(message)
+
+async def send_profile(message: Message):
+    """Собрать стеки со всех шардов и прислать их файлом в формате collapsed stacks (flamegraph.pl, speedscope)"""
+    results = await call_all("profile_stop_local")
+    stacks = {}
+    for shard, (_, shard_stacks) in enumerate(results):
+        for stack, count in shard_stacks.items():
+            stacks[f"shard{shard};{stack}" if len(results) > 1 else stack] = count
+    
+    data = "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items())).encode()
+    caption = f"🔬 Профиль за {max(seconds for seconds, _ in results):.0f} с\n\n{summary(stacks)}"
+    await message.reply_document(BufferedInputFile(data, filename="profile.collapsed"), caption=caption[:1024])
+
+@rpc
+async def profile_start_local(seconds: int) -> bool:
+    """Начать профилирование своего процесса"""
+    return profiler.start(seconds, handler_codes())
+
+@rpc
+async def profile_stop_local() -> tuple[float, dict]:
+    """Остановить профилирование своего процесса (возвращает (секунд, {стек: выборок}))"""
+    stacks = await asyncio.to_thread(profiler.stop)
+    return profiler.seconds, stacks
+
+@dp.message(Command("export"))
+async def cmd_export(message: Message):
+    """Выгрузка таблиц в сжатый файл"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    
+    args = message.text.split()
+    fmt = args[1] if len(args) > 1 else "csv"
+    tables = tuple(args[2:]) or EXPORT_TABLES
+    if fmt not in EXPORT_FORMATS or any(table not in EXPORT_TABLES for table in tables):
+        await message.reply(
+            f"Использование: /export [{'|'.join(EXPORT_FORMATS)}] [таблицы]\n"
+            f"Таблицы: {', '.join(EXPORT_TABLES)}"
+        )
+        return
+    
+    await message.reply("📦 Готовлю выгрузку...")
+    # Каждый шард выгружает свою базу, части склеиваются в один архив
+    parts = await call_all("export_local", fmt, list(tables))
+    path = merge_dumps([part_path for part_path, _ in parts], fmt, tables)
+    counts = {table: sum(part_counts[table] for _, part_counts in parts) for table in tables}
+    try:
+        caption = "✅ Выгрузка готова\n" + "\n".join(f"{table}: {count}" for table, count in counts.items())
+        await message.answer_document(FSInputFile(path, filename=f"export_{fmt}.zip"), caption=caption)
+    finally:
+        os.remove(path)
+
+@rpc
+async def export_local(fmt: str, tables: list) -> tuple[str, dict]:
+    """Выгрузить таблицы своей базы во временный файл (воркеры работают на одной машине,
+    поэтому файл читает и удаляет вызвавший шард)"""
+    return await export_dump(fmt, tuple(tables))
+
+# Казино
+@text_router.route(labels("menu.casino"))
+async def show_casino(message: Message):
+    """Показать казино"""
+    user_id = message.from_user.id
+    if await repo.is_banned(user_id):
+        return
+    
+    locale = user_locale(message)
+    stars = await repo.get_user_stars(user_id)
+    await message.answer(t(locale, "casino.title", stars=stars), reply_markup=get_casino_menu(locale))
+
+async def show_game_intro(callback: CallbackQuery, key: str):
+    """Показать описание игры казино"""
+    locale = user_locale(callback)
+    if await repo.is_banned(callback.from_user.id):
+        await callback.answer(t(locale, "casino.banned"), show_alert=True)
+        return
+    
+    await callback.message.edit_text(t(locale, key), reply_markup=get_back_keyboard(locale))
+
+@callback_router.route("casino_dice")
+async def casino_dice(callback: CallbackQuery):
+    """Игра в кости"""
+    await show_game_intro(callback, "casino.dice_intro")
+
+@dp.message(Command("dice"))
+async def cmd_dice(message: Message):
+    """Игра в кости"""
+    user_id = message.from_user.id
+    if await repo.is_banned(user_id):
+        return
+    
+    locale = user_locale(message)
+    args = message.text.split()
+    if len(args) < 2:
+        await message.reply(t(locale, "casino.usage", game="dice"))
+        return
+    
+    try:
+        bet = int(args[1])
+        
+        if bet < MIN_BET:
+            await message.reply(t(locale, "casino.min_bet", min_bet=MIN_BET))
+            return
+        
+        player_dice, bot_dice, win = play_dice(bet)
+        
+        if await repo.settle_bet(user_id, bet, win, "dice") is None:
+            await message.reply(t(locale, "casino.not_enough"))
+            return
+        
+        result = t(locale, "casino.win", win=win) if win else t(locale, "casino.lose", bet=bet)
+        await message.reply(t(locale, "casino.dice", player=player_dice, bot=bot_dice) + result)
+    except ValueError:
+        await message.reply(t(locale, "casino.bad_format"))
+
+@callback_router.route("casino_slots")
+async def casino_slots_handler(callback: CallbackQuery):
+    """Игра в слоты"""
+    await show_game_intro(callback, "casino.slots_intro")
+
+@dp.message(Command("slots"))
+async def cmd_slots(message: Message):
+    """Игра в слоты"""
+    user_id = message.from_user.id
+    if await repo.is_banned(user_id):
+        return
+    
+    locale = user_locale(message)
+    args = message.text.split()
+    if len(args) < 2:
+        await message.reply(t(locale, "casino.usage", game="slots"))
+        return
+    
+    try:
+        bet = int(args[1])
+        
+        if bet < MIN_BET:
+            await message.reply(t(locale, "casino.min_bet", min_bet=MIN_BET))
+            return
+        
+        (slot1, slot2, slot3), win = play_slots(bet)
+        
+        if await repo.settle_bet(user_id, bet, win, "slots") is None:
+            await message.reply(t(locale, "casino.not_enough"))
+            return
+        
+        parts = [t(locale, "casino.slots", slot1=slot1, slot2=slot2, slot3=slot3)]
+        if win == bet * SLOTS_JACKPOT_MULTIPLIER:
+            parts.append(t(locale, "casino.jackpot"))
+        parts.append(t(locale, "casino.win", win=win) if win else t(locale, "casino.lose", bet=bet))
+        await message.reply("".join(parts))
+    except ValueError:
+        await message.reply(t(locale, "casino.bad_format"))
+
+@callback_router.route("casino_roulette")
+async def casino_roulette_handler(callback: CallbackQuery):
+    """Игра в рулетку"""
+    await show_game_intro(callback, "casino.roulette_intro")
+
+@dp.message(Command("roulette"))
+async def cmd_roulette(message: Message):
+    """Игра в рулетку"""
+    user_id = message.from_user.id
+    if await repo.is_banned(user_id):
+        return
+    
+    locale = user_locale(message)
+    args = message.text.split()
+    if len(args) < 2:
+        await message.reply(t(locale, "casino.usage", game="roulette"))
+        return
+    
+    try:
+        bet = int(args[1])
+        
+        if bet < MIN_BET:
+            await message.reply(t(locale, "casino.min_bet", min_bet=MIN_BET))
+            return
+        
+        player_color, wheel_color, win = play_roulette(bet)
+        
+        if await repo.settle_bet(user_id, bet, win, "roulette") is None:
+            await message.reply(t(locale, "casino.not_enough"))
+            return
+        
+        result = t(locale, "casino.win", win=win) if win else t(locale, "casino.lose", bet=bet)
+        await message.reply(t(locale, "casino.roulette", player=player_color, wheel=wheel_color) + result)
+    except ValueError:
+        await message.reply(t(locale, "casino.bad_format"))
+
+@dp.my_chat_member()
+async def on_my_chat_member(update: ChatMemberUpdated):
+    """Бота заблокировали или разблокировали в личке, исключили из чата или вернули"""
+    reachable = update.new_chat_member.status in ("member", "administrator", "creator")
+    if update.chat.type == "private":
+        if reachable:
+            await repo.mark_reachable(update.chat.id)
+        else:
+            await repo.mark_unreachable([update.chat.id])
+            reminders.unsubscribe(update.chat.id)
+    # Обновление приходит шарду того, кто исключил бота, а чат может лежать в базе другого шарда
+    elif reachable:
+        await call_all("mark_reachable", update.chat.id)
+    else:
+        await call_all("mark_unreachable", [update.chat.id])
+
+# Приветствие при добавлении в чат
+@dp.message(F.new_chat_members)
+async def on_new_member(message: Message):
+    """Обработчик добавления бота в чат"""
+    for member in message.new_chat_members:
+        if member.id == bot.id:
+            await repo.add_chat(message.chat.id, message.chat.type, message.chat.title)
+            await message.reply(t(user_locale(message), "chat.welcome", game=GAME_NAME))
+
+async def warm_templates() -> int:
+    """Собрать статичные куски сообщений и клавиатуры для всех локалей (возвращает число локалей)"""
+    locales = available_locales()
+    for locale in locales:
+        fragment(locale, "farm_shop_items", farm_shop_items)
+        fragment(locale, "nft_shop_items", nft_shop_items)
+        get_main_menu(locale)
+        get_farm_shop_keyboard(locale)
+        get_nft_shop_keyboard(locale)
+        get_casino_menu(locale)
+    return len(locales)
+
+async def main():
+    """Главная функция"""
+    for name, step in repo.startup_steps():
+        lifecycle.on_startup(name, step)
+    lifecycle.on_startup("обработанные обновления", update_dedup.load)
+    lifecycle.on_startup("шаблоны и клавиатуры", warm_templates)
+    lifecycle.on_startup("напоминания", reminders.load)
+    
+    for factory in repo.background_tasks():
+        lifecycle.background(factory)
+    lifecycle.background(send_queue.run)
+    lifecycle.background(reminders.run)
+    if maintenance.tasks:
+        lifecycle.background(maintenance.run)
+    
+    # Уведомления из очереди досылаются, буферы сбрасываются в базу перед закрытием
+    lifecycle.on_drain("очередь уведомлений", send_queue.join)
+    for name, step in repo.shutdown_steps():
+        lifecycle.on_shutdown(name, step)
+    lifecycle.on_shutdown("соединения с шардами", close_session)
+    
+    # Диспетчер вызывает запуск до начала приема обновлений, а остановку - после
+    # его прекращения по SIGTERM/SIGINT, но до закрытия сессии бота
+    dp.startup.register(lifecycle.startup)
+    dp.shutdown.register(lifecycle.shutdown)
+    if SHARD_INDEX is None:
+        await dp.start_polling(bot)
+    else:
+        await run_worker()
+
+async def run_worker():
+    """Воркер шарда: обновления от роутера (POST /update) и вызовы других шардов (POST /rpc)"""
+    app = web.Application()
+    # Запуск и остановка диспетчера регистрируются раньше обработчика обновлений,
+    # чтобы при остановке очередь уведомлений досылалась до закрытия сессии бота
+    setup_application(app, dp, bot=bot)
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET or None).register(app, path="/update")
+    app.router.add_post("/rpc", rpc_handler)
+    
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WORKER_HOST, WORKER_BASE_PORT + SHARD_INDEX).start()
+    logger.info(f"Шард {SHARD_INDEX} слушает {WORKER_HOST}:{WORKER_BASE_PORT + SHARD_INDEX}")
+    
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+    # Сначала перестаем принимать запросы, затем выполняется остановка диспетчера
+    await runner.cleanup()
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
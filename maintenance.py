@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Как часто запускать задачи обслуживания (секунды)
+MAINTENANCE_INTERVALS = {
+    "checkpoint": 600,
+    "optimize": 3600,
+    "analyze": 24 * 3600,
+    "backup": 6 * 3600,
+}
+# Как часто проверять расписание
+MAINTENANCE_TICK = 30
+# Тихий период: за последние QUIET_WINDOW секунд пришло не больше QUIET_MAX_UPDATES обновлений
+QUIET_WINDOW = 60
+QUIET_MAX_UPDATES = 30
+# Сколько последних длительностей обработки обновлений хранить
+LATENCY_SAMPLES = 5000
+
+def _p95(durations: List[float]) -> Optional[float]:
+    """95-й перцентиль в миллисекундах (None, если замеров нет)"""
+    if not durations:
+        return None
+    durations = sorted(durations)
+    return round(durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000, 1)
+
+class Maintenance:
+    """Обслуживание базы по расписанию в тихие периоды.
+
+    Задачи (контрольная точка WAL, PRAGMA optimize, ANALYZE, резервная копия)
+    берутся из хранилища. Задача запускается, когда подошел ее срок и бот
+    почти не получает обновлений; если тихого периода так и не случилось,
+    задача все равно запускается, когда срок пропущен вдвое. Middleware
+    замеряет время обработки обновлений, поэтому для каждого запуска видно,
+    как он сказался на задержке ответов игрокам.
+    """
+
+    def __init__(self, tasks: Dict[str, Callable[[], Awaitable[str]]]):
+        self.tasks = tasks
+        self.latencies: deque = deque(maxlen=LATENCY_SAMPLES)  # (время окончания, длительность)
+        self.last_run: Dict[str, float] = {name: time.monotonic() for name in tasks}
+        self.history: Dict[str, dict] = {}
+        self._lock = asyncio.Lock()
+
+    async def middleware(self, handler, event, data):
+        """Внешний middleware обновлений: замеряет время обработки"""
+        started = time.monotonic()
+        try:
+            return await handler(event, data)
+        finally:
+            finished = time.monotonic()
+            self.latencies.append((finished, finished - started))
+
+    def _durations(self, since: float, until: float) -> List[float]:
+        """Длительности обновлений, закончившихся в промежутке [since, until]"""
+        return [duration for finished, duration in self.latencies if since <= finished <= until]
+
+    def is_quiet(self) -> bool:
+        """Тихий ли сейчас период"""
+        now = time.monotonic()
+        return len(self._durations(now - QUIET_WINDOW, now)) <= QUIET_MAX_UPDATES
+
+    async def run_task(self, name: str) -> dict:
+        """Выполнить задачу и записать ее длительность и задержку обработки до и во время нее"""
+        async with self._lock:
+            started = time.monotonic()
+            self.last_run[name] = started
+            try:
+                result = await self.tasks[name]()
+            except Exception as error:
+                logger.exception(f"Обслуживание {name} не удалось")
+                result = f"ошибка: {error}"
+            finished = time.monotonic()
+            during = self._durations(started, finished)
+            report = {
+                "finished_at": int(time.time()),
+                "seconds": round(finished - started, 3),
+                "result": result,
+                "updates": len(during),
+                "p95_before_ms": _p95(self._durations(started - QUIET_WINDOW, started)),
+                "p95_during_ms": _p95(during),
+            }
+            self.history[name] = report
+            logger.info(f"Обслуживание {name}: {result} за {report['seconds']} с")
+            return report
+
+    async def run(self):
+        """Фоновая задача: запускать задачи, которым подошел срок"""
+        while True:
+            await asyncio.sleep(MAINTENANCE_TICK)
+            quiet = self.is_quiet()
+            for name in self.tasks:
+                waited = time.monotonic() - self.last_run[name]
+                interval = MAINTENANCE_INTERVALS[name]
+                if waited >= interval and (quiet or waited >= interval * 2):
+                    await self.run_task(name)
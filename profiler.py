@@ -0,0 +1,127 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Set
+
+# Как часто снимать стеки (секунды) и как часто обновлять имена потоков
+SAMPLE_INTERVAL = 0.01
+THREAD_NAMES_INTERVAL = 1.0
+# Сколько самых частых строк показывать в сводке
+SUMMARY_TOP = 8
+
+IDLE = "(ожидание)"
+NO_HANDLER = "(вне обработчиков)"
+
+def _label(frame) -> str:
+    """Имя кадра для свернутого стека: файл:функция"""
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+class SamplingProfiler:
+    """Профилировщик по выборкам стеков работающего процесса.
+
+    Отдельный поток раз в SAMPLE_INTERVAL снимает стеки всех потоков
+    (sys._current_frames) и считает одинаковые стеки. Стеки потока цикла событий
+    начинаются с обработчика, внутри которого они сняты (самый внутренний кадр
+    из handler_codes), поэтому время видно по обработчикам; цикл, ждущий
+    событий, считается отдельно как IDLE. Стеки потоков aiosqlite показывают
+    работу базы. Пока профилирование не запущено, потока нет и накладных
+    расходов тоже.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.seconds = 0.0
+        self._handler_codes: Set = set()
+        self._loop_thread: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, handler_codes: Set) -> bool:
+        """Начать профилирование на seconds секунд (False, если оно уже идет)"""
+        if self.running:
+            return False
+        self.stacks = Counter()
+        self._handler_codes = handler_codes
+        # Вызывается из цикла событий: его поток и профилируется по обработчикам
+        self._loop_thread = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(time.monotonic() + seconds,), name="profiler", daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def stop(self) -> Dict[str, int]:
+        """Остановить профилирование (если еще идет) и вернуть {свернутый стек: число выборок}"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return dict(self.stacks)
+
+    def _run(self, deadline: float):
+        """Поток выборок"""
+        me = threading.get_ident()
+        names: Dict[int, str] = {}
+        names_at = 0.0
+        started = time.monotonic()
+        while not self._stop.wait(self.interval):
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if now - names_at >= THREAD_NAMES_INTERVAL:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                names_at = now
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self.stacks[self._collapse(ident, frame, names)] += 1
+        self.seconds = time.monotonic() - started
+
+    def _collapse(self, ident: int, frame, names: Dict[int, str]) -> str:
+        """Свернутый стек потока: корень;...;вершина"""
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            frame = frame.f_back
+        frames.reverse()
+
+        if ident != self._loop_thread:
+            return ";".join([names.get(ident, str(ident))] + [_label(f) for f in frames])
+
+        if frames[-1].f_code.co_name == "select":
+            return f"loop;{IDLE}"
+        handler = NO_HANDLER
+        start = 0
+        for index, f in enumerate(frames):
+            if f.f_code in self._handler_codes:
+                handler, start = f.f_code.co_name, index
+        return ";".join(["loop", handler] + [_label(f) for f in frames[start:]])
+
+def summary(stacks: Dict[str, int]) -> str:
+    """Текстовая сводка по циклу событий: доли обработчиков и самых частых вершин стеков"""
+    handlers: Counter = Counter()
+    leaves: Counter = Counter()
+    for stack, count in stacks.items():
+        parts = stack.split(";")
+        # Перед корнем может стоять номер шарда
+        if "loop" not in parts[:2]:
+            continue
+        handler = parts[parts.index("loop") + 1]
+        handlers[handler] += count
+        if handler != IDLE:
+            leaves[parts[-1]] += count
+    total = sum(handlers.values())
+    if not total:
+        return "Выборок нет"
+    lines = [f"Цикл событий ({total} выборок) по обработчикам:"]
+    lines += [f"  {name}: {count * 100 / total:.1f}%" for name, count in handlers.most_common(SUMMARY_TOP)]
+    lines.append("Чаще всего на вершине стека:")
+    lines += [f"  {name}: {count * 100 / total:.1f}%" for name, count in leaves.most_common(SUMMARY_TOP)]
+    return "\n".join(lines)
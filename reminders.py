@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from repository import repo
+from templates import DEFAULT_LOCALE, t
+from timing_wheel import TimingWheel
+
+logger = logging.getLogger(__name__)
+
+FARM_ACTIVE_SECONDS = 6 * 3600  # Сколько ферма работает после активации
+
+def is_unreachable(error: TelegramAPIError) -> bool:
+    """Ошибка значит, что получателю больше нельзя писать (заблокировал бота, удален, бот исключен из чата)"""
+    if isinstance(error, TelegramForbiddenError):
+        return True
+    return isinstance(error, TelegramBadRequest) and "chat not found" in error.message.lower()
+
+class SendQueue:
+    """Очередь исходящих сообщений с ограничением скорости отправки"""
+
+    def __init__(self, bot: Bot, rate: float):
+        self.bot = bot
+        self.interval = 1 / rate
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # Вызывается с ID получателя, которому больше нельзя писать
+        self.on_unreachable: Optional[Callable[[int], None]] = None
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def put(self, chat_id: int, text: str):
+        """Поставить сообщение в очередь"""
+        self._queue.put_nowait((chat_id, text))
+
+    async def _send(self, chat_id: int, text: str):
+        """Отправить одно сообщение из очереди"""
+        try:
+            await self.bot.send_message(chat_id, text)
+        except TelegramRetryAfter as e:
+            # Telegram просит подождать - ждем и возвращаем сообщение в очередь
+            await asyncio.sleep(e.retry_after)
+            self._queue.put_nowait((chat_id, text))
+        except TelegramAPIError as error:
+            if is_unreachable(error):
+                await repo.mark_unreachable([chat_id])
+                if self.on_unreachable is not None:
+                    self.on_unreachable(chat_id)
+
+    async def run(self):
+        """Фоновая задача: отправлять сообщения не чаще rate в секунду"""
+        while True:
+            chat_id, text = await self._queue.get()
+            try:
+                await self._send(chat_id, text)
+            except Exception:
+                # Любая другая ошибка (сеть, база) теряет только это сообщение, а не всю очередь
+                logger.exception(f"Не удалось отправить сообщение в чат {chat_id}")
+            finally:
+                self._queue.task_done()
+            await asyncio.sleep(self.interval)
+
+    async def join(self):
+        """Дождаться отправки всех сообщений из очереди"""
+        await self._queue.join()
+
+class ReminderScheduler:
+    """Напоминания об окончании активации ферм на иерархическом колесе таймеров"""
+
+    def __init__(self, send_queue: SendQueue):
+        self.send_queue = send_queue
+        self.wheel = TimingWheel(int(time.time()))
+        self.subscribers: set = set()
+
+    async def load(self):
+        """Восстановить подписчиков и таймеры по farms.last_activated"""
+        now = time.time()
+        async for chunk in repo.iter_reminder_subscribers():
+            for user_id, last_activated in chunk:
+                self.subscribers.add(user_id)
+                if last_activated:
+                    expires = datetime.fromisoformat(last_activated).timestamp() + FARM_ACTIVE_SECONDS
+                    # Истекшие, пока бот был выключен, не напоминаем задним числом
+                    if expires > now:
+                        self.wheel.schedule(user_id, int(expires))
+        logger.info(f"Напоминания: {len(self.subscribers)} подписчиков, {len(self.wheel)} таймеров")
+
+    def subscribe(self, user_id: int, last_activated: Optional[datetime] = None):
+        """Включить напоминания пользователю"""
+        self.subscribers.add(user_id)
+        if last_activated:
+            self.on_activated(user_id, last_activated)
+
+    def unsubscribe(self, user_id: int):
+        """Выключить напоминания пользователю"""
+        self.subscribers.discard(user_id)
+        self.wheel.cancel(user_id)
+
+    def on_activated(self, user_id: int, earliest_activation: datetime):
+        """Перенести напоминание после активации ферм"""
+        if user_id in self.subscribers:
+            self.wheel.schedule(user_id, int(earliest_activation.timestamp()) + FARM_ACTIVE_SECONDS)
+
+    async def run(self):
+        """Фоновая задача: раз в секунду прокручивать колесо и ставить напоминания в очередь"""
+        while True:
+            await asyncio.sleep(1)
+            for user_id in self.wheel.advance(int(time.time())):
+                # Язык подписчика не хранится - напоминание на локали по умолчанию
+                self.send_queue.put(user_id, t(DEFAULT_LOCALE, "remind.expired"))
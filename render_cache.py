@@ -0,0 +1,50 @@
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+# Сколько экранов держать в кэше и сколько секунд экран живет без изменений состояния
+RENDER_CACHE_SIZE = 20000
+RENDER_CACHE_TTL = 300
+
+class RenderCache:
+    """LRU-кэш готовых текстов экранов, привязанных к версии состояния пользователя.
+
+    Запись действительна, пока версия состояния не изменилась и не наступил
+    срок expires - момент, когда текст устареет сам по себе (например,
+    закончится активация фермы). Версию нужно брать до чтения данных из базы:
+    если состояние изменится во время рендера, запись сразу будет устаревшей.
+    """
+
+    def __init__(self, max_size: int = RENDER_CACHE_SIZE, ttl: float = RENDER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[str]:
+        """Текст экрана или None, если его нет или он устарел"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version or entry[1] <= time.time():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, key: Hashable, version: Hashable, text: str, expires: Optional[float] = None):
+        """Сохранить текст экрана (expires - когда он устареет сам по себе)"""
+        deadline = time.time() + self.ttl
+        if expires is not None:
+            deadline = min(deadline, expires)
+        self._entries[key] = (version, deadline, text)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Удалить все записи (например, после перезагрузки каталога)"""
+        self._entries.clear()
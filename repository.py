@@ -0,0 +1,759 @@
+import asyncio
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import database
+from config import (
+    STORAGE_BACKEND, INITIAL_STARS, REFERRAL_REWARD,
+    MAX_PURCHASE_QUANTITY, INCOME_ACCRUAL_MODE, INCOME_ACCRUAL_INTERVAL_MINUTES
+)
+from catalog import get_catalog
+
+# Сколько часов ферма работает после активации
+FARM_ACTIVE_HOURS = 6
+
+class Repository(ABC):
+    """Хранилище игровых данных: пользователи, фермы, NFT, рефералы, аукционы, баны, чаты.
+
+    Обработчики обращаются к данным только через этот интерфейс, поэтому
+    хранилище выбирается в config (STORAGE_BACKEND). Хранилище без какого-либо
+    метода не создается (TypeError при создании).
+    """
+
+    def startup_steps(self) -> List[tuple[str, Callable[[], Awaitable]]]:
+        """Шаги запуска хранилища (имя, шаг)"""
+        return []
+
+    def background_tasks(self) -> List[Callable[[], Awaitable]]:
+        """Фоновые задачи хранилища"""
+        return []
+
+    def shutdown_steps(self) -> List[tuple[str, Callable[[], Awaitable]]]:
+        """Шаги остановки хранилища (имя, шаг)"""
+        return []
+
+    def maintenance_tasks(self) -> Dict[str, Callable[[], Awaitable[str]]]:
+        """Задачи обслуживания хранилища (имя -> задача, возвращающая описание результата)"""
+        return {}
+
+    # Пользователи
+    @abstractmethod
+    def state_version(self, user_id: int) -> tuple[int, int]:
+        """Текущая версия состояния пользователя (для кэша экранов)"""
+
+    @abstractmethod
+    def mark_active(self, user_id: int):
+        """Отметить пользователя активным сегодня"""
+
+    @abstractmethod
+    async def load_processed_updates(self, limit: int) -> List[int]:
+        """Последние обработанные update_id, сохраненные вместе с изменениями (от новых к старым)"""
+
+    @abstractmethod
+    async def get_or_create_user(self, user_id: int) -> Dict:
+        """Получить или создать пользователя"""
+
+    @abstractmethod
+    async def get_user_stars(self, user_id: int) -> int:
+        """Баланс звезд пользователя"""
+
+    @abstractmethod
+    async def add_stars(self, user_id: int, amount: int, reason: str = "add"):
+        """Добавить звезды пользователю"""
+
+    @abstractmethod
+    async def spend_stars(self, user_id: int, amount: int, reason: str = "spend") -> bool:
+        """Потратить звезды (возвращает True если успешно)"""
+
+    @abstractmethod
+    async def settle_bet(self, user_id: int, bet: int, payout: int, game: str = "") -> Optional[int]:
+        """Рассчитать раунд казино (новый баланс или None, если звезд не хватает)"""
+
+    @abstractmethod
+    async def calculate_total_boost(self, user_id: int) -> float:
+        """Общий буст от всех NFT"""
+
+    @abstractmethod
+    async def set_expiry_reminder(self, user_id: int, enabled: bool):
+        """Включить или выключить напоминание об окончании активации ферм"""
+
+    @abstractmethod
+    def iter_reminder_subscribers(self) -> AsyncIterator[List[tuple]]:
+        """Подписчики напоминаний пачками [(user_id, самая ранняя активация или None)]"""
+
+    # Фермы и NFT
+    @abstractmethod
+    async def buy_farms(self, user_id: int, farm_type: str, quantity: Optional[int] = 1) -> tuple[int, int]:
+        """Купить несколько ферм (возвращает (куплено, баланс)); quantity=None - на все звезды"""
+
+    @abstractmethod
+    async def get_user_farms(self, user_id: int) -> List[Dict]:
+        """Все фермы пользователя (farm_type - код типа из каталога)"""
+
+    @abstractmethod
+    async def get_farm_histogram(self, user_id: int) -> tuple[List[int], List[int], Optional[str]]:
+        """Фермы векторами по кодам (всего, работающих) и самая ранняя активация работающих"""
+
+    @abstractmethod
+    async def activate_farms(self, user_id: int) -> tuple[int, int]:
+        """Активировать все фермы пользователя (возвращает (активировано, всего))"""
+
+    @abstractmethod
+    async def collect_farm_income(self, user_id: int) -> int:
+        """Собрать доход с активированных ферм"""
+
+    @abstractmethod
+    async def grant_farm(self, user_id: int, farm_type: str):
+        """Выдать ферму (выигрыш аукциона)"""
+
+    @abstractmethod
+    async def buy_nfts(self, user_id: int, nft_type: str, quantity: Optional[int] = 1) -> tuple[int, int]:
+        """Купить несколько NFT (возвращает (куплено, баланс)); quantity=None - на все звезды"""
+
+    @abstractmethod
+    async def get_user_nfts(self, user_id: int) -> List[Dict]:
+        """Все NFT пользователя (nft_type - код типа из каталога)"""
+
+    @abstractmethod
+    async def get_nft_histogram(self, user_id: int) -> List[int]:
+        """NFT вектором количеств по кодам"""
+
+    # Рефералы
+    @abstractmethod
+    async def register_referral(self, referrer_id: int, referred_id: int) -> bool:
+        """Зарегистрировать реферала (возвращает True если это новый реферал)"""
+
+    @abstractmethod
+    async def record_referral(self, referrer_id: int, referred_id: int):
+        """Записать реферала, зарегистрированного на другом шарде"""
+
+    @abstractmethod
+    async def give_referral_reward(self, referred_id: int) -> bool:
+        """Выдать награду рефералу (возвращает True если награда была выдана)"""
+
+    @abstractmethod
+    async def get_referral_count(self, user_id: int) -> int:
+        """Количество рефералов пользователя"""
+
+    # Аукционы
+    @abstractmethod
+    async def create_auction(self, farm_type: str, starting_price: int, duration_hours: int = 24) -> int:
+        """Создать аукцион (возвращает ID аукциона)"""
+
+    @abstractmethod
+    async def get_active_auctions(self) -> List[Dict]:
+        """Все активные аукционы"""
+
+    @abstractmethod
+    async def place_bid(self, auction_id: int, user_id: int, bid_amount: int,
+                        debit=None, credit=None) -> tuple[bool, str]:
+        """Сделать ставку (без debit и credit звезды участников меняются в этом же хранилище)"""
+
+    @abstractmethod
+    async def end_auction(self, auction_id: int, grant=None) -> Optional[Dict]:
+        """Завершить аукцион и выдать ферму победителю (без grant - в этом же хранилище)"""
+
+    # Баны и админ
+    @abstractmethod
+    async def load_bans(self) -> int:
+        """Загрузить список забаненных в память (возвращает их число)"""
+
+    @abstractmethod
+    async def is_banned(self, user_id: int) -> bool:
+        """Проверить, забанен ли пользователь"""
+
+    @abstractmethod
+    async def ban_user(self, user_id: int, reason: str, admin_id: int):
+        """Забанить пользователя"""
+
+    @abstractmethod
+    async def unban_user(self, user_id: int):
+        """Разбанить пользователя"""
+
+    @abstractmethod
+    async def admin_add_stars(self, user_id: int, amount: int):
+        """Админ: добавить звезды"""
+
+    @abstractmethod
+    async def admin_add_farm(self, user_id: int, farm_type: str):
+        """Админ: добавить ферму"""
+
+    @abstractmethod
+    async def admin_add_nft(self, user_id: int, nft_type: str):
+        """Админ: добавить NFT"""
+
+    # Чаты и рассылка
+    @abstractmethod
+    async def add_chat(self, chat_id: int, chat_type: str, title: str = None):
+        """Добавить чат"""
+
+    @abstractmethod
+    def iter_users(self) -> AsyncIterator[List[Dict]]:
+        """Пользователи, которым можно писать, пачками"""
+
+    @abstractmethod
+    def iter_chats(self) -> AsyncIterator[List[Dict]]:
+        """Чаты, в которых остался бот, пачками"""
+
+    @abstractmethod
+    async def mark_unreachable(self, chat_ids: List[int]):
+        """Не писать больше этим пользователям и чатам (заблокировали бота, удалены, бот исключен)"""
+
+    @abstractmethod
+    async def mark_reachable(self, chat_id: int):
+        """Снова писать пользователю или в чат"""
+
+    @abstractmethod
+    async def count_rows(self, table: str) -> int:
+        """Количество записей (users или chats)"""
+
+    # Админ: статистика, выгрузка, массовая выдача
+    @abstractmethod
+    async def get_economy_stats(self) -> Dict[str, Dict[str, int]]:
+        """Агрегаты экономики ({metric: {key: value}}; пусто, если еще не посчитаны)"""
+
+    @abstractmethod
+    def iter_table(self, table: str) -> AsyncIterator[List[Dict]]:
+        """Строки таблицы выгрузки пачками (users, farms, nfts, auctions)"""
+
+    @abstractmethod
+    def iter_user_ids(self, kind: str, value: str = None) -> AsyncIterator[List[int]]:
+        """ID пользователей по фильтру массовой выдачи пачками (database.BULK_FILTERS)"""
+
+    @abstractmethod
+    async def filter_existing_users(self, user_ids: List[int]) -> set:
+        """Оставить только существующих пользователей"""
+
+    @abstractmethod
+    async def bulk_add_stars(self, grants: List[tuple[int, int]], mark_update: bool = True):
+        """Выдать звезды пачке пользователей ([(user_id, amount)])"""
+
+    @abstractmethod
+    async def bulk_add_farms(self, grants: List[tuple[int, str]], mark_update: bool = True):
+        """Выдать фермы пачке пользователей ([(user_id, farm_type)])"""
+
+    @abstractmethod
+    async def bulk_add_nfts(self, grants: List[tuple[int, str]], mark_update: bool = True):
+        """Выдать NFT пачке пользователей ([(user_id, nft_type)])"""
+
+class SqliteRepository(Repository):
+    """Хранилище в SQLite (функции модуля database)"""
+
+    def startup_steps(self):
+        return [
+            ("миграции базы", database.init_db),
+            ("общее соединение", database.open_connection),
+            ("список банов", database.load_bans),
+            ("активные пользователи", database.warm_hot_users),
+        ]
+
+    def background_tasks(self):
+        tasks = [
+            database.buffers_flusher, database.ledger_checkpointer, database.economy_refresher, database.archiver
+        ]
+        if INCOME_ACCRUAL_MODE == "server":
+            tasks.append(lambda: database.income_accruer(INCOME_ACCRUAL_INTERVAL_MINUTES))
+        return tasks
+
+    def shutdown_steps(self):
+        return [("буферы и соединение с базой", database.close_connection)]
+
+    def maintenance_tasks(self):
+        return {
+            "checkpoint": database.checkpoint_wal,
+            "optimize": database.optimize,
+            "analyze": database.analyze,
+            "backup": database.make_backup,
+        }
+
+    state_version = staticmethod(database.state_version)
+    mark_active = staticmethod(database.mark_active)
+    load_processed_updates = staticmethod(database.load_processed_updates)
+    get_or_create_user = staticmethod(database.get_or_create_user)
+    get_user_stars = staticmethod(database.get_user_stars)
+    add_stars = staticmethod(database.add_stars)
+    spend_stars = staticmethod(database.spend_stars)
+    settle_bet = staticmethod(database.settle_bet)
+    calculate_total_boost = staticmethod(database.calculate_total_boost)
+    set_expiry_reminder = staticmethod(database.set_expiry_reminder)
+    iter_reminder_subscribers = staticmethod(database.iter_reminder_subscribers)
+    buy_farms = staticmethod(database.buy_farms)
+    get_user_farms = staticmethod(database.get_user_farms)
+    get_farm_histogram = staticmethod(database.get_farm_histogram)
+    activate_farms = staticmethod(database.activate_farms)
+    collect_farm_income = staticmethod(database.collect_farm_income)
+    grant_farm = staticmethod(database.grant_farm)
+    buy_nfts = staticmethod(database.buy_nfts)
+    get_user_nfts = staticmethod(database.get_user_nfts)
+    get_nft_histogram = staticmethod(database.get_nft_histogram)
+    register_referral = staticmethod(database.register_referral)
+    record_referral = staticmethod(database.record_referral)
+    give_referral_reward = staticmethod(database.give_referral_reward)
+    get_referral_count = staticmethod(database.get_referral_count)
+    create_auction = staticmethod(database.create_auction)
+    get_active_auctions = staticmethod(database.get_active_auctions)
+    load_bans = staticmethod(database.load_bans)
+    is_banned = staticmethod(database.is_banned)
+    ban_user = staticmethod(database.ban_user)
+    unban_user = staticmethod(database.unban_user)
+    admin_add_stars = staticmethod(database.admin_add_stars)
+    admin_add_farm = staticmethod(database.admin_add_farm)
+    admin_add_nft = staticmethod(database.admin_add_nft)
+    add_chat = staticmethod(database.add_chat)
+    iter_users = staticmethod(database.iter_users)
+    iter_chats = staticmethod(database.iter_chats)
+    mark_unreachable = staticmethod(database.mark_unreachable)
+    mark_reachable = staticmethod(database.mark_reachable)
+    count_rows = staticmethod(database.count_rows)
+    get_economy_stats = staticmethod(database.get_economy_stats)
+    iter_table = staticmethod(database.iter_table)
+    iter_user_ids = staticmethod(database.iter_user_ids)
+    filter_existing_users = staticmethod(database.filter_existing_users)
+    bulk_add_stars = staticmethod(database.bulk_add_stars)
+    bulk_add_farms = staticmethod(database.bulk_add_farms)
+    bulk_add_nfts = staticmethod(database.bulk_add_nfts)
+
+    place_bid = staticmethod(database.place_bid)
+    end_auction = staticmethod(database.end_auction)
+
+class MemoryRepository(Repository):
+    """Хранилище в памяти процесса: для нагрузочных тестов и замеров стоимости обработчиков без базы.
+
+    Повторяет поведение SQLite-хранилища, но ничего не сохраняет между запусками.
+    """
+
+    def __init__(self):
+        self.users: Dict[int, Dict] = {}
+        self.farms: Dict[int, List[Dict]] = {}
+        self.nfts: Dict[int, List[Dict]] = {}
+        self.referrals: Dict[int, Dict] = {}  # referred_id -> реферал
+        self.referral_counts: Dict[int, int] = {}
+        self.auctions: Dict[int, Dict] = {}
+        self.bans: Dict[int, Dict] = {}
+        self.chats: Dict[int, Dict] = {}
+        self._versions: Dict[int, int] = {}
+        self._next_id = 0
+        # Для статистики экономики: активные за день и движение звезд по причинам
+        self._active_day = None
+        self._active_users: set = set()
+        self._star_flows: Dict[str, int] = {}
+        self._casino_rounds = 0
+
+    def _new_id(self) -> int:
+        """Новый ID записи (общий счетчик для ферм, NFT и аукционов)"""
+        self._next_id += 1
+        return self._next_id
+
+    def _bump(self, user_id: int):
+        """Отметить, что состояние пользователя изменилось"""
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def state_version(self, user_id):
+        return 0, self._versions.get(user_id, 0)
+
+    def mark_active(self, user_id):
+        today = datetime.now().date()
+        if today != self._active_day:
+            self._active_day = today
+            self._active_users = set()
+        self._active_users.add(user_id)
+
+    def _flow(self, reason: str, delta: int):
+        """Учесть движение звезд по причине (для статистики экономики)"""
+        self._star_flows[reason] = self._star_flows.get(reason, 0) + delta
+
+    async def load_processed_updates(self, limit):
+        return []
+
+    def _user(self, user_id: int) -> Dict:
+        """Пользователь (создается при первом обращении)"""
+        user = self.users.get(user_id)
+        if user is None:
+            now = datetime.now().isoformat()
+            user = self.users[user_id] = {
+                "user_id": user_id, "stars": INITIAL_STARS, "last_collect": now,
+                "created_at": now, "boost": 1.0, "remind_expiry": 0,
+            }
+        return user
+
+    async def get_or_create_user(self, user_id):
+        return dict(self._user(user_id))
+
+    async def get_user_stars(self, user_id):
+        return self._user(user_id)["stars"]
+
+    async def add_stars(self, user_id, amount, reason="add"):
+        if user_id in self.users:
+            self.users[user_id]["stars"] += amount
+            self._flow(reason, amount)
+        self._bump(user_id)
+
+    async def spend_stars(self, user_id, amount, reason="spend"):
+        user = self._user(user_id)
+        if user["stars"] < amount:
+            return False
+        user["stars"] -= amount
+        self._flow(reason, -amount)
+        self._bump(user_id)
+        return True
+
+    async def settle_bet(self, user_id, bet, payout, game=""):
+        user = self.users.get(user_id)
+        if user is None or user["stars"] < bet:
+            return None
+        user["stars"] += payout - bet
+        self._flow(game or "casino", payout - bet)
+        self._casino_rounds += 1
+        self._bump(user_id)
+        return user["stars"]
+
+    async def calculate_total_boost(self, user_id):
+        return self._user(user_id)["boost"] or 1.0
+
+    async def set_expiry_reminder(self, user_id, enabled):
+        if user_id in self.users:
+            self.users[user_id]["remind_expiry"] = int(enabled)
+
+    async def iter_reminder_subscribers(self):
+        rows = []
+        for user_id, user in self.users.items():
+            if user["remind_expiry"] and not user.get("unreachable_at"):
+                activations = [farm["last_activated"] for farm in self.farms.get(user_id, []) if farm["is_active"]]
+                rows.append((user_id, min(activations, default=None)))
+        if rows:
+            yield rows
+
+    def _buy_quantity(self, user: Dict, price: int, quantity: Optional[int]) -> int:
+        """Сколько предметов можно купить (0 - если звезд не хватает)"""
+        if quantity is None:
+            quantity = user["stars"] // price
+        quantity = min(quantity, MAX_PURCHASE_QUANTITY)
+        if quantity <= 0 or user["stars"] < price * quantity:
+            return 0
+        user["stars"] -= price * quantity
+        self._bump(user["user_id"])
+        return quantity
+
+    def _add_farm(self, user_id: int, farm_type: str, last_activated: Optional[str]):
+        """Добавить ферму пользователю"""
+        self.farms.setdefault(user_id, []).append({
+            "id": self._new_id(), "user_id": user_id, "farm_type": get_catalog().farm_code(farm_type),
+            "purchased_at": datetime.now().isoformat(), "last_activated": last_activated, "is_active": 0,
+        })
+        self._bump(user_id)
+
+    def _add_nft(self, user_id: int, nft_type: str):
+        """Добавить NFT пользователю и умножить его буст"""
+        self.nfts.setdefault(user_id, []).append({
+            "id": self._new_id(), "user_id": user_id, "nft_type": get_catalog().nft_code(nft_type),
+            "purchased_at": datetime.now().isoformat(),
+        })
+        if user_id in self.users:
+            self.users[user_id]["boost"] *= get_catalog().nfts[nft_type]["boost"]
+        self._bump(user_id)
+
+    async def buy_farms(self, user_id, farm_type, quantity=1):
+        user = self._user(user_id)
+        farms = get_catalog().farms
+        if farm_type not in farms:
+            return 0, user["stars"]
+        bought = self._buy_quantity(user, farms[farm_type]["price"], quantity)
+        now = datetime.now().isoformat()
+        for _ in range(bought):
+            self._add_farm(user_id, farm_type, now)
+        return bought, user["stars"]
+
+    async def get_user_farms(self, user_id):
+        return [dict(farm) for farm in self.farms.get(user_id, [])]
+
+    async def get_farm_histogram(self, user_id):
+        since = (datetime.now() - timedelta(hours=FARM_ACTIVE_HOURS)).isoformat()
+        total: Dict[int, int] = {}
+        active: Dict[int, int] = {}
+        earliest = None
+        for farm in self.farms.get(user_id, []):
+            code = farm["farm_type"]
+            total[code] = total.get(code, 0) + 1
+            if farm["is_active"] and farm["last_activated"] and farm["last_activated"] > since:
+                active[code] = active.get(code, 0) + 1
+                earliest = min(earliest or farm["last_activated"], farm["last_activated"])
+        catalog = get_catalog()
+        return catalog.farm_vector(total), catalog.farm_vector(active), earliest
+
+    async def activate_farms(self, user_id):
+        farms = self.farms.get(user_id, [])
+        now = datetime.now()
+        activated = 0
+        for farm in farms:
+            if (not farm["last_activated"] or not farm["is_active"]
+                    or now - datetime.fromisoformat(farm["last_activated"]) >= timedelta(hours=FARM_ACTIVE_HOURS)):
+                farm["last_activated"] = now.isoformat()
+                farm["is_active"] = 1
+                activated += 1
+        if activated:
+            self._bump(user_id)
+        return activated, len(farms)
+
+    async def collect_farm_income(self, user_id):
+        if INCOME_ACCRUAL_MODE == "server":
+            return 0
+        user = self._user(user_id)
+        farms = self.farms.get(user_id, [])
+        if not farms:
+            return 0
+
+        now = datetime.now()
+        last_collect = datetime.fromisoformat(user["last_collect"]) if user["last_collect"] else now
+        hours_passed = min((now - last_collect).total_seconds() / 3600, 24)
+        catalog = get_catalog()
+        rates = catalog.farm_rates
+        total_income = 0
+        for farm in farms:
+            if not farm["is_active"]:
+                continue
+            activated_at = datetime.fromisoformat(farm["last_activated"]) if farm["last_activated"] else None
+            if activated_at and now - activated_at >= timedelta(hours=FARM_ACTIVE_HOURS):
+                farm["is_active"] = 0
+                self._bump(user_id)
+                continue
+            if catalog.is_farm_code(farm["farm_type"]):
+                hours = hours_passed
+                if activated_at:
+                    hours = min((now - max(activated_at, last_collect)).total_seconds() / 3600, hours_passed)
+                total_income += rates[farm["farm_type"]] * hours
+
+        total_income = int(total_income * (user["boost"] or 1.0))
+        user["last_collect"] = now.isoformat()
+        if total_income > 0:
+            await self.add_stars(user_id, total_income, "collect")
+        return total_income
+
+    async def grant_farm(self, user_id, farm_type):
+        self._add_farm(user_id, farm_type, None)
+
+    async def buy_nfts(self, user_id, nft_type, quantity=1):
+        user = self._user(user_id)
+        nfts = get_catalog().nfts
+        if nft_type not in nfts:
+            return 0, user["stars"]
+        bought = self._buy_quantity(user, nfts[nft_type]["price"], quantity)
+        for _ in range(bought):
+            self._add_nft(user_id, nft_type)
+        return bought, user["stars"]
+
+    async def get_user_nfts(self, user_id):
+        return [dict(nft) for nft in self.nfts.get(user_id, [])]
+
+    async def get_nft_histogram(self, user_id):
+        counts: Dict[int, int] = {}
+        for nft in self.nfts.get(user_id, []):
+            counts[nft["nft_type"]] = counts.get(nft["nft_type"], 0) + 1
+        return get_catalog().nft_vector(counts)
+
+    async def register_referral(self, referrer_id, referred_id):
+        if referrer_id == referred_id or referred_id in self.referrals:
+            return False
+        self.referrals[referred_id] = {"referrer_id": referrer_id, "referred_id": referred_id, "reward_given": 0}
+        self.referral_counts[referrer_id] = self.referral_counts.get(referrer_id, 0) + 1
+        self._bump(referrer_id)
+        return True
+
+    async def record_referral(self, referrer_id, referred_id):
+        if referred_id not in self.referrals:
+            self.referrals[referred_id] = {"referrer_id": referrer_id, "referred_id": referred_id, "reward_given": 1}
+            self.referral_counts[referrer_id] = self.referral_counts.get(referrer_id, 0) + 1
+        self._bump(referrer_id)
+
+    async def give_referral_reward(self, referred_id):
+        referral = self.referrals.get(referred_id)
+        if not referral or referral["reward_given"]:
+            return False
+        await self.add_stars(referred_id, REFERRAL_REWARD, "referral")
+        referral["reward_given"] = 1
+        return True
+
+    async def get_referral_count(self, user_id):
+        return self.referral_counts.get(user_id, 0)
+
+    async def create_auction(self, farm_type, starting_price, duration_hours=24):
+        if farm_type not in get_catalog().farms:
+            return 0
+        auction_id = self._new_id()
+        self.auctions[auction_id] = {
+            "id": auction_id, "farm_type": farm_type, "starting_price": starting_price,
+            "current_bid": starting_price, "current_bidder_id": None,
+            "end_time": (datetime.now() + timedelta(hours=duration_hours)).isoformat(),
+            "status": "active", "created_at": datetime.now().isoformat(),
+        }
+        return auction_id
+
+    async def get_active_auctions(self):
+        now = datetime.now().isoformat()
+        auctions = [
+            dict(auction) for auction in self.auctions.values()
+            if auction["status"] == "active" and auction["end_time"] > now
+        ]
+        return sorted(auctions, key=lambda auction: auction["end_time"])
+
+    async def place_bid(self, auction_id, user_id, bid_amount, debit=None, credit=None):
+        auction = self.auctions.get(auction_id)
+        if not auction or auction["status"] != "active":
+            return False, "Аукцион не найден или уже завершен"
+        if datetime.now() >= datetime.fromisoformat(auction["end_time"]):
+            auction["status"] = "ended"
+            return False, "Аукцион уже завершен"
+        if bid_amount <= auction["current_bid"]:
+            return False, f"Ставка должна быть больше {auction['current_bid']} ⭐"
+        if not await (debit or self.spend_stars)(user_id, bid_amount, "bid"):
+            return False, "Недостаточно звезд"
+        if auction["current_bidder_id"]:
+            await (credit or self.add_stars)(auction["current_bidder_id"], auction["current_bid"], "bid_refund")
+        auction["current_bid"] = bid_amount
+        auction["current_bidder_id"] = user_id
+        return True, f"Ставка принята: {bid_amount} ⭐"
+
+    async def end_auction(self, auction_id, grant=None):
+        auction = self.auctions.get(auction_id)
+        if not auction or auction["status"] != "active":
+            return None
+        result = dict(auction)
+        auction["status"] = "ended"
+        if auction["current_bidder_id"]:
+            await (grant or self.grant_farm)(auction["current_bidder_id"], auction["farm_type"])
+        return result
+
+    async def load_bans(self):
+        return len(self.bans)
+
+    async def is_banned(self, user_id):
+        return user_id in self.bans
+
+    async def ban_user(self, user_id, reason, admin_id):
+        self.bans[user_id] = {"user_id": user_id, "reason": reason, "banned_by": admin_id}
+
+    async def unban_user(self, user_id):
+        self.bans.pop(user_id, None)
+
+    async def admin_add_stars(self, user_id, amount):
+        await self.add_stars(user_id, amount, "admin")
+
+    async def admin_add_farm(self, user_id, farm_type):
+        self._add_farm(user_id, farm_type, datetime.now().isoformat())
+
+    async def admin_add_nft(self, user_id, nft_type):
+        self._add_nft(user_id, nft_type)
+
+    async def add_chat(self, chat_id, chat_type, title=None):
+        self.chats.setdefault(chat_id, {"chat_id": chat_id, "chat_type": chat_type, "title": title})
+
+    async def iter_users(self):
+        users = [dict(user) for user in self.users.values() if not user.get("unreachable_at")]
+        for start in range(0, len(users), database.STREAM_CHUNK_SIZE):
+            yield users[start:start + database.STREAM_CHUNK_SIZE]
+            await asyncio.sleep(0)
+
+    async def iter_chats(self):
+        chats = [dict(chat) for chat in self.chats.values() if not chat.get("unreachable_at")]
+        for start in range(0, len(chats), database.STREAM_CHUNK_SIZE):
+            yield chats[start:start + database.STREAM_CHUNK_SIZE]
+            await asyncio.sleep(0)
+
+    async def mark_unreachable(self, chat_ids):
+        now = datetime.now().isoformat()
+        for chat_id in chat_ids:
+            for record in (self.users.get(chat_id), self.chats.get(chat_id)):
+                if record is not None and not record.get("unreachable_at"):
+                    record["unreachable_at"] = now
+
+    async def mark_reachable(self, chat_id):
+        for record in (self.users.get(chat_id), self.chats.get(chat_id)):
+            if record is not None:
+                record["unreachable_at"] = None
+
+    async def count_rows(self, table):
+        tables = {"users": self.users, "chats": self.chats}
+        if table not in tables:
+            raise ValueError(f"Неизвестная таблица: {table}")
+        return len(tables[table])
+
+    async def get_economy_stats(self):
+        # Считается на лету: в памяти нет журнала, по которому SQLite копит агрегаты
+        farms: Dict[str, int] = {}
+        for user_farms in self.farms.values():
+            for farm in user_farms:
+                farms[str(farm["farm_type"])] = farms.get(str(farm["farm_type"]), 0) + 1
+        nfts: Dict[str, int] = {}
+        for user_nfts in self.nfts.values():
+            for nft in user_nfts:
+                nfts[str(nft["nft_type"])] = nfts.get(str(nft["nft_type"]), 0) + 1
+        flows = self._star_flows
+        return {
+            "stars": {"total": sum(user["stars"] for user in self.users.values())},
+            "activity": {"dau": len(self._active_users) if self._active_day == datetime.now().date() else 0},
+            "auction": {"volume": -sum(flows.get(reason, 0) for reason in database.AUCTION_LEDGER_REASONS)},
+            "casino": {
+                "rounds": self._casino_rounds,
+                "net": -sum(flows.get(reason, 0) for reason in database.CASINO_LEDGER_REASONS),
+            },
+            "farms": farms,
+            "nfts": nfts,
+            "meta": {"refreshed_at": int(datetime.now().timestamp())},
+        }
+
+    async def iter_table(self, table):
+        if table == "users":
+            rows = list(self.users.values())
+        elif table in ("farms", "nfts"):
+            rows = [row for user_rows in getattr(self, table).values() for row in user_rows]
+            rows.sort(key=lambda row: row["id"])
+        elif table == "auctions":
+            rows = list(self.auctions.values())
+        else:
+            raise ValueError(f"Неизвестная таблица: {table}")
+        for start in range(0, len(rows), database.STREAM_CHUNK_SIZE):
+            yield [dict(row) for row in rows[start:start + database.STREAM_CHUNK_SIZE]]
+            await asyncio.sleep(0)
+
+    async def iter_user_ids(self, kind, value=None):
+        if kind == "all":
+            user_ids = sorted(self.users)
+        elif kind == "farm":
+            catalog = get_catalog()
+            if value not in catalog.farms:
+                raise ValueError(f"Неизвестный тип фермы: {value}")
+            code = catalog.farm_code(value)
+            user_ids = sorted(
+                user_id for user_id, farms in self.farms.items() if any(farm["farm_type"] == code for farm in farms)
+            )
+        elif kind == "before":
+            user_ids = sorted(user_id for user_id, user in self.users.items() if user["created_at"] < value)
+        else:
+            raise ValueError(f"Неизвестный фильтр: {kind}")
+        for start in range(0, len(user_ids), database.BULK_GRANT_CHUNK_SIZE):
+            yield user_ids[start:start + database.BULK_GRANT_CHUNK_SIZE]
+            await asyncio.sleep(0)
+
+    async def filter_existing_users(self, user_ids):
+        return {user_id for user_id in user_ids if user_id in self.users}
+
+    async def bulk_add_stars(self, grants, mark_update=True):
+        for user_id, amount in grants:
+            await self.add_stars(user_id, amount, "admin")
+
+    async def bulk_add_farms(self, grants, mark_update=True):
+        now = datetime.now().isoformat()
+        for user_id, farm_type in grants:
+            self._add_farm(user_id, farm_type, now)
+
+    async def bulk_add_nfts(self, grants, mark_update=True):
+        for user_id, nft_type in grants:
+            self._add_nft(user_id, nft_type)
+
+REPOSITORIES = {
+    "sqlite": SqliteRepository,
+    "memory": MemoryRepository,
+}
+
+# Хранилище, с которым работает бот
+repo: Repository = REPOSITORIES[STORAGE_BACKEND]()
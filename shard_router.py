@@ -0,0 +1,171 @@
+"""Роутер шардированного запуска.
+
+Принимает вебхук Telegram и пересылает каждое обновление воркеру, которому
+принадлежит пользователь (user_id % SHARD_COUNT); обновления без пользователя
+уходят координатору (шард 0). Воркеры - процессы main.py со своей базой
+game_bot.shard<N>.db: роутер запускает их сам и останавливает вместе с собой.
+Звезды, фермы и NFT пользователя живут только в базе его шарда, аукционы - в
+базе координатора, поэтому воркеры не делят одну базу и одну блокировку записи.
+
+Запуск:
+    SHARD_COUNT=4 WEBHOOK_URL=https://example.com/webhook python shard_router.py
+    SHARD_COUNT=4 python shard_router.py --split game_bot.db   # разложить базу по шардам
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import secrets
+import signal
+import sqlite3
+import sys
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot
+
+from config import (
+    BOT_TOKEN, SHARD_COUNT, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+    ROUTER_HOST, ROUTER_PORT, WORKER_HOST, WORKER_BASE_PORT
+)
+from sharding import COORDINATOR_SHARD, shard_for, extract_user_id, worker_url
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Сколько секунд ждать, пока воркеры начнут принимать обновления
+WORKER_START_TIMEOUT = 60
+# Таблицы, строки которых принадлежат шарду пользователя
+USER_TABLES = (
+    "users", "farms", "nfts", "bans", "casino_rounds", "casino_rounds_archive",
+    "star_ledger", "star_snapshots", "daily_active",
+)
+
+def shard_db_name(shard: int) -> str:
+    """Файл базы шарда"""
+    return f"game_bot.shard{shard}.db"
+
+def split_database(source: str):
+    """Разложить существующую базу по базам шардов"""
+    for shard in range(SHARD_COUNT):
+        target = shard_db_name(shard)
+        if os.path.exists(target):
+            raise SystemExit(f"{target} уже существует")
+        src = sqlite3.connect(source)
+        db = sqlite3.connect(target)
+        src.backup(db)
+        src.close()
+
+        for table in USER_TABLES:
+            db.execute(f"DELETE FROM {table} WHERE user_id % ? != ?", (SHARD_COUNT, shard))
+        # Реферал нужен шарду приглашенного (проверка повтора) и шарду реферера (счетчик)
+        db.execute(
+            "DELETE FROM referrals WHERE referrer_id % ? != ? AND referred_id % ? != ?",
+            (SHARD_COUNT, shard, SHARD_COUNT, shard)
+        )
+        # Аукционы (с архивом) и чаты остаются у координатора
+        if shard != COORDINATOR_SHARD:
+            db.execute("DELETE FROM auctions")
+            db.execute("DELETE FROM auctions_archive")
+            db.execute("DELETE FROM chats")
+        # Статистика экономики пересчитается с нуля по данным шарда
+        db.execute("DELETE FROM economy_stats")
+        db.commit()
+        db.execute("VACUUM")
+        users = db.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        db.close()
+        print(f"{target}: пользователей {users:,}")
+
+async def forward_update(request: web.Request) -> web.Response:
+    """Переслать обновление воркеру шарда пользователя"""
+    if WEBHOOK_SECRET and not secrets.compare_digest(
+        request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), WEBHOOK_SECRET
+    ):
+        return web.Response(status=401)
+
+    body = await request.read()
+    user_id = extract_user_id(json.loads(body))
+    shard = shard_for(user_id) if user_id is not None else COORDINATOR_SHARD
+    try:
+        async with request.app["session"].post(
+            f"{worker_url(shard)}/update",
+            data=body,
+            headers={"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET},
+        ) as response:
+            return web.Response(status=response.status)
+    except aiohttp.ClientError:
+        # Telegram повторит доставку, когда воркер поднимется
+        logger.warning(f"Шард {shard} недоступен")
+        return web.Response(status=503)
+
+async def start_workers() -> list:
+    """Запустить воркеры шардов и дождаться, пока они начнут принимать обновления"""
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    workers = []
+    for shard in range(SHARD_COUNT):
+        env = {**os.environ, "SHARD_INDEX": str(shard), "DB_NAME": shard_db_name(shard)}
+        workers.append(await asyncio.create_subprocess_exec(sys.executable, main_path, env=env))
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + WORKER_START_TIMEOUT
+    for shard in range(SHARD_COUNT):
+        while True:
+            try:
+                _, writer = await asyncio.open_connection(WORKER_HOST, WORKER_BASE_PORT + shard)
+                writer.close()
+                break
+            except OSError:
+                if loop.time() > deadline:
+                    raise SystemExit(f"Шард {shard} не запустился за {WORKER_START_TIMEOUT} с")
+                await asyncio.sleep(0.2)
+    return workers
+
+async def stop_workers(workers: list):
+    """Остановить воркеры (каждый сам дожидается начатых обновлений)"""
+    for worker in workers:
+        if worker.returncode is None:
+            worker.send_signal(signal.SIGTERM)
+    await asyncio.gather(*(worker.wait() for worker in workers))
+
+async def run_router():
+    """Запустить воркеры, принять вебхук и переслать обновления до SIGTERM/SIGINT"""
+    workers = await start_workers()
+    logger.info(f"Запущено шардов: {SHARD_COUNT}")
+
+    app = web.Application()
+    app["session"] = aiohttp.ClientSession()
+    app.router.add_post(WEBHOOK_PATH, forward_update)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, ROUTER_HOST, ROUTER_PORT).start()
+
+    if WEBHOOK_URL:
+        bot = Bot(token=BOT_TOKEN)
+        await bot.set_webhook(WEBHOOK_URL, secret_token=WEBHOOK_SECRET or None)
+        await bot.session.close()
+    logger.info(f"Роутер слушает {ROUTER_HOST}:{ROUTER_PORT}{WEBHOOK_PATH}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    # Сначала перестаем принимать вебхук (Telegram придержит обновления), затем гасим воркеры
+    await runner.cleanup()
+    await app["session"].close()
+    await stop_workers(workers)
+
+def main():
+    parser = argparse.ArgumentParser(description="Роутер шардированного запуска бота")
+    parser.add_argument("--split", metavar="DB", help="разложить существующую базу по шардам и выйти")
+    args = parser.parse_args()
+
+    if args.split:
+        split_database(args.split)
+        return
+    asyncio.run(run_router())
+
+if __name__ == "__main__":
+    main()
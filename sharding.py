@@ -0,0 +1,178 @@
+import asyncio
+import secrets
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from repository import repo
+from config import SHARD_COUNT, SHARD_INDEX, WORKER_HOST, WORKER_BASE_PORT, WEBHOOK_SECRET
+
+# Шард, в базе которого живут общие аукционы (координатор)
+COORDINATOR_SHARD = 0
+# Сколько секунд ждать соединения с другим воркером
+RPC_CONNECT_TIMEOUT = 5
+
+# Состояние пользователя (звезды, фермы, NFT, бан) живет только на шарде user_id % SHARD_COUNT.
+# Операции над чужим пользователем и общие данные (аукционы, рассылка) идут
+# вызовом по HTTP к нужному воркеру; без шардирования все вызовы локальные.
+
+def shard_for(user_id: int) -> int:
+    """Номер шарда, которому принадлежит пользователь"""
+    return user_id % SHARD_COUNT
+
+def is_local(shard: int) -> bool:
+    """Обслуживает ли шард текущий процесс"""
+    return SHARD_INDEX is None or shard == SHARD_INDEX
+
+def served_shards() -> List[int]:
+    """Шарды, которые надо обойти, чтобы охватить всех пользователей (без шардирования - один локальный)"""
+    return [COORDINATOR_SHARD] if SHARD_INDEX is None else list(range(SHARD_COUNT))
+
+def owner_groups(rows: List) -> Dict[int, List]:
+    """Разложить строки [(user_id, ...)] по шардам их владельцев (без шардирования - все в один)"""
+    groups: Dict[int, List] = {}
+    for row in rows:
+        shard = COORDINATOR_SHARD if SHARD_INDEX is None else shard_for(row[0])
+        groups.setdefault(shard, []).append(row)
+    return groups
+
+def worker_url(shard: int) -> str:
+    """Адрес воркера шарда"""
+    return f"http://{WORKER_HOST}:{WORKER_BASE_PORT + shard}"
+
+def extract_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """ID пользователя из обновления Telegram (None, если его нет, например у постов каналов)"""
+    for key, payload in update.items():
+        if key == "update_id" or not isinstance(payload, dict):
+            continue
+        user = payload.get("from") or payload.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return user["id"]
+        return None
+    return None
+
+# Функции, которые можно вызвать на другом шарде
+rpc_methods: Dict[str, Callable[..., Awaitable]] = {}
+
+def rpc(func: Callable[..., Awaitable]):
+    """Декоратор: разрешить вызов функции с других шардов"""
+    rpc_methods[func.__name__] = func
+    return func
+
+for _func in (
+    repo.add_stars, repo.spend_stars, repo.grant_farm, repo.record_referral,
+    repo.admin_add_stars, repo.admin_add_farm, repo.admin_add_nft,
+    repo.ban_user, repo.unban_user, repo.count_rows, repo.mark_unreachable, repo.mark_reachable,
+    repo.create_auction, repo.get_active_auctions, repo.get_economy_stats,
+):
+    rpc(_func)
+
+_session: Optional[aiohttp.ClientSession] = None
+
+async def _get_session() -> aiohttp.ClientSession:
+    """HTTP-сессия для вызовов других воркеров (открывается один раз)"""
+    global _session
+    if _session is None or _session.closed:
+        # Общего таймаута нет: рассылка на шарде может идти долго
+        _session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=RPC_CONNECT_TIMEOUT)
+        )
+    return _session
+
+async def close_session():
+    """Закрыть HTTP-сессию при остановке"""
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+async def call(shard: int, method: str, *args) -> Any:
+    """Вызвать функцию на шарде (локально, если шард обслуживает этот процесс)"""
+    if is_local(shard):
+        return await rpc_methods[method](*args)
+    session = await _get_session()
+    async with session.post(
+        f"{worker_url(shard)}/rpc",
+        json={"method": method, "args": list(args)},
+        headers={"X-Shard-Secret": WEBHOOK_SECRET},
+    ) as response:
+        response.raise_for_status()
+        return (await response.json())["result"]
+
+async def call_owner(user_id: int, method: str, *args) -> Any:
+    """Вызвать функцию на шарде, которому принадлежит пользователь"""
+    return await call(shard_for(user_id), method, *args)
+
+async def call_all(method: str, *args) -> List[Any]:
+    """Вызвать функцию на всех шардах (результаты по порядку шардов)"""
+    if SHARD_INDEX is None:
+        return [await rpc_methods[method](*args)]
+    return list(await asyncio.gather(*(call(shard, method, *args) for shard in range(SHARD_COUNT))))
+
+async def rpc_handler(request: web.Request) -> web.Response:
+    """Обработчик вызовов от других шардов (POST /rpc)"""
+    if WEBHOOK_SECRET and not secrets.compare_digest(request.headers.get("X-Shard-Secret", ""), WEBHOOK_SECRET):
+        return web.Response(status=401)
+    payload = await request.json()
+    func = rpc_methods.get(payload.get("method"))
+    if func is None:
+        return web.Response(status=404)
+    return web.json_response({"result": await func(*payload.get("args", []))})
+
+# Аукционы: ставки сериализуются на координаторе, звезды списываются и
+# возвращаются на шардах участников, ферма выдается на шарде победителя
+_auction_lock = asyncio.Lock()
+
+async def _debit(user_id: int, amount: int, reason: str) -> bool:
+    """Списать звезды на шарде участника"""
+    return await call_owner(user_id, "spend_stars", user_id, amount, reason)
+
+async def _credit(user_id: int, amount: int, reason: str):
+    """Вернуть звезды на шарде участника"""
+    await call_owner(user_id, "add_stars", user_id, amount, reason)
+
+async def _grant(user_id: int, farm_type: str):
+    """Выдать ферму на шарде победителя"""
+    await call_owner(user_id, "grant_farm", user_id, farm_type)
+
+@rpc
+async def coordinator_place_bid(auction_id: int, user_id: int, bid_amount: int) -> tuple[bool, str]:
+    """Ставка на координаторе"""
+    async with _auction_lock:
+        # Без шардирования участники в той же базе: ставка пишется одной транзакцией
+        if SHARD_INDEX is None:
+            return await repo.place_bid(auction_id, user_id, bid_amount)
+        return await repo.place_bid(auction_id, user_id, bid_amount, debit=_debit, credit=_credit)
+
+@rpc
+async def coordinator_end_auction(auction_id: int) -> Optional[Dict]:
+    """Завершение аукциона на координаторе"""
+    async with _auction_lock:
+        if SHARD_INDEX is None:
+            return await repo.end_auction(auction_id)
+        return await repo.end_auction(auction_id, grant=_grant)
+
+async def get_active_auctions() -> List[Dict]:
+    """Активные аукционы (с координатора)"""
+    return await call(COORDINATOR_SHARD, "get_active_auctions")
+
+async def create_auction(farm_type: str, starting_price: int, duration_hours: int = 24) -> int:
+    """Создать аукцион на координаторе"""
+    return await call(COORDINATOR_SHARD, "create_auction", farm_type, starting_price, duration_hours)
+
+async def place_bid(auction_id: int, user_id: int, bid_amount: int) -> tuple[bool, str]:
+    """Сделать ставку (через координатор)"""
+    return tuple(await call(COORDINATOR_SHARD, "coordinator_place_bid", auction_id, user_id, bid_amount))
+
+async def end_auction(auction_id: int) -> Optional[Dict]:
+    """Завершить аукцион (через координатор)"""
+    return await call(COORDINATOR_SHARD, "coordinator_end_auction", auction_id)
+
+async def register_referral(referrer_id: int, referred_id: int) -> bool:
+    """Зарегистрировать реферала на его шарде и учесть его на шарде реферера"""
+    if not await repo.register_referral(referrer_id, referred_id):
+        return False
+    if not is_local(shard_for(referrer_id)):
+        await call_owner(referrer_id, "record_referral", referrer_id, referred_id)
+    return True
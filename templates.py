@@ -0,0 +1,143 @@
+import json
+import os
+from string import Formatter
+from typing import Callable, Dict, FrozenSet
+
+from catalog import get_catalog
+
+# Слой шаблонов сообщений. Каталоги локалей (locales/<язык>.json) читаются
+# и разбираются один раз при запуске: каждый шаблон превращается в список
+# кусков (статичный текст, подстановка, преобразование, формат). Рендер -
+# склейка кусков без повторного разбора строки формата.
+
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales")
+DEFAULT_LOCALE = "ru"
+
+# Преобразования подстановки: {x!r}, {x!s}, {x!a}
+_CONVERSIONS = {None: lambda value: value, "r": repr, "s": str, "a": ascii}
+
+class Template:
+    """Разобранный шаблон сообщения"""
+
+    __slots__ = ("source", "fields", "render")
+
+    def __init__(self, source: str):
+        self.source = source
+        pieces = []
+        fields = []
+        for literal, field, spec, conversion in Formatter().parse(source):
+            if field is None:
+                pieces.append((literal, None, None, None))
+                continue
+            if not field.isidentifier():
+                raise ValueError(f"Недопустимая подстановка {{{field}}} в шаблоне: {source!r}")
+            if conversion not in _CONVERSIONS:
+                raise ValueError(f"Недопустимое преобразование !{conversion} в шаблоне: {source!r}")
+            if "{" in spec or "}" in spec:
+                # Вложенные подстановки в формате не поддерживаются
+                raise ValueError(f"Недопустимый формат :{spec} в шаблоне: {source!r}")
+            if field not in fields:
+                fields.append(field)
+            pieces.append((literal, field, _CONVERSIONS[conversion], spec))
+
+        self.fields = tuple(fields)
+        if not fields:
+            # Статичный текст не требует форматирования вовсе
+            self.render = lambda **_: source
+            return
+
+        pieces = tuple(pieces)
+
+        def render(**values) -> str:
+            out = []
+            for literal, field, convert, spec in pieces:
+                out.append(literal)
+                if field is not None:
+                    out.append(format(convert(values[field]), spec))
+            return "".join(out)
+
+        self.render = render
+
+    def __repr__(self):
+        return f"Template({self.source!r})"
+
+_catalogs: Dict[str, Dict[str, Template]] = {}
+_labels: Dict[str, FrozenSet[str]] = {}
+# (локаль, имя) -> статичный кусок текста или клавиатура, собранные один раз
+_fragments: Dict[tuple, object] = {}
+
+def load_locales(path: str = LOCALES_DIR):
+    """Прочитать и скомпилировать все каталоги локалей"""
+    catalogs = {}
+    for filename in sorted(os.listdir(path)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(path, filename), encoding="utf-8") as f:
+            raw = json.load(f)
+        catalogs[filename[:-5]] = {key: Template(text) for key, text in raw.items()}
+
+    if DEFAULT_LOCALE not in catalogs:
+        raise RuntimeError(f"Нет каталога локали по умолчанию: {DEFAULT_LOCALE}.json")
+
+    # Недостающие ключи берутся из локали по умолчанию
+    default = catalogs[DEFAULT_LOCALE]
+    for locale, catalog in catalogs.items():
+        for key, template in default.items():
+            catalog.setdefault(key, template)
+
+    # Все варианты статичных текстов (кнопки меню) для фильтров входящих сообщений
+    labels = {}
+    for catalog in catalogs.values():
+        for key, template in catalog.items():
+            if not template.fields:
+                labels.setdefault(key, set()).add(template.source)
+
+    _catalogs.clear()
+    _catalogs.update(catalogs)
+    _labels.clear()
+    _labels.update({key: frozenset(values) for key, values in labels.items()})
+    _fragments.clear()
+
+def locale_for(language_code: str = None) -> str:
+    """Локаль по language_code пользователя Telegram"""
+    if language_code:
+        code = language_code.split("-")[0].lower()
+        if code in _catalogs:
+            return code
+    return DEFAULT_LOCALE
+
+def available_locales() -> tuple:
+    """Все загруженные локали"""
+    return tuple(_catalogs)
+
+def t(locale: str, key: str, **values) -> str:
+    """Отрендерить шаблон key в локали locale"""
+    return _catalogs[locale][key].render(**values)
+
+def labels(key: str) -> FrozenSet[str]:
+    """Все переводы статичного текста (для фильтров кнопок меню)"""
+    return _labels[key]
+
+def fragment(locale: str, name: str, build: Callable[[str], object]):
+    """Статичный кусок сообщения, собранный build(locale) один раз на локаль"""
+    key = (locale, name)
+    value = _fragments.get(key)
+    if value is None:
+        value = _fragments[key] = build(locale)
+    return value
+
+def clear_fragments():
+    """Сбросить собранные куски (после перезагрузки каталога ферм и NFT)"""
+    _fragments.clear()
+
+def farm_name(locale: str, farm_id: str) -> str:
+    """Название фермы (перевод из каталога локали или название из каталога ферм)"""
+    template = _catalogs[locale].get(f"farm.{farm_id}")
+    return template.source if template else get_catalog().farms[farm_id]['name']
+
+def nft_name(locale: str, nft_id: str) -> str:
+    """Название NFT (перевод из каталога локали или название из каталога NFT)"""
+    template = _catalogs[locale].get(f"nft.{nft_id}")
+    return template.source if template else get_catalog().nfts[nft_id]['name']
+
+load_locales()
@@ -0,0 +1,33 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BOT_TOKEN", "1:test")
+
+import database
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Пустая база во временном каталоге: run(coro) выполняет корутину и закрывает соединения"""
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "game_bot.db"))
+    monkeypatch.setattr(database, "BACKUP_DIR", str(tmp_path / "backups"))
+    monkeypatch.setattr(database, "_casino_rounds_buffer", [])
+    monkeypatch.setattr(database, "_active_users", set())
+    monkeypatch.setattr(database, "_banned_ids", None)
+
+    def run(coro):
+        async def main():
+            try:
+                await database.init_db()
+            except BaseException:
+                coro.close()
+                raise
+            try:
+                return await coro
+            finally:
+                await database.close_connection()
+        return asyncio.run(main())
+    return run
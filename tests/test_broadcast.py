@@ -0,0 +1,29 @@
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError
+
+import database
+import main
+
+def test_broadcast_counts_unreachable_separately(db, monkeypatch):
+    delivered = []
+
+    async def send_message(chat_id, text):
+        if chat_id == 2:
+            raise TelegramForbiddenError(method=None, message="Forbidden: bot was blocked by the user")
+        if chat_id == 3:
+            raise TelegramNetworkError(method=None, message="timeout")
+        delivered.append(chat_id)
+
+    monkeypatch.setattr(main.bot, "send_message", send_message)
+
+    async def scenario():
+        for user_id in (1, 2, 3):
+            await database.get_or_create_user(user_id)
+        first = await main.broadcast_local("привет")
+        second = await main.broadcast_local("еще раз")
+        return first, second
+
+    first, second = db(scenario())
+    assert first == (1, 1, 1)
+    # Заблокировавший бота больше не получает рассылку
+    assert second == (1, 1, 0)
+    assert delivered == [1, 1]
@@ -0,0 +1,36 @@
+import pytest
+
+import main
+from config import BULK_GRANT_MAX_QUANTITY, FARM_TYPES
+
+def test_csv_rows_and_header():
+    lines = ["user_id,quantity\n", "1,3\n", "\n", "2\n", " 3 , 2 \n"]
+    assert main.parse_bulk_csv(lines, BULK_GRANT_MAX_QUANTITY) == [(1, 3), (2, None), (3, 2)]
+
+def test_csv_rejects_quantity_above_cap():
+    with pytest.raises(ValueError, match="строка 2"):
+        main.parse_bulk_csv(["1,1\n", f"123,{BULK_GRANT_MAX_QUANTITY + 1}\n"], BULK_GRANT_MAX_QUANTITY)
+
+def test_csv_rejects_non_positive_and_non_numeric_quantity():
+    with pytest.raises(ValueError, match="строка 1"):
+        main.parse_bulk_csv(["1,0\n"], BULK_GRANT_MAX_QUANTITY)
+    with pytest.raises(ValueError, match="не число"):
+        main.parse_bulk_csv(["1,много\n"], BULK_GRANT_MAX_QUANTITY)
+
+def test_csv_star_amounts_are_not_capped():
+    assert main.parse_bulk_csv(["1,10000000\n", "2,-50\n"]) == [(1, 10000000), (2, -50)]
+
+def test_filters():
+    farm_id = next(iter(FARM_TYPES))
+    assert main.parse_bulk_filter("all") == ("all", None)
+    assert main.parse_bulk_filter(f"farm:{farm_id}") == ("farm", farm_id)
+    assert main.parse_bulk_filter("before:2024-01-31") == ("before", "2024-01-31")
+
+@pytest.mark.parametrize("text, reason", [
+    ("everyone", "неизвестный фильтр"),
+    ("farm:nope", "неизвестный тип фермы"),
+    ("before:31.01.2024", "неверная дата"),
+])
+def test_bad_filters(text, reason):
+    with pytest.raises(ValueError, match=reason):
+        main.parse_bulk_filter(text)
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+import database
+
+async def _stars(user_id: int) -> int:
+    async with database._reader() as db:
+        cursor = await db.execute("SELECT stars FROM users WHERE user_id = ?", (user_id,))
+        return (await cursor.fetchone())[0]
+
+async def _rounds() -> int:
+    async with database._reader() as db:
+        cursor = await db.execute("SELECT COUNT(*) FROM casino_rounds")
+        return (await cursor.fetchone())[0]
+
+def test_settle_bet_win_and_loss(db):
+    async def scenario():
+        await database.get_or_create_user(1)
+        won = await database.settle_bet(1, 100, 250, "dice")
+        lost = await database.settle_bet(1, 50, 0, "slots")
+        return won, lost, await _stars(1)
+
+    assert db(scenario()) == (350, 300, 300)
+
+def test_settle_bet_rejects_bet_above_balance(db):
+    async def scenario():
+        await database.get_or_create_user(1)
+        result = await database.settle_bet(1, 201, 1000, "dice")
+        await database.flush_casino_rounds()
+        return result, await _stars(1), await _rounds()
+
+    assert db(scenario()) == (None, 200, 0)
+
+def test_concurrent_bets_never_overdraw(db):
+    async def scenario():
+        await database.get_or_create_user(1)
+        results = await asyncio.gather(*(database.settle_bet(1, 30, 0, "dice") for _ in range(10)))
+        await database.flush_casino_rounds()
+        return results, await _stars(1), await _rounds()
+
+    results, stars, rounds = db(scenario())
+    settled = [result for result in results if result is not None]
+    assert len(settled) == 6 and rounds == 6
+    assert stars == 20
+
+def test_failed_flush_keeps_rounds(db, monkeypatch):
+    async def scenario():
+        await database.get_or_create_user(1)
+        await database.settle_bet(1, 10, 0, "dice")
+        write = database._write
+
+        async def failing(job, *args, **kwargs):
+            raise RuntimeError("сбой")
+        monkeypatch.setattr(database, "_write", failing)
+        with pytest.raises(RuntimeError):
+            await database.flush_casino_rounds()
+        kept = len(database._casino_rounds_buffer)
+        monkeypatch.setattr(database, "_write", write)
+        await database.flush_casino_rounds()
+        return kept, len(database._casino_rounds_buffer), await _rounds()
+
+    assert db(scenario()) == (1, 0, 1)
@@ -0,0 +1,36 @@
+import pytest
+
+import database
+
+async def _active_today() -> set:
+    async with database._reader() as db:
+        cursor = await db.execute("SELECT user_id FROM daily_active")
+        return {row[0] for row in await cursor.fetchall()}
+
+def test_failed_flush_keeps_active_users(db, monkeypatch):
+    async def scenario():
+        database.mark_active(1)
+        database.mark_active(2)
+        write = database._write
+
+        async def failing(job, *args, **kwargs):
+            raise RuntimeError("сбой")
+        monkeypatch.setattr(database, "_write", failing)
+        with pytest.raises(RuntimeError):
+            await database.flush_active_users()
+        kept = set(database._active_users)
+        monkeypatch.setattr(database, "_write", write)
+        await database.flush_active_users()
+        return kept, await _active_today()
+
+    assert db(scenario()) == ({1, 2}, {1, 2})
+
+def test_dau_in_economy_stats(db):
+    async def scenario():
+        for user_id in (1, 2, 3):
+            database.mark_active(user_id)
+        database.mark_active(1)
+        await database.refresh_economy_stats()
+        return await database.get_economy_stats()
+
+    assert db(scenario())["activity"]["dau"] == 3
@@ -0,0 +1,79 @@
+import sqlite3
+
+import pytest
+
+import database
+import ledger_replay
+
+async def _balances_and_ledger():
+    """Балансы users.stars и суммы журнала по пользователям"""
+    async with database._reader() as db:
+        cursor = await db.execute("SELECT user_id, stars FROM users")
+        balances = {row[0]: row[1] for row in await cursor.fetchall()}
+        cursor = await db.execute("SELECT user_id, SUM(delta) FROM star_ledger GROUP BY user_id")
+        ledger = {row[0]: row[1] for row in await cursor.fetchall()}
+    return balances, ledger
+
+def test_ledger_matches_balances(db):
+    async def scenario():
+        await database.get_or_create_user(1)
+        await database.get_or_create_user(2)
+        await database.add_stars(1, 50, "admin")
+        assert await database.spend_stars(2, 120, "farm")
+        assert not await database.spend_stars(2, 10_000, "farm")
+        assert await database.settle_bet(1, 100, 300, "dice") == 450
+        assert await database.settle_bet(2, 10_000, 0, "dice") is None
+        await database.buy_farms(1, next(iter(database.get_catalog().farms)), 1)
+        return await _balances_and_ledger()
+
+    balances, ledger = db(scenario())
+    assert balances == ledger
+
+def test_ledger_is_written_with_balance(db):
+    async def scenario():
+        await database.get_or_create_user(1)
+        await database.add_stars(1, 25, "admin")
+        # Журнал в базе сразу после изменения, без фонового сброса
+        async with database._reader() as reader:
+            cursor = await reader.execute("SELECT delta, reason FROM star_ledger WHERE user_id = 1 ORDER BY id")
+            return [tuple(row) for row in await cursor.fetchall()]
+
+    assert db(scenario()) == [(200, "signup"), (25, "admin")]
+
+def test_failed_write_leaves_no_ledger_row(db):
+    async def scenario():
+        await database.get_or_create_user(1)
+
+        async def failing(db):
+            await db.execute("UPDATE users SET stars = stars + 10 WHERE user_id = 1")
+            await database._ledger_append(db, 1, 10, "admin")
+            raise RuntimeError("сбой")
+        with pytest.raises(RuntimeError):
+            await database._write(failing)
+        return await _balances_and_ledger()
+
+    balances, ledger = db(scenario())
+    assert balances == ledger == {1: 200}
+
+def test_replay_from_snapshot(db):
+    async def scenario():
+        for user_id in (1, 2, 3):
+            await database.get_or_create_user(user_id)
+        await database.add_stars(1, 10, "admin")
+        await database.checkpoint_balances()
+        await database.settle_bet(2, 50, 0, "slots")
+        await database.add_stars(3, 7, "admin")
+        balances, _ = await _balances_and_ledger()
+        return balances
+
+    balances = db(scenario())
+    conn = sqlite3.connect(database.DB_NAME)
+    try:
+        rebuilt, after = ledger_replay.load_snapshot(conn)
+        assert after > 0
+        ledger_replay.replay(conn, rebuilt, after)
+        full = {}
+        ledger_replay.replay(conn, full, 0)
+    finally:
+        conn.close()
+    assert rebuilt == full == balances
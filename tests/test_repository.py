@@ -0,0 +1,65 @@
+import asyncio
+import csv
+import io
+import os
+import zipfile
+
+import pytest
+
+import export
+from catalog import get_catalog
+from repository import MemoryRepository, Repository, SqliteRepository
+
+def test_incomplete_backend_fails_at_instantiation():
+    class Partial(Repository):
+        async def get_user_stars(self, user_id):
+            return 0
+
+    with pytest.raises(TypeError, match="abstract"):
+        Partial()
+    SqliteRepository()
+    MemoryRepository()
+
+def test_memory_backend_bulk_grants_and_economy():
+    repo = MemoryRepository()
+    farm_type = next(iter(get_catalog().farms))
+    nft_type = next(iter(get_catalog().nfts))
+
+    async def scenario():
+        for user_id in (1, 2, 3):
+            await repo.get_or_create_user(user_id)
+        await repo.bulk_add_farms([(1, farm_type), (1, farm_type)])
+        owners = [user_ids async for user_ids in repo.iter_user_ids("farm", farm_type)]
+        everyone = [user_ids async for user_ids in repo.iter_user_ids("all")]
+        existing = await repo.filter_existing_users([2, 3, 99])
+        await repo.bulk_add_stars([(2, 50), (3, 50)])
+        await repo.bulk_add_nfts([(3, nft_type)])
+        await repo.settle_bet(2, 10, 0, "dice")
+        return owners, everyone, existing, await repo.get_economy_stats()
+
+    owners, everyone, existing, stats = asyncio.run(scenario())
+    assert owners == [[1]] and everyone == [[1, 2, 3]]
+    assert existing == {2, 3}
+    assert stats["stars"]["total"] == 3 * 200 + 100 - 10
+    assert stats["casino"] == {"rounds": 1, "net": 10}
+    assert stats["farms"] == {str(get_catalog().farm_code(farm_type)): 2}
+    assert stats["nfts"] == {str(get_catalog().nft_code(nft_type)): 1}
+
+def test_memory_backend_export(monkeypatch):
+    repo = MemoryRepository()
+    monkeypatch.setattr(export, "repo", repo)
+    farm_type = next(iter(get_catalog().farms))
+
+    async def scenario():
+        await repo.get_or_create_user(1)
+        await repo.bulk_add_farms([(1, farm_type)])
+        return await export.export_dump("csv", ("users", "farms"))
+
+    path, counts = asyncio.run(scenario())
+    try:
+        with zipfile.ZipFile(path) as archive:
+            farms = list(csv.DictReader(io.TextIOWrapper(archive.open("farms.csv"), encoding="utf-8")))
+    finally:
+        os.remove(path)
+    assert counts == {"users": 1, "farms": 1}
+    assert farms[0]["farm_type"] == farm_type
@@ -0,0 +1,35 @@
+import asyncio
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError
+
+import reminders
+
+class FakeBot:
+    def __init__(self):
+        self.delivered = []
+
+    async def send_message(self, chat_id, text):
+        if chat_id == 1:
+            raise TelegramNetworkError(method=None, message="timeout")
+        if chat_id == 2:
+            raise TelegramForbiddenError(method=None, message="Forbidden: bot was blocked by the user")
+        self.delivered.append(chat_id)
+
+def test_queue_survives_errors_per_message(monkeypatch):
+    async def mark_unreachable(chat_ids):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(reminders.repo, "mark_unreachable", mark_unreachable)
+
+    async def scenario():
+        bot = FakeBot()
+        queue = reminders.SendQueue(bot, rate=1000)
+        for chat_id in (1, 2, 3):
+            queue.put(chat_id, "⏰")
+        task = asyncio.create_task(queue.run())
+        await asyncio.wait_for(queue.join(), 1)
+        alive = not task.done()
+        task.cancel()
+        return bot.delivered, alive
+
+    assert asyncio.run(scenario()) == ([3], True)
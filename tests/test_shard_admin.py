@@ -0,0 +1,66 @@
+import csv
+import io
+import os
+import zipfile
+
+import database
+import export
+import main
+import sharding
+
+def test_economy_stats_are_summed_across_shards():
+    parts = [
+        {"stars": {"total": 100}, "farms": {"1": 2}, "meta": {"refreshed_at": 50}},
+        {},
+        {"stars": {"total": 40}, "farms": {"1": 1, "2": 5}, "meta": {"refreshed_at": 30}},
+    ]
+    assert main.merge_economy_stats(parts) == {
+        "stars": {"total": 140}, "farms": {"1": 3, "2": 5}, "meta": {"refreshed_at": 30},
+    }
+
+def test_csv_rows_go_to_their_owner_shards(monkeypatch):
+    rows = [(1, 3), (2, None), (4, 1), (7, None)]
+    assert sharding.owner_groups(rows) == {0: rows}
+    monkeypatch.setattr(sharding, "SHARD_INDEX", 1)
+    monkeypatch.setattr(sharding, "SHARD_COUNT", 3)
+    assert sharding.owner_groups(rows) == {1: [(1, 3), (4, 1), (7, None)], 2: [(2, None)]}
+    assert sharding.served_shards() == [0, 1, 2]
+
+def _part(tmp_path, name: str, text: str) -> str:
+    path = str(tmp_path / name)
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("users.csv", text)
+    return path
+
+def test_shard_dumps_are_merged_with_one_header(tmp_path):
+    parts = [
+        _part(tmp_path, "a.zip", "user_id,stars\r\n2,10\r\n"),
+        _part(tmp_path, "b.zip", ""),
+        _part(tmp_path, "c.zip", "user_id,stars\r\n1,5\r\n3,7\r\n"),
+    ]
+    path = export.merge_dumps(parts, "csv", ("users",))
+    try:
+        with zipfile.ZipFile(path) as archive:
+            rows = list(csv.DictReader(io.TextIOWrapper(archive.open("users.csv"), encoding="utf-8")))
+    finally:
+        os.remove(path)
+    assert [row["user_id"] for row in rows] == ["2", "1", "3"]
+    assert not any(os.path.exists(part) for part in parts)
+
+def test_local_bulk_grant_skips_unknown_users_and_marks_once(db):
+    async def scenario():
+        for user_id in (1, 2):
+            await database.get_or_create_user(user_id)
+        reported = []
+
+        async def on_chunk(users):
+            reported.append(users)
+
+        token = database.current_update_id.set(40)
+        try:
+            result = await main.bulk_grant_local("bulk_stars", 5, None, None, [[1, 3], [2, None], [99, 1]], on_chunk)
+        finally:
+            database.current_update_id.reset(token)
+        return result, reported, await database.get_user_stars(1), await database.load_processed_updates()
+
+    assert db(scenario()) == ((2, 2), [2], 203, [40])
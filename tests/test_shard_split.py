@@ -0,0 +1,36 @@
+import sqlite3
+
+import database
+import shard_router
+
+def _count(path: str, table: str, where: str = "1") -> int:
+    db = sqlite3.connect(path)
+    try:
+        return db.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}").fetchone()[0]
+    finally:
+        db.close()
+
+def test_split_moves_archives_with_their_owners(db, tmp_path, monkeypatch):
+    async def scenario():
+        for user_id in (1, 2, 3, 4):
+            await database.get_or_create_user(user_id)
+    db(scenario())
+
+    source = sqlite3.connect(database.DB_NAME)
+    source.executemany(
+        "INSERT INTO casino_rounds_archive (id, user_id, game, bet, payout, created_at) VALUES (?, ?, 'dice', 10, 0, '2020-01-01')",
+        [(user_id, user_id) for user_id in (1, 2, 3, 4)]
+    )
+    source.execute("INSERT INTO auctions_archive (id, farm_type, final_bid, winner_id, end_time) VALUES (1, 'basic', 100, 2, '2020-01-01')")
+    source.commit()
+    source.close()
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(shard_router, "SHARD_COUNT", 2)
+    shard_router.split_database(database.DB_NAME)
+
+    for shard in (0, 1):
+        path = shard_router.shard_db_name(shard)
+        assert _count(path, "casino_rounds_archive") == 2
+        assert _count(path, "casino_rounds_archive", f"user_id % 2 != {shard}") == 0
+        assert _count(path, "auctions_archive") == (1 if shard == shard_router.COORDINATOR_SHARD else 0)
@@ -0,0 +1,25 @@
+import pytest
+
+from templates import Template, load_locales, t
+
+def test_render_fields_specs_and_conversions():
+    template = Template("{name}: {stars:>6,} ⭐ {{без подстановки}} {name!r}")
+    assert template.fields == ("name", "stars")
+    assert template.render(name="Аня", stars=12345, extra=1) == "Аня: 12,345 ⭐ {без подстановки} 'Аня'"
+
+def test_static_text_is_returned_as_is():
+    assert Template("🌾 Мои фермы").render() == "🌾 Мои фермы"
+
+@pytest.mark.parametrize("source", [
+    '{name:{__import__("os").getpid()}}',
+    "{x:>{w}}",
+    "{user.name}",
+    "{items[0]}",
+])
+def test_unsafe_templates_are_rejected(source):
+    with pytest.raises(ValueError):
+        Template(source)
+
+def test_all_locales_load():
+    load_locales()
+    assert t("ru", "menu.profile")
@@ -0,0 +1,115 @@
+import asyncio
+import csv
+import io
+import os
+import sqlite3
+import zipfile
+
+import pytest
+
+import catalog
+import database
+import export
+from config import FARM_TYPES, NFT_GIFTS
+
+# Схема ферм и NFT до перехода на коды: тип хранился текстовым ID
+OLD_SCHEMA = """
+    CREATE TABLE users (user_id INTEGER PRIMARY KEY, stars INTEGER DEFAULT 200,
+                        last_collect TIMESTAMP, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+    CREATE TABLE farms (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, farm_type TEXT,
+                        purchased_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, last_activated TIMESTAMP,
+                        is_active BOOLEAN DEFAULT 0, FOREIGN KEY (user_id) REFERENCES users (user_id));
+    CREATE TABLE nfts (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, nft_type TEXT,
+                       purchased_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                       FOREIGN KEY (user_id) REFERENCES users (user_id));
+"""
+
+def _old_database(path: str, farm_types: list, nft_types: list):
+    db = sqlite3.connect(path)
+    db.executescript(OLD_SCHEMA)
+    db.execute("INSERT INTO users (user_id, stars) VALUES (1, 500)")
+    db.executemany("INSERT INTO farms (user_id, farm_type) VALUES (1, ?)", [(farm_type,) for farm_type in farm_types])
+    db.executemany("INSERT INTO nfts (user_id, nft_type) VALUES (1, ?)", [(nft_type,) for nft_type in nft_types])
+    db.commit()
+    db.close()
+
+def test_migration_rewrites_types_to_codes(db):
+    farm_ids = list(FARM_TYPES)
+    nft_ids = list(NFT_GIFTS)
+    _old_database(database.DB_NAME, [farm_ids[0], farm_ids[0], farm_ids[1]], [nft_ids[2]])
+
+    async def scenario():
+        farms, _, _ = await database.get_farm_histogram(1)
+        nfts = await database.get_nft_histogram(1)
+        return farms, nfts
+
+    farms, nfts = db(scenario())
+    assert farms[FARM_TYPES[farm_ids[0]]["code"]] == 2
+    assert farms[FARM_TYPES[farm_ids[1]]["code"]] == 1
+    assert nfts[NFT_GIFTS[nft_ids[2]]["code"]] == 1
+
+def test_migration_refuses_unknown_types(db):
+    known = list(FARM_TYPES)[0]
+    _old_database(database.DB_NAME, [known, "retired_farm"], [])
+
+    with pytest.raises(ValueError, match="retired_farm"):
+        db(asyncio.sleep(0))
+    # Строки не переписаны: после добавления типа в каталог миграция пройдет без потерь
+    conn = sqlite3.connect(database.DB_NAME)
+    try:
+        assert sorted(row[0] for row in conn.execute("SELECT farm_type FROM farms")) == sorted([known, "retired_farm"])
+    finally:
+        conn.close()
+
+def test_removed_type_is_skipped_until_it_returns(db, monkeypatch):
+    import main
+    removed, kept = list(FARM_TYPES)[:2]
+
+    async def scenario():
+        await database.get_or_create_user(1)
+        await database.admin_add_farm(1, removed)
+        await database.admin_add_farm(1, kept)
+        monkeypatch.setattr(
+            catalog, "_catalog",
+            catalog.Catalog(1, {farm_id: data for farm_id, data in FARM_TYPES.items() if farm_id != removed}, NFT_GIFTS)
+        )
+        profile, _ = await main.render_profile(1, "ru")
+        farms, _ = await main.render_farms(1, "ru")
+        vector, _, _ = await database.get_farm_histogram(1)
+        monkeypatch.setattr(catalog, "_catalog", catalog._builtin)
+        restored, _, _ = await database.get_farm_histogram(1)
+        return profile, farms, vector, restored
+
+    profile, farms, vector, restored = db(scenario())
+    assert FARM_TYPES[kept]["name"] in profile and FARM_TYPES[removed]["name"] not in profile
+    assert FARM_TYPES[kept]["name"] in farms
+    assert sum(vector) == 1
+    assert restored[FARM_TYPES[removed]["code"]] == 1
+
+def test_known_codes_skip_reserved_zero_and_removed_types():
+    removed, kept = list(FARM_TYPES)[:2]
+    current = catalog.Catalog(1, {farm_id: data for farm_id, data in FARM_TYPES.items() if farm_id != removed}, NFT_GIFTS)
+    assert not current.is_farm_code(0) and not current.is_nft_code(0)
+    assert current.is_farm_code(FARM_TYPES[kept]["code"])
+    assert not current.is_farm_code(FARM_TYPES[removed]["code"])
+    assert not current.is_farm_code(len(current.farm_ids))
+    assert all(current.is_nft_code(data["code"]) for data in NFT_GIFTS.values())
+    assert current.farm_vector({0: 5, FARM_TYPES[kept]["code"]: 2}) == [
+        2 if code == FARM_TYPES[kept]["code"] else 0 for code in range(len(current.farm_ids))
+    ]
+
+def test_export_writes_type_ids(db):
+    farm_id = list(FARM_TYPES)[0]
+
+    async def scenario():
+        await database.get_or_create_user(1)
+        await database.admin_add_farm(1, farm_id)
+        path, counts = await export.export_dump("csv", ("farms",))
+        with zipfile.ZipFile(path) as archive:
+            rows = list(csv.DictReader(io.TextIOWrapper(archive.open("farms.csv"), encoding="utf-8")))
+        os.remove(path)
+        return counts, rows
+
+    counts, rows = db(scenario())
+    assert counts == {"farms": 1}
+    assert rows[0]["farm_type"] == farm_id
@@ -0,0 +1,143 @@
+from types import SimpleNamespace
+
+import pytest
+
+import database
+from maintenance import Maintenance
+from repository import repo
+from updates import UpdateDedup
+
+async def _stars(user_id: int) -> int:
+    async with database._reader() as db:
+        cursor = await db.execute("SELECT stars FROM users WHERE user_id = ?", (user_id,))
+        return (await cursor.fetchone())[0]
+
+def _update(update_id: int) -> SimpleNamespace:
+    return SimpleNamespace(update_id=update_id)
+
+def test_redelivered_update_is_dropped_after_restart(db):
+    async def scenario():
+        handled = []
+
+        async def handler(event, data):
+            handled.append(event.update_id)
+            await database.get_or_create_user(1)
+            await database.settle_bet(1, 10, 30, "dice")
+
+        await UpdateDedup().middleware(handler, _update(100), {})
+        # Перезапуск: окно обработанных обновлений загружается из базы
+        restarted = UpdateDedup()
+        await restarted.load()
+        await restarted.middleware(handler, _update(100), {})
+        await restarted.middleware(handler, _update(101), {})
+        return handled, restarted.dropped, await _stars(1)
+
+    assert db(scenario()) == ([100, 101], 1, 240)
+
+def test_failed_bid_is_not_marked_and_is_redelivered(db, monkeypatch):
+    farm_type = next(iter(database.get_catalog().farms))
+
+    async def scenario():
+        for user_id in (1, 2):
+            await database.get_or_create_user(user_id)
+        auction_id = await database.create_auction(farm_type, 50)
+        assert await database.place_bid(auction_id, 1, 60) == (True, "Ставка принята: 60 ⭐")
+
+        ledger_append = database._ledger_append
+
+        async def failing_refund(db, user_id, delta, reason):
+            if reason == "bid_refund":
+                raise RuntimeError("сбой")
+            await ledger_append(db, user_id, delta, reason)
+
+        async def handler(event, data):
+            return await database.place_bid(auction_id, 2, 70)
+
+        # Сбой посреди ставки: ни списание, ни отметка обновления не сохраняются
+        monkeypatch.setattr(database, "_ledger_append", failing_refund)
+        with pytest.raises(RuntimeError):
+            await UpdateDedup().middleware(handler, _update(7), {})
+        after_failure = (await _stars(1), await _stars(2), await database.load_processed_updates())
+
+        # Повторная доставка после перезапуска выполняет ставку целиком
+        monkeypatch.setattr(database, "_ledger_append", ledger_append)
+        restarted = UpdateDedup()
+        await restarted.load()
+        result = await restarted.middleware(handler, _update(7), {})
+        auctions = await database.get_active_auctions()
+        return after_failure, result, (await _stars(1), await _stars(2)), auctions[0]["current_bidder_id"]
+
+    after_failure, result, stars, bidder = db(scenario())
+    assert after_failure == (140, 200, [])
+    assert result == (True, "Ставка принята: 70 ⭐")
+    assert stars == (200, 130) and bidder == 2
+
+def test_collect_marks_update_once(db):
+    async def scenario():
+        await database.get_or_create_user(1)
+        await database.buy_farms(1, next(iter(database.get_catalog().farms)), 1)
+        await database.activate_farms(1)
+
+        async def handler(event, data):
+            return await database.collect_farm_income(1)
+
+        await UpdateDedup().middleware(handler, _update(9), {})
+        return await database.load_processed_updates()
+
+    assert db(scenario()) == [9]
+
+def test_maintenance_checkpoint_inside_update(db):
+    async def scenario():
+        maintenance = Maintenance(repo.maintenance_tasks())
+
+        async def handler(event, data):
+            await database.get_or_create_user(1)
+            return await maintenance.run_task("checkpoint")
+
+        report = await UpdateDedup().middleware(handler, _update(11), {})
+        token = database.current_update_id.set(12)
+        try:
+            await database.accrue_all_income()
+            await database.vacuum_free_pages()
+            await database.optimize()
+        finally:
+            database.current_update_id.reset(token)
+        return report, await database.load_processed_updates()
+
+    report, processed = db(scenario())
+    assert report["result"].startswith("WAL:")
+    assert processed == []
+
+def test_referral_is_marked_by_the_reward(db):
+    async def scenario():
+        for user_id in (1, 2):
+            await database.get_or_create_user(user_id)
+        token = database.current_update_id.set(20)
+        try:
+            assert await database.register_referral(1, 2)
+            registered = await database.load_processed_updates()
+            # Повторная доставка после сбоя между записями: регистрация уже есть, награда - еще нет
+            assert not await database.register_referral(1, 2)
+            assert await database.give_referral_reward(2)
+            assert not await database.give_referral_reward(2)
+        finally:
+            database.current_update_id.reset(token)
+        return registered, await database.load_processed_updates(), await _stars(2)
+
+    from config import REFERRAL_REWARD
+    assert db(scenario()) == ([], [20], 200 + REFERRAL_REWARD)
+
+def test_bulk_grant_chunks_mark_only_the_last(db):
+    async def scenario():
+        for user_id in (1, 2):
+            await database.get_or_create_user(user_id)
+        token = database.current_update_id.set(30)
+        try:
+            await database.bulk_add_stars([(1, 5)], mark_update=False)
+            first = await database.load_processed_updates()
+            await database.bulk_add_stars([(2, 5)], mark_update=True)
+        finally:
+            database.current_update_id.reset(token)
+        return first, await database.load_processed_updates()
+
+    assert db(scenario()) == ([], [30])
@@ -0,0 +1,69 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+import database
+
+def test_concurrent_writes_are_serialized(db):
+    async def scenario():
+        await database.get_or_create_user(1)
+        await asyncio.gather(*(database.add_stars(1, 1, "admin") for _ in range(300)))
+        return await database.get_user_stars(1)
+
+    assert db(scenario()) == 500
+
+def test_failed_job_rolls_back_and_writer_keeps_going(db):
+    async def scenario():
+        await database.get_or_create_user(1)
+
+        async def failing(db):
+            await db.execute("UPDATE users SET stars = 0 WHERE user_id = 1")
+            raise RuntimeError("сбой")
+        with pytest.raises(RuntimeError):
+            await database._write(failing)
+        await database.add_stars(1, 5, "admin")
+        return await database.get_user_stars(1)
+
+    assert db(scenario()) == 205
+
+def test_read_pool_is_bounded_and_read_only(db):
+    async def scenario():
+        await database.get_or_create_user(1)
+
+        async def read():
+            async with database._reader() as reader:
+                await asyncio.sleep(0.01)
+                cursor = await reader.execute("SELECT stars FROM users WHERE user_id = 1")
+                return (await cursor.fetchone())[0]
+        values = await asyncio.gather(*(read() for _ in range(20)))
+        async with database._reader() as reader:
+            with pytest.raises(sqlite3.OperationalError):
+                await reader.execute("UPDATE users SET stars = 0")
+        return values, len(database._read_connections)
+
+    values, connections = db(scenario())
+    assert values == [200] * 20
+    assert connections <= database.READ_POOL_SIZE
+
+def test_stopped_writer_fails_pending_and_new_writes(db):
+    async def scenario():
+        await database.get_or_create_user(1)
+
+        async def breaking(db):
+            async def rollback():
+                raise sqlite3.OperationalError("disk I/O error")
+            await db.execute("UPDATE users SET stars = 0 WHERE user_id = 1")
+            db.rollback = rollback
+            raise RuntimeError("сбой")
+        results = await asyncio.wait_for(asyncio.gather(
+            database._write(breaking),
+            database.add_stars(1, 5, "admin"),
+            return_exceptions=True), 1)
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(database.add_stars(1, 5, "admin"), 1)
+        return results
+
+    first, second = db(scenario())
+    assert isinstance(first, RuntimeError) and isinstance(first.__cause__, sqlite3.OperationalError)
+    assert isinstance(second, RuntimeError)
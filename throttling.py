@@ -0,0 +1,85 @@
+import time
+from typing import Callable, Dict, Optional
+
+from aiogram.types import CallbackQuery, Message
+
+from templates import locale_for, t
+
+# Как часто выбрасывать из памяти корзины, которые успели наполниться до краев
+EVICT_INTERVAL = 60
+
+class Throttle:
+    """Ограничение частоты запросов пользователя: корзина токенов на пользователя и класс команд.
+
+    Корзина класса вмещает burst токенов и пополняется со скоростью rate в
+    секунду; запрос забирает один токен. Корзина хранится кортежем
+    (токены, время обновления, предупрежден ли) в словаре класса. Полная корзина
+    ничем не отличается от новой, поэтому простоявшие достаточно долго корзины
+    просто удаляются. Лишний запрос отбрасывается до обработчиков и базы:
+    нажатие кнопки получает короткий ответ, сообщение - одно предупреждение
+    на серию.
+    """
+
+    def __init__(self, limits: Dict[str, tuple[float, int]], classify: Callable[[object], Optional[str]]):
+        self.limits: Dict[str, tuple[float, int]] = {}
+        self.buckets: Dict[str, Dict[int, tuple]] = {}
+        self.classify = classify
+        self.dropped = 0
+        self._next_evict = time.monotonic() + EVICT_INTERVAL
+        for name, (rate, burst) in limits.items():
+            self.set_limit(name, rate, burst)
+
+    def set_limit(self, name: str, rate: float, burst: int):
+        """Задать лимит класса: rate запросов в секунду, не больше burst подряд"""
+        if rate <= 0 or burst < 1:
+            raise ValueError("Скорость должна быть больше 0, а запас - не меньше 1")
+        self.limits[name] = (rate, burst)
+        self.buckets.setdefault(name, {})
+
+    def take(self, name: str, user_id: int) -> tuple[float, bool]:
+        """Забрать токен: (0, ...) - запрос разрешен, иначе (сколько секунд ждать, нужно ли предупредить)"""
+        rate, burst = self.limits[name]
+        buckets = self.buckets[name]
+        now = time.monotonic()
+        if now >= self._next_evict:
+            self._evict(now)
+
+        tokens, updated, warned = buckets.get(user_id, (burst, now, False))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens >= 1:
+            buckets[user_id] = (tokens - 1, now, False)
+            return 0, False
+        buckets[user_id] = (tokens, now, True)
+        return (1 - tokens) / rate, not warned
+
+    def _evict(self, now: float):
+        """Удалить корзины, которые уже наполнились (новая корзина будет такой же)"""
+        for name, buckets in self.buckets.items():
+            rate, burst = self.limits[name]
+            full = [
+                user_id for user_id, (tokens, updated, _) in buckets.items()
+                if tokens + (now - updated) * rate >= burst
+            ]
+            for user_id in full:
+                del buckets[user_id]
+        self._next_evict = now + EVICT_INTERVAL
+
+    async def middleware(self, handler, event, data):
+        """Middleware сообщений и нажатий: отбросить запрос сверх лимита его класса"""
+        name = self.classify(event)
+        if name is None or name not in self.limits:
+            return await handler(event, data)
+
+        wait, warn = self.take(name, event.from_user.id)
+        if not wait:
+            return await handler(event, data)
+
+        self.dropped += 1
+        text = t(locale_for(event.from_user.language_code), "throttle.wait", seconds=max(1, round(wait)))
+        if isinstance(event, CallbackQuery):
+            await event.answer(text)
+        elif warn and isinstance(event, Message):
+            if event.chat.type == "private":
+                await event.answer(text)
+            else:
+                await event.reply(text)
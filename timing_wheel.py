@@ -0,0 +1,106 @@
+from typing import Dict, Hashable, List, Tuple
+
+# Иерархическое колесо таймеров: 4 уровня по 64 слота.
+# Уровень 0 - по 1 тику на слот (~1 мин при тике в 1 с), уровень 1 - по 64 тика (~68 мин),
+# уровень 2 - по 4096 тиков (~3 суток), уровень 3 - по 262144 тика (~194 суток на оборот).
+WHEEL_BITS = 6
+WHEEL_SIZE = 1 << WHEEL_BITS
+WHEEL_MASK = WHEEL_SIZE - 1
+WHEEL_LEVELS = 4
+MAX_DELAY = (1 << (WHEEL_BITS * WHEEL_LEVELS)) - 1
+
+class TimingWheel:
+    """Иерархическое колесо таймеров с O(1) добавлением и отменой.
+
+    Таймер - это ключ (например, user_id) и тик срабатывания. У одного ключа
+    может быть только один таймер: повторное добавление переносит его.
+    Дальние таймеры лежат на верхних уровнях и спускаются вниз, когда
+    нижний уровень проходит полный оборот.
+    """
+
+    def __init__(self, now: int):
+        self.current = now
+        self._slots: List[List[Dict[Hashable, int]]] = [
+            [{} for _ in range(WHEEL_SIZE)] for _ in range(WHEEL_LEVELS)
+        ]
+        # ключ -> (уровень, слот) для отмены за O(1)
+        self._index: Dict[Hashable, Tuple[int, int]] = {}
+        self._due: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._index) + len(self._due)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index or key in self._due
+
+    def schedule(self, key: Hashable, expires: int):
+        """Добавить или перенести таймер ключа на тик expires"""
+        self.cancel(key)
+        self._place(key, expires)
+
+    def cancel(self, key: Hashable) -> bool:
+        """Отменить таймер ключа (возвращает True, если он был)"""
+        position = self._index.pop(key, None)
+        if position is not None:
+            level, slot = position
+            del self._slots[level][slot][key]
+            return True
+        return self._due.pop(key, None) is not None
+
+    def advance(self, now: int) -> List[Hashable]:
+        """Прокрутить колесо до тика now (возвращает ключи сработавших таймеров)"""
+        expired = list(self._due)
+        self._due.clear()
+
+        while self.current < now:
+            self.current += 1
+            tick = self.current
+
+            # На границе оборота спускаем таймеры с верхних уровней
+            level = 1
+            while level < WHEEL_LEVELS and (tick >> (WHEEL_BITS * (level - 1))) & WHEEL_MASK == 0:
+                self._cascade(level, (tick >> (WHEEL_BITS * level)) & WHEEL_MASK)
+                level += 1
+
+            slot = self._slots[0][tick & WHEEL_MASK]
+            if slot:
+                for key in slot:
+                    del self._index[key]
+                expired.extend(slot)
+                slot.clear()
+
+            # Таймеры, спущенные ровно на текущий тик
+            if self._due:
+                expired.extend(self._due)
+                self._due.clear()
+
+        return expired
+
+    def _place(self, key: Hashable, expires: int):
+        """Положить таймер в слот по его удаленности от текущего тика"""
+        delay = expires - self.current
+        if delay <= 0:
+            self._due[key] = expires
+            return
+
+        if delay > MAX_DELAY:
+            expires = self.current + MAX_DELAY
+            delay = MAX_DELAY
+
+        level = 0
+        while delay >= 1 << (WHEEL_BITS * (level + 1)):
+            level += 1
+        slot = (expires >> (WHEEL_BITS * level)) & WHEEL_MASK
+        self._slots[level][slot][key] = expires
+        self._index[key] = (level, slot)
+
+    def _cascade(self, level: int, slot_index: int):
+        """Перераспределить таймеры слота уровня level по нижним уровням"""
+        slot = self._slots[level][slot_index]
+        if not slot:
+            return
+        timers = list(slot.items())
+        slot.clear()
+        for key, expires in timers:
+            del self._index[key]
+            self._place(key, expires)
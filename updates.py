@@ -0,0 +1,58 @@
+import logging
+from collections import deque
+
+from aiogram.types import Update
+
+from database import UPDATE_WINDOW, current_update_id
+from repository import repo
+
+logger = logging.getLogger(__name__)
+
+class UpdateDedup:
+    """Защита от повторной доставки обновлений Telegram.
+
+    После падения или перезапуска Telegram заново присылает обновления, offset
+    которых бот не успел подтвердить. Запись, завершающая изменение обработчика
+    (изменение из нескольких шагов пишется одной транзакцией), сохраняет его
+    update_id в той же транзакции, поэтому сохраненное окно последних update_id
+    точно совпадает с примененными изменениями. При запуске окно загружается в
+    кольцо в памяти, и повторы отбрасываются до обработчиков без обращения к
+    базе. Обновления, которые ничего не меняют, запоминаются только в памяти.
+    """
+
+    def __init__(self, size: int = UPDATE_WINDOW):
+        self.size = size
+        self.high_water_mark = 0
+        self.dropped = 0
+        self._ring: deque = deque()
+        self._seen: set = set()
+
+    async def load(self) -> int:
+        """Загрузить сохраненное окно обработанных update_id (возвращает их число)"""
+        update_ids = await repo.load_processed_updates(self.size)
+        for update_id in reversed(update_ids):
+            self._remember(update_id)
+        return len(update_ids)
+
+    def _remember(self, update_id: int):
+        """Запомнить update_id в кольце (самый старый вытесняется)"""
+        if len(self._ring) == self.size:
+            self._seen.discard(self._ring.popleft())
+        self._ring.append(update_id)
+        self._seen.add(update_id)
+        self.high_water_mark = update_id
+
+    async def middleware(self, handler, event: Update, data):
+        """Внешний middleware обновлений: отбросить повтор, иначе отмечать записи его update_id"""
+        update_id = event.update_id
+        if update_id in self._seen:
+            self.dropped += 1
+            logger.info(f"Повторное обновление {update_id} пропущено")
+            return None
+        # Запоминаем сразу: повтор, пришедший во время обработки, тоже отбрасывается
+        self._remember(update_id)
+        token = current_update_id.set(update_id)
+        try:
+            return await handler(event, data)
+        finally:
+            current_update_id.reset(token)